@@ -0,0 +1 @@
+"""Benchmarks of the app at production scale on synthetic tracking sheets and SPR results."""
@@ -0,0 +1,244 @@
+"""
+Benchmarks a run of the app on synthetic tracking sheets and SPR results of increasing size and flags the stages that
+got slower or use more memory than in a stored baseline.
+
+    python -m benchmarks.run_benchmarks --rows 10000 --rows 100000 --rows 1000000
+
+resultsdb is replaced by a SQLite file holding the synthetic SPR results, so the database query and the sync of the
+local SPR cache are measured along with the merge, pivot, no data and save stages.
+"""
+
+# Import system packages
+import datetime
+import json
+import logging
+import os
+import platform
+import sys
+import tempfile
+
+# Import the version of the script the baseline is tagged with.
+from _version import __version__
+
+# Import the synthetic data generators
+from benchmarks import synthetic
+
+# Import the app, the SPR results download and the app's sources, sinks and profiler
+from make_updated_tracking_sheet import make_updated_tracking_sheet as app
+from make_updated_tracking_sheet import resultsdb, sinks, sources
+from make_updated_tracking_sheet.profiling import StageProfiler
+import click
+
+# Baseline shipped with the repository.
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+
+# Sizes of the tracking sheet benchmarked by default. 10 million rows takes several minutes and a lot of memory, so
+# it is only run when asked for.
+DEFAULT_ROWS = [10000, 100000, 1000000]
+
+# A stage regresses once it takes TOLERANCE more time or memory than in the baseline, and at least MIN_SECONDS or
+# MIN_MB more, so that the noise of very short stages is not flagged.
+TOLERANCE = 0.5
+MIN_SECONDS = 0.1
+MIN_MB = 10
+
+
+class SqliteSprSource:
+    """
+    Downloads the SPR results of the KRAS project from a SQLite stand-in for resultsdb through a local cache, see
+    get_dot_data_for_targets, or only syncs the cache for the sqlite engine to attach, see sync_spr_cache.
+
+    :param engine: Sqlalchemy engine of the SQLite database made by synthetic.make_spr_database.
+    :param cache_path: Path of the SQLite cache file.
+    :param profiler: StageProfiler recording the connect, query and cache sync stages.
+    """
+
+    stage = 'download spr results'
+
+    def __init__(self, engine, cache_path, profiler=None):
+        self.engine = engine
+        self.cache_path = cache_path
+        self.profiler = profiler
+
+    def read(self):
+        target = (resultsdb.PROJECT_CODE, resultsdb.PROTEIN_ID)
+        results = resultsdb.get_dot_data_for_targets(targets=[target], full_resync=True, cache_path=self.cache_path,
+                                                     engine=self.engine, profiler=self.profiler)
+        return results[target]
+
+    def sync_cache(self):
+        target = (resultsdb.PROJECT_CODE, resultsdb.PROTEIN_ID)
+        cache_path = resultsdb.sync_spr_cache(targets=[target], full_resync=True, cache_path=self.cache_path,
+                                              engine=self.engine, profiler=self.profiler)
+        return (cache_path,) + target
+
+
+def run_benchmark(rows, spr_rows=None, compounds=None, output_format='parquet', trace_memory=True, seed=0,
+                  transform_engine='memory', partitions=1):
+    """
+    Method that benchmarks one run of the app on synthetic data and returns the report of its StageProfiler.
+
+    The synthetic data is generated and loaded into the SQLite stand-in for resultsdb before the run starts, so it is
+    not part of the measured stages.
+
+    :param rows: Number of rows of the tracking sheet.
+    :param spr_rows: Number of rows of the upload_spr_dose table. Defaults to rows.
+    :param compounds: Number of distinct compounds. Defaults to a third of rows, so compounds are shipped 3 times.
+    :param output_format: Format the results are saved in. One of OUTPUT_FORMATS.
+    :param trace_memory: Record the peak memory allocated during each stage with tracemalloc.
+    :param seed: Seed of the random generators.
+    :param transform_engine: Engine the tracking sheet is updated with. One of ENGINES.
+    :param partitions: Number of hash partitions of the compounds updated in parallel processes.
+    """
+    import sqlalchemy
+
+    spr_rows = rows if spr_rows is None else spr_rows
+    compounds = compounds or max(1, rows // 3)
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        logging.info('Generating {} tracking sheet rows and {} SPR results of {} compounds...'.format(
+            rows, spr_rows, compounds))
+        brd_ids = synthetic.make_compounds(compounds, seed=seed)
+        df_tracking = synthetic.make_tracking_sheet(rows, brd_ids, seed=seed)
+        engine = sqlalchemy.create_engine('sqlite:///' + os.path.join(tmp_dir, 'resultsdb.sqlite'))
+        synthetic.make_spr_database(engine, synthetic.make_spr_results(spr_rows, brd_ids, seed=seed))
+        del brd_ids
+
+        logging.info('Running the benchmark...')
+        profiler = StageProfiler(trace_memory=trace_memory)
+        try:
+            app.run(tracking_source=sources.MemorySource(df_tracking),
+                    spr_source=SqliteSprSource(engine, cache_path=os.path.join(tmp_dir, 'spr_cache.sqlite'),
+                                               profiler=profiler),
+                    output_sinks=[sinks.FileSink('benchmark', output_format=output_format, directory=tmp_dir)],
+                    profiler=profiler, transform_engine=transform_engine, partitions=partitions)
+        finally:
+            engine.dispose()
+            profiler.stop()
+
+    report = profiler.report()
+    report.update(rows=rows, spr_rows=spr_rows, compounds=compounds, transform_engine=transform_engine,
+                  partitions=partitions)
+    return report
+
+
+def compare(reports, baseline, tolerance=TOLERANCE, min_seconds=MIN_SECONDS, min_mb=MIN_MB):
+    """
+    Method that compares the stages of benchmark reports with those of the baseline. Returns a list with a dict of
+    the size, stage, measure, baseline and current value of every regression.
+
+    Sizes and stages missing from the baseline, and runs with another engine or number of partitions than the baseline,
+    are not compared.
+
+    :param reports: Dict of the number of rows to the report of run_benchmark.
+    :param baseline: Dict of the number of rows to a report, as saved by save_baseline.
+    :param tolerance: Fraction by which a stage may be slower or use more memory than in the baseline.
+    :param min_seconds: Smallest increase in wall time that is flagged.
+    :param min_mb: Smallest increase in memory that is flagged.
+    """
+    regressions = []
+    for rows, report in reports.items():
+        base_report = baseline.get(str(rows))
+        if (base_report is None or base_report['transform_engine'] != report['transform_engine']
+                or base_report.get('partitions', 1) != report.get('partitions', 1)):
+            continue
+        base_stages = {record['stage']: record for record in base_report['stages']}
+        for record in report['stages']:
+            base = base_stages.get(record['stage'])
+            if base is None:
+                continue
+            for measure, min_increase in [('seconds', min_seconds), ('traced_peak_mb', min_mb)]:
+                if record.get(measure) is None or base.get(measure) is None:
+                    continue
+                if (record[measure] > base[measure] * (1 + tolerance)
+                        and record[measure] - base[measure] >= min_increase):
+                    regressions.append({'rows': rows, 'stage': record['stage'], 'measure': measure,
+                                        'baseline': base[measure], 'current': record[measure]})
+    return regressions
+
+
+def load_baseline(path):
+    """
+    Method that reads the reports of a baseline file saved by save_baseline. Returns an empty dict if there is none.
+    :param path: Path of the baseline JSON file.
+    """
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)['reports']
+
+
+def save_baseline(path, reports):
+    """
+    Method that saves benchmark reports as the baseline, tagged with the machine they were run on. Timings are only
+    comparable on the same machine.
+
+    :param path: Path of the baseline JSON file.
+    :param reports: Dict of the number of rows to the report of run_benchmark.
+    """
+    with open(path, 'w') as f:
+        json.dump({'version': str(__version__),
+                   'created': datetime.datetime.now().isoformat(timespec='seconds'),
+                   'machine': platform.platform(),
+                   'python': platform.python_version(),
+                   'reports': {str(rows): report for rows, report in reports.items()}}, f, indent=2)
+
+
+# Using click to manage the command line interface
+@click.command()
+@click.option('--rows', type=click.IntRange(min=1), multiple=True,
+              help="Number of tracking sheet rows to benchmark. Can be given several times. Defaults to 10^4, 10^5 "
+                   "and 10^6.")
+@click.option('--spr_rows', type=click.IntRange(min=1),
+              help="Number of SPR results to benchmark with. Defaults to the number of tracking sheet rows.")
+@click.option('--format', 'output_format', type=click.Choice(sinks.OUTPUT_FORMATS), default='parquet',
+              show_default=True, help="Format the results are saved in.")
+@click.option('--engine', 'transform_engine', type=click.Choice(app.ENGINES), default='memory', show_default=True,
+              help="Engine the tracking sheet is updated with.")
+@click.option('--partitions', type=click.IntRange(min=1), default=1, show_default=True,
+              help="Number of hash partitions of the compounds updated in parallel processes.")
+@click.option('--trace_memory/--no_trace_memory', default=True, show_default=True,
+              help="Option to record the memory allocated by each stage with tracemalloc.")
+@click.option('--baseline', type=click.Path(dir_okay=False), default=DEFAULT_BASELINE, show_default=True,
+              help="Baseline JSON file the results are compared with.")
+@click.option('--update_baseline', is_flag=True,
+              help="Option to save the results as the new baseline instead of comparing them.")
+@click.option('--tolerance', type=click.FloatRange(min=0), default=TOLERANCE, show_default=True,
+              help="Fraction by which a stage may be slower or use more memory than in the baseline.")
+@click.option('--output', type=click.Path(dir_okay=False),
+              help="Save the reports of the benchmarks to this JSON file.")
+@click.option('--seed', type=int, default=0, show_default=True, help="Seed of the synthetic data generators.")
+def run_main(rows, spr_rows, output_format, transform_engine, partitions, trace_memory, baseline, update_baseline,
+             tolerance, output, seed):
+    """
+    Benchmarks the app on synthetic data and exits with status 1 if a stage regressed against the baseline.
+    """
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(message)s')
+
+    reports = {}
+    for num_rows in rows or DEFAULT_ROWS:
+        reports[num_rows] = run_benchmark(rows=num_rows, spr_rows=spr_rows, output_format=output_format,
+                                          trace_memory=trace_memory, seed=seed, transform_engine=transform_engine,
+                                          partitions=partitions)
+        for record in reports[num_rows]['stages']:
+            click.echo('{:>10} rows  {:<25} {:>9.3f} s {:>9} MB'.format(
+                num_rows, record['stage'], record['seconds'], record.get('traced_peak_mb', '-')))
+
+    if output:
+        save_baseline(output, reports)
+
+    if update_baseline:
+        save_baseline(baseline, reports)
+        click.echo('Saved the baseline to {}.'.format(baseline))
+        return
+
+    regressions = compare(reports, load_baseline(baseline), tolerance=tolerance)
+    for regression in regressions:
+        click.echo('REGRESSION {rows} rows {stage}: {measure} {baseline} -> {current}'.format(**regression))
+    if regressions:
+        sys.exit(1)
+    click.echo('No regressions against {}.'.format(baseline))
+
+
+if __name__ == '__main__':
+    run_main()
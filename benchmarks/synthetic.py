@@ -0,0 +1,169 @@
+"""Generators of realistic synthetic tracking sheets and upload_spr_dose extracts of any size.
+
+The generated data has the shape of the production data: compounds shipped several times by several vendors to
+several sites, with the batch suffix on some BRD IDs, compounds run several times at Viva and at the Broad, results
+of other projects and proteins, and missing or hand edited dates.
+"""
+
+# Import data wrangling Python packages
+import numpy as np
+import pandas as pd
+
+# Vendors shipping compounds, sites compounds are shipped to and people running them, with their shares of rows.
+VENDORS = ['TCG', 'WXWH', 'WXTJ', 'ENAM', 'PHAR']
+VENDOR_WEIGHTS = [0.4, 0.25, 0.15, 0.1, 0.1]
+SITES = ['Viva', 'HD', 'Broad', 'WX_ADMET']
+SITE_WEIGHTS = [0.35, 0.3, 0.3, 0.05]
+OPERATORS = ['bfulroth', 'eberkenb', 'Viva_Biotech']
+OPERATOR_WEIGHTS = [0.7, 0.1, 0.2]
+
+# Share of shipments with no received date, and with a note typed in the date column instead of a date.
+MISSING_RECEIVED = 0.3
+NOTE_RECEIVED = 0.01
+
+# Share of the shipped compounds that were run, and share of SPR results without a run date.
+TESTED = 0.7
+MISSING_RUN_DATE = 0.01
+
+# Share of the SPR results of other projects and proteins, which are filtered out by the database query.
+OTHER_TARGETS = 0.2
+
+# Columns of the upload_spr_dose table, in the order of the SPR_COLUMNS of the cache.
+SPR_TABLE_COLUMNS = ['broad_id', 'project_code', 'operator', 'protein_id', 'compound_mw', 'date_']
+
+# Number of rows inserted into the SQLite stand-in of resultsdb per transaction.
+INSERT_CHUNK_SIZE = 100000
+
+
+def _dates(rng, size, start='2019-01-01', end='2021-12-31', sep='-'):
+    """
+    Helper method that returns an array of random date strings between two dates.
+    """
+    pool = pd.date_range(start, end).strftime('%Y{0}%m{0}%d'.format(sep)).to_numpy(dtype=object)
+    return pool[rng.integers(len(pool), size=size)]
+
+
+def make_compounds(num_compounds, seed=0):
+    """
+    Returns an array of distinct 22 character compound BRD IDs.
+
+    :param num_compounds: Number of compounds.
+    :param seed: Seed of the random generator.
+    """
+    rng = np.random.default_rng(seed)
+
+    # Draw one number from each of num_compounds equal slices of the 8 digit numbers, so they are all distinct.
+    step = 10 ** 8 // num_compounds
+    ids = rng.permutation(np.arange(num_compounds) * step + rng.integers(step, size=num_compounds))
+    prefixes = pd.Series(rng.choice(['BRD-K', 'BRD-A'], size=num_compounds, p=[0.9, 0.1]))
+    return (prefixes + pd.Series(ids).astype(str).str.zfill(8) + '-001-01-9').to_numpy(dtype=object)
+
+
+def make_tracking_sheet(rows, compounds, seed=0):
+    """
+    Returns a synthetic tracking sheet with the headers of the Google Sheet.
+
+    Compounds are picked at random, so most are shipped several times. Shipments to Viva carry the batch suffix on
+    their BRD ID. The run date columns are left empty, as they are filled in by the app.
+
+    :param rows: Number of shipments.
+    :param compounds: Array of compound BRD IDs as returned by make_compounds.
+    :param seed: Seed of the random generator.
+    """
+    rng = np.random.default_rng(seed + 1)
+    brd = compounds[rng.integers(len(compounds), size=rows)]
+    vendors = np.array(VENDORS, dtype=object)[rng.choice(len(VENDORS), size=rows, p=VENDOR_WEIGHTS)]
+    sites = np.array(SITES, dtype=object)[rng.choice(len(SITES), size=rows, p=SITE_WEIGHTS)]
+
+    # Viva registers the batch of the compounds shipped to it.
+    brd = np.where(sites == 'Viva', brd + '-001', brd)
+
+    # Some shipments have not been received yet and some have a note instead of a received date.
+    received = _dates(rng, rows)
+    draw = rng.random(rows)
+    received[draw < MISSING_RECEIVED] = None
+    received[draw > 1 - NOTE_RECEIVED] = 'Running 8/25'
+
+    names = pd.Series(vendors).str.cat(pd.Series(rng.integers(1000, size=rows)).astype(str), sep='-')
+    return pd.DataFrame({'BRD': brd,
+                         'NAME': names.to_numpy(dtype=object),
+                         'FROM': vendors,
+                         'TO': sites,
+                         'DATE_SENT': _dates(rng, rows),
+                         'BARCODE': None,
+                         'DATE_RECEIVED': received,
+                         'DATE_RUN_VIVA': None,
+                         'DATE_RUN_BROAD': None,
+                         'TRACKING_NUMBER': None})
+
+
+def make_spr_results(rows, compounds, project_code=7279, protein_id='BIP-0384-01', seed=0):
+    """
+    Returns a synthetic upload_spr_dose extract with the headers returned by get_dot_data.
+
+    Only a share of the compounds is run, most of them several times and by several operators. Viva reports the
+    molecular weight of the compounds it runs. A share of the results belongs to other projects and proteins.
+
+    :param rows: Number of SPR results.
+    :param compounds: Array of compound BRD IDs as returned by make_compounds.
+    :param project_code: Project code of the results of the benchmarked target.
+    :param protein_id: Protein ID of the results of the benchmarked target.
+    :param seed: Seed of the random generator.
+    """
+    rng = np.random.default_rng(seed + 2)
+    tested = compounds[:max(1, int(len(compounds) * TESTED))]
+    operators = np.array(OPERATORS, dtype=object)[rng.choice(len(OPERATORS), size=rows, p=OPERATOR_WEIGHTS)]
+    is_viva = operators == 'Viva_Biotech'
+
+    # Results of other projects and proteins sharing the table.
+    draw = rng.random(rows)
+    project_codes = np.where(draw < OTHER_TARGETS / 2, project_code + 1, project_code)
+    protein_ids = np.where((draw >= OTHER_TARGETS / 2) & (draw < OTHER_TARGETS), 'BIP-0385-01', protein_id)
+
+    dates = _dates(rng, rows, sep='_')
+    dates[rng.random(rows) < MISSING_RUN_DATE] = None
+
+    return pd.DataFrame({'BROAD_ID': tested[rng.integers(len(tested), size=rows)],
+                         'PROJECT_CODE': project_codes,
+                         'OPERATOR': operators,
+                         'PROTEIN_ID': protein_ids.astype(object),
+                         'COMPOUND_MW': np.where(is_viva, rng.uniform(250, 650, size=rows).round(2), np.nan),
+                         'DATE': dates})
+
+
+def make_spr_database(engine, df_spr):
+    """
+    Creates the upload_spr_dose table in a database, e.g. a SQLite stand-in for resultsdb, and loads SPR results into
+    it. The table has the lower case column names reflected from resultsdb and the index the query filters on.
+
+    :param engine: Sqlalchemy engine object.
+    :param df_spr: SPR results as returned by make_spr_results.
+    """
+    import sqlalchemy
+
+    metadata = sqlalchemy.MetaData()
+    spr_data_tbl = sqlalchemy.Table('upload_spr_dose', metadata,
+                                    sqlalchemy.Column('broad_id', sqlalchemy.String),
+                                    sqlalchemy.Column('project_code', sqlalchemy.Integer),
+                                    sqlalchemy.Column('operator', sqlalchemy.String),
+                                    sqlalchemy.Column('protein_id', sqlalchemy.String),
+                                    sqlalchemy.Column('compound_mw', sqlalchemy.Float),
+                                    sqlalchemy.Column('date_', sqlalchemy.String),
+                                    sqlalchemy.Index('ix_upload_spr_dose_target', 'project_code', 'protein_id',
+                                                     'date_'))
+    metadata.create_all(engine)
+
+    # Insert through the DBAPI connection in chunks, as inserting millions of rows through sqlalchemy is slow.
+    insert = 'INSERT INTO upload_spr_dose ({}) VALUES ({})'.format(', '.join(SPR_TABLE_COLUMNS),
+                                                                   ', '.join('?' * len(SPR_TABLE_COLUMNS)))
+    df_spr = df_spr.astype({'COMPOUND_MW': object})
+    df_spr = df_spr.where(df_spr.notna(), None)
+    conn = engine.raw_connection()
+    try:
+        for start in range(0, len(df_spr), INSERT_CHUNK_SIZE):
+            chunk = df_spr.iloc[start:start + INSERT_CHUNK_SIZE]
+            conn.cursor().executemany(insert, chunk.itertuples(index=False, name=None))
+            conn.commit()
+    finally:
+        conn.close()
+    return spr_data_tbl
@@ -0,0 +1,172 @@
+"""Shared Google API client layer with cached credentials, a per minute request quota and retries with backoff."""
+
+import functools
+import logging
+import os
+import random
+import threading
+import time
+
+
+# If modifying these scopes, delete the file token.pickle.
+SCOPES = ['https://spreadsheets.google.com/feeds',
+          'https://www.googleapis.com/auth/drive']
+
+# Service account key file used to authorize the Google API clients.
+KEY_FILE = 'TrackCompounds-1306f02bc0b1.json'
+
+# Number of Google API requests made per minute by this process. The Sheets API allows 60 per minute and user by
+# default. Can be overridden with GOOGLE_API_QUOTA in the .env file.
+DEFAULT_QUOTA = 60
+
+# Requests failing with these HTTP statuses are retried: rate limited, and server errors.
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+# Requests that are not idempotent, e.g. adding rows, are only retried when rate limited, since a server error may be
+# returned after the request was applied.
+RATE_LIMIT_STATUSES = {429}
+
+# Number of times a failed request is retried, and the backoff in seconds before the first and longest retry.
+MAX_RETRIES = 5
+BACKOFF = 1
+MAX_BACKOFF = 64
+
+
+@functools.lru_cache(maxsize=None)
+def get_credentials():
+    """
+    Loads the service account credentials once per process. The Sheets, Drive and gspread clients share them, so the
+    access token is reused until it expires.
+    """
+    from oauth2client.service_account import ServiceAccountCredentials
+
+    logging.info('Loading Google API credentials.')
+    return ServiceAccountCredentials.from_json_keyfile_name(KEY_FILE, SCOPES)
+
+
+@functools.lru_cache(maxsize=None)
+def get_sheets_service(slot=0):
+    """
+    Builds the Sheets API client used for reads once per process and slot. The httplib2 connection of a client can't
+    be shared between threads, so requests made concurrently each take a client of their own slot.
+
+    :param slot: Number of the client.
+    """
+    from googleapiclient.discovery import build
+
+    logging.info('Authorizing Google API credentials.')
+    return build('sheets', 'v4', credentials=get_credentials())
+
+
+@functools.lru_cache(maxsize=None)
+def get_drive_service():
+    """
+    Builds the Drive API client used to look up the revision of the spreadsheet once per process.
+    """
+    from googleapiclient.discovery import build
+
+    logging.info('Authorizing Google API credentials.')
+    return build('drive', 'v3', credentials=get_credentials())
+
+
+@functools.lru_cache(maxsize=None)
+def get_gspread_client():
+    """
+    Authorizes the gspread client used for writes once per process.
+    """
+    import gspread
+
+    logging.info('Authorizing Google API credentials.')
+    return gspread.authorize(get_credentials())
+
+
+class RateLimiter:
+    """
+    Token bucket limiting the number of requests made per minute. Requests are let through in bursts of up to the
+    full quota, after which they are spaced out evenly. Safe to share between threads.
+
+    :param quota: Number of requests allowed per minute.
+    :param clock: Function returning the current time in seconds.
+    :param sleep: Function waiting for a number of seconds.
+    """
+
+    def __init__(self, quota, clock=time.monotonic, sleep=time.sleep):
+        self.quota = quota
+        self.clock = clock
+        self.sleep = sleep
+        self._tokens = float(quota)
+        self._updated = clock()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """
+        Waits until a request can be made within the quota and takes it.
+        """
+        while True:
+            with self._lock:
+                now = self.clock()
+                self._tokens = min(self.quota, self._tokens + (now - self._updated) * self.quota / 60)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) * 60 / self.quota
+            logging.info('Google API quota of {} requests per minute reached, waiting {:.1f} seconds.'.format(
+                self.quota, wait))
+            self.sleep(wait)
+
+
+def get_quota():
+    """
+    Returns the number of Google API requests per minute of this process, GOOGLE_API_QUOTA or DEFAULT_QUOTA.
+    """
+    return int(os.getenv('GOOGLE_API_QUOTA', DEFAULT_QUOTA))
+
+
+@functools.lru_cache(maxsize=None)
+def get_rate_limiter():
+    """
+    Returns the rate limiter shared by every Google API request of this process.
+    """
+    return RateLimiter(quota=get_quota())
+
+
+def _status(error):
+    """
+    Helper method that returns the HTTP status of a failed Google API request or None if it did not get a response.
+    googleapiclient raises HttpError with resp.status and gspread raises APIError with response.status_code.
+    """
+    resp = getattr(error, 'resp', None)
+    if resp is not None and getattr(resp, 'status', None) is not None:
+        return int(resp.status)
+    response = getattr(error, 'response', None)
+    if response is not None and getattr(response, 'status_code', None) is not None:
+        return int(response.status_code)
+    return None
+
+
+def call(func, *args, retry_statuses=RETRY_STATUSES, **kwargs):
+    """
+    Makes a Google API request within the shared quota. Requests rate limited by Google (429) or failing with a server
+    error are retried up to MAX_RETRIES times with exponential backoff and jitter.
+
+    :param func: Function making the request, e.g. the execute method of a googleapiclient request or a gspread
+    Worksheet method.
+    :param args: Positional arguments of func.
+    :param retry_statuses: HTTP statuses the request is retried on. RATE_LIMIT_STATUSES for requests that are not
+    idempotent.
+    :param kwargs: Keyword arguments of func.
+    """
+    limiter = get_rate_limiter()
+    for attempt in range(MAX_RETRIES + 1):
+        limiter.acquire()
+        try:
+            return func(*args, **kwargs)
+        except Exception as e:
+            status = _status(e)
+            if status not in retry_statuses or attempt == MAX_RETRIES:
+                raise
+            backoff = min(MAX_BACKOFF, BACKOFF * 2 ** attempt) * (1 + random.random())
+            logging.warning('Google API request failed with status {}, retrying in {:.1f} seconds.'.format(
+                status, backoff))
+            time.sleep(backoff)
@@ -1,92 +1,342 @@
-from googleapiclient.discovery import build
-from oauth2client.service_account import ServiceAccountCredentials
-import gspread
+# Import the shared Google API client layer. The slow to import Google API client packages are only imported once a
+# client is needed.
+import google_client
 import pandas as pd
+from pandas.api.types import union_categoricals
+import hashlib
+import json
 import logging
+import os
+import queue
+import time
+from concurrent.futures import ThreadPoolExecutor
 
 
-# If modifying these scopes, delete the file token.pickle.
-SCOPES = ['https://spreadsheets.google.com/feeds',
-         'https://www.googleapis.com/auth/drive']
-
 # The ID and range of the spreadsheet.
 SPREADSHEET_ID = '1XnC6bZ_iVB7KttuSGa2h8ZlUZx-VsTspwgPOTOxIbeA'
 READ_RANGE = 'Tracking!A:J'
 
+# The tracking sheet is read in pages of PAGE_ROWS rows, with up to PAGE_WORKERS pages downloaded at a time.
+PAGE_ROWS = 10000
+PAGE_WORKERS = 4
+
+# Default location of the cached sheet downloads. Can be overridden with GSHEET_CACHE_DIR in the .env file.
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cdot_tracking', 'gsheet_cache')
+
+# Cached downloads older than CACHE_MAX_AGE seconds are evicted, as are the oldest ones once the cache holds more
+# than CACHE_MAX_BYTES.
+CACHE_MAX_AGE = 7 * 24 * 60 * 60
+CACHE_MAX_BYTES = 100 * 1024 * 1024
+
+
+def _get_revision(drive_service, spreadsheet_id):
+    """
+    Helper method that returns the current revision of a spreadsheet or None if the Drive metadata is unavailable.
+    """
+    try:
+        metadata = google_client.call(drive_service.files().get(fileId=spreadsheet_id,
+                                                                fields='version,modifiedTime').execute)
+    except Exception as e:
+        logging.warning('Could not look up the revision of the Google Sheet. {}'.format(e))
+        return None
+
+    if not metadata.get('version') and not metadata.get('modifiedTime'):
+        return None
+    return '{}@{}'.format(metadata.get('version'), metadata.get('modifiedTime'))
+
+
+def _cache_file(cache_dir, spreadsheet_id, read_range):
+    """
+    Helper method that returns the path of the cached download of a spreadsheet range.
+    """
+    key = hashlib.sha1('{}!{}'.format(spreadsheet_id, read_range).encode('utf-8')).hexdigest()
+    return os.path.join(cache_dir, key + '.json')
+
+
+def _read_cache(cache_file, revision):
+    """
+    Helper method that returns the cached values if they were downloaded at the given revision, otherwise None.
+    """
+    try:
+        with open(cache_file) as f:
+            cached = json.load(f)
+    except (OSError, ValueError):
+        return None
+
+    if cached.get('revision') != revision:
+        return None
+    return cached.get('values')
+
+
+def _write_cache(cache_file, revision, values):
+    """
+    Helper method that saves downloaded values together with the revision they were downloaded at. The values are
+    written one row at a time, so they can be generated from the DataFrame without building the whole list.
+    """
+    os.makedirs(os.path.dirname(cache_file), exist_ok=True)
+
+    # Write to a temporary file first so a concurrent run never reads a partial file.
+    tmp_file = cache_file + '.tmp'
+    with open(tmp_file, 'w') as f:
+        f.write('{{"revision": {}, "values": ['.format(json.dumps(revision)))
+        for num, row in enumerate(values):
+            f.write((', ' if num else '') + json.dumps(row))
+        f.write(']}')
+    os.replace(tmp_file, cache_file)
+
+
+def _frame_values(df):
+    """
+    Helper method that yields the header and rows of a DataFrame read from a Google Sheet, with None for empty cells.
+    """
+    yield [str(col) for col in df.columns]
+    for row in df.itertuples(index=False, name=None):
+        yield [None if pd.isna(val) else val for val in row]
+
+
+def _page_ranges(read_range, row_count, page_rows):
+    """
+    Helper method that splits a range of whole columns, e.g. Tracking!A:J, into ranges of page_rows rows.
+    """
+    sheet, columns = read_range.split('!')
+    first_col, last_col = columns.split(':')
+    return ['{}!{}{}:{}{}'.format(sheet, first_col, start, last_col, min(start + page_rows - 1, row_count))
+            for start in range(1, row_count + 1, page_rows)]
+
+
+def _get_row_count(service, spreadsheet_id, read_range):
+    """
+    Helper method that returns the number of rows of the sheet a range is read from.
+    """
+    sheet_name = read_range.split('!')[0]
+    metadata = google_client.call(service.spreadsheets().get(
+        spreadsheetId=spreadsheet_id, ranges=[sheet_name], fields='sheets.properties.gridProperties.rowCount').execute)
+    return metadata['sheets'][0]['properties']['gridProperties']['rowCount']
+
+
+def _read_page(service, spreadsheet_id, page_range):
+    """
+    Helper method that downloads the values of one page. A failed page is retried on its own by google_client.call.
+    """
+    result = google_client.call(service.spreadsheets().values().get(spreadsheetId=spreadsheet_id,
+                                                                    range=page_range).execute)
+    return result.get('values', [])
+
+
+def _page_frame(header, rows):
+    """
+    Helper method that converts the rows of a page to a DataFrame of categoricals, so the same few senders,
+    receivers and dates repeated on many rows are only kept once. The Sheets API leaves out empty cells at the end of
+    a row, so rows are padded to the width of the header.
+    """
+    rows = [row + [None] * (len(header) - len(row)) for row in rows]
+    return pd.DataFrame(rows, columns=header).astype('category')
+
+
+def _concat_pages(header, pages):
+    """
+    Helper method that combines the pages of a sheet, in order, into one DataFrame.
+
+    :param header: Column names read from the first row of the sheet.
+    :param pages: List of (DataFrame, number of rows) tuples of every page. The Sheets API leaves out empty rows at the
+    end of a range, so pages followed by a page with values are padded with empty rows to their number of rows.
+    """
+    last = max([num for num, (df, _) in enumerate(pages) if len(df)] + [0])
+    frames = []
+    for num, (df, num_rows) in enumerate(pages):
+        frames.append(df)
+        if num < last and len(df) < num_rows:
+            frames.append(_page_frame(header, [[]] * (num_rows - len(df))))
+    return pd.DataFrame({col: union_categoricals([df[col].array for df in frames]) for col in header})
+
 
-def get_gsheet_data():
+def evict_cache(cache_dir, max_age=CACHE_MAX_AGE, max_bytes=CACHE_MAX_BYTES):
+    """
+    Removes cached downloads older than max_age seconds, then the oldest ones until the cache fits in max_bytes.
+
+    :param cache_dir: Directory holding the cached downloads.
+    :param max_age: Maximum age in seconds of a cached download.
+    :param max_bytes: Maximum total size in bytes of the cached downloads.
+    """
+    if not os.path.isdir(cache_dir):
+        return
+
+    now = time.time()
+    files = []
+    for name in os.listdir(cache_dir):
+        if not name.endswith('.json'):
+            continue
+        path = os.path.join(cache_dir, name)
+        stat = os.stat(path)
+        if now - stat.st_mtime > max_age:
+            os.remove(path)
+        else:
+            files.append((stat.st_mtime, stat.st_size, path))
+
+    total = sum(size for _, size, _ in files)
+    for _, size, path in sorted(files):
+        if total <= max_bytes:
+            break
+        os.remove(path)
+        total -= size
+
+
+def get_gsheet_data(service=None, drive_service=None, cache_dir=None, spreadsheet_id=SPREADSHEET_ID,
+                    page_rows=PAGE_ROWS):
     """
     Get's all of the data in the specified Google Sheet.
+
+    The sheet is read in pages of page_rows rows, up to PAGE_WORKERS at a time, and each page is converted to
+    categorical columns as it arrives. A page failing with a transient error is retried on its own.
+
+    The last download is cached locally together with the revision of the spreadsheet. The values are only
+    downloaded again when the spreadsheet changed since, or when its revision can't be looked up.
+
+    :param service: Sheets API client. Defaults to the shared clients from google_client.get_sheets_service.
+    :param drive_service: Drive API client. Defaults to the shared client from google_client.get_drive_service.
+    :param cache_dir: Directory holding the cached downloads. Defaults to GSHEET_CACHE_DIR from the .env file or
+    DEFAULT_CACHE_DIR.
+    :param spreadsheet_id: ID of the spreadsheet holding the tracking sheet.
+    :param page_rows: Number of rows downloaded per request.
     """
 
-    # Get Credentials from JSON
+    # Get the Sheets and Drive API clients. Pages read concurrently take a Sheets client per slot.
     logging.info('Attempting to read values to Google Sheet.')
-    creds = ServiceAccountCredentials.from_json_keyfile_name('TrackCompounds-1306f02bc0b1.json', SCOPES)
-    logging.info('Authorizing Google API credentials.')
-    service = build('sheets', 'v4', credentials=creds)
-
-    # Call the Sheets API
-    sheet = service.spreadsheets()
-    result = sheet.values().get(spreadsheetId=SPREADSHEET_ID,
-                                range=READ_RANGE).execute()
-    data = result.get('values')
-
-    # Turn data into a DataFrame
-    df = pd.DataFrame(data[1:], columns=data[0])
+    get_service = (lambda slot: service) if service is not None else google_client.get_sheets_service
+    drive_service = drive_service or google_client.get_drive_service()
+    cache_dir = cache_dir or os.getenv('GSHEET_CACHE_DIR', DEFAULT_CACHE_DIR)
+    cache_file = _cache_file(cache_dir, spreadsheet_id, READ_RANGE)
+
+    # Use the cached download if the spreadsheet has not changed since. The revision is looked up before the values
+    # are downloaded so an edit made in between is picked up by the next run.
+    revision = _get_revision(drive_service, spreadsheet_id)
+    data = _read_cache(cache_file, revision) if revision is not None else None
+
+    if data is not None:
+        logging.info('Google Sheet unchanged since the last download, using the cached values.')
+        df = _page_frame(data[0], data[1:])
+    else:
+        # Read the first page for the header, then the other pages at the same time.
+        page_ranges = _page_ranges(READ_RANGE, _get_row_count(get_service(0), spreadsheet_id, READ_RANGE),
+                                   page_rows)
+        values = _read_page(get_service(0), spreadsheet_id, page_ranges[0])
+        header = values[0]
+        pages = [(_page_frame(header, values[1:]), page_rows - 1)]
+        del values
+
+        slots = queue.Queue()
+        for slot in range(PAGE_WORKERS):
+            slots.put(slot)
+
+        def read_page(page_range):
+            slot = slots.get()
+            try:
+                return _page_frame(header, _read_page(get_service(slot), spreadsheet_id, page_range)), page_rows
+            finally:
+                slots.put(slot)
+
+        logging.info('Reading {} pages of {} rows from Google Sheet...'.format(len(page_ranges), page_rows))
+        with ThreadPoolExecutor(max_workers=PAGE_WORKERS) as executor:
+            pages.extend(executor.map(read_page, page_ranges[1:]))
+        df = _concat_pages(header, pages)
+
+        if revision is not None:
+            _write_cache(cache_file, revision, _frame_values(df))
+
+    evict_cache(cache_dir)
     logging.info('Successfully read G-Sheet data into a DataFrame.')
 
     return df
 
 
-def iter_pd(df):
+def df_to_values(df):
     """
-    Helper method that helps write a DataFrame to a Google sheet.
+    Helper method that turns a DataFrame into rows of plain values for a Google sheet, starting with the header.
     """
-    for val in df.columns:
-        yield val
-    for row in df.to_numpy():
-        for val in row:
-            if pd.isna(val):
-                yield ""
-            else:
-                yield val
+    values = [[str(col) for col in df.columns]]
+    for row in df.itertuples(index=False, name=None):
+        values.append(['' if pd.isna(val) else val.item() if hasattr(val, 'item') else val for val in row])
+    return values
+
+
+def _changed_row_ranges(values, current):
+    """
+    Helper method that yields the (first, last) row indexes of each contiguous block of rows in values that differ
+    from the current contents of the worksheet.
+    """
+    first = None
+    for i, row in enumerate(values):
+        changed = i >= len(current) or [str(val) for val in row] != current[i]
+        if changed and first is None:
+            first = i
+        elif not changed and first is not None:
+            yield first, i - 1
+            first = None
+    if first is not None:
+        yield first, len(values) - 1
 
 
 def pandas_to_sheets(pandas_df, sheet, clear=True):
     """
     Updates all values in a worksheet to match a pandas dataframe
+
+    The current contents of the worksheet are read first and only the rows that changed are written, in a single
+    batch update. Trailing rows that are no longer needed are cleared afterwards, so the tab is never blank.
+
+    :param pandas_df: DataFrame to write.
+    :param sheet: gspread Worksheet to update.
+    :param clear: Clear the rows below the DataFrame left over from a previous, longer write.
     """
+    import gspread
+
+    values = df_to_values(pandas_df)
+    current = google_client.call(sheet.get_all_values)
 
-    # Clear the sheet
-    if clear:
-        sheet.clear()
-    (row, col) = pandas_df.shape
-    cells = sheet.range("A1:{}".format(gspread.utils.rowcol_to_a1(row + 1, col)))
-    for cell, val in zip(cells, iter_pd(pandas_df)):
-        cell.value = val
-    sheet.update_cells(cells)
+    # Pad all rows to the same width so columns left over from a previous, wider write are blanked too.
+    width = max([len(values[0])] + [len(row) for row in current])
+    values = [row + [''] * (width - len(row)) for row in values]
+    current = [row + [''] * (width - len(row)) for row in current]
 
+    # Grow the worksheet if the values don't fit. Adding rows or columns again after a server error could add them
+    # twice, so these requests are only retried when rate limited.
+    if len(values) > sheet.row_count:
+        google_client.call(sheet.add_rows, len(values) - sheet.row_count,
+                           retry_statuses=google_client.RATE_LIMIT_STATUSES)
+    if width > sheet.col_count:
+        google_client.call(sheet.add_cols, width - sheet.col_count, retry_statuses=google_client.RATE_LIMIT_STATUSES)
 
-def write_gsheet_data(df):
+    # Write the changed rows in a single request.
+    data = [{'range': '{}:{}'.format(gspread.utils.rowcol_to_a1(first + 1, 1),
+                                     gspread.utils.rowcol_to_a1(last + 1, width)),
+             'values': values[first:last + 1]}
+            for first, last in _changed_row_ranges(values, current)]
+    if data:
+        google_client.call(sheet.batch_update, data, value_input_option='RAW')
+    logging.info('Wrote {} changed row ranges to Google Sheet.'.format(len(data)))
+
+    # Clear the rows that are no longer needed
+    if clear and len(current) > len(values):
+        google_client.call(sheet.batch_clear, ['{}:{}'.format(gspread.utils.rowcol_to_a1(len(values) + 1, 1),
+                                                              gspread.utils.rowcol_to_a1(len(current), width))])
+
+
+def write_gsheet_data(df, spreadsheet_id=SPREADSHEET_ID):
     """
     Method that writes data to a google sheet.
 
     param: df: DataFrame to write.
+    param: spreadsheet_id: ID of the spreadsheet to write to.
     """
     logging.info('Attempting to write values to Google Sheet.')
 
-    # Get API credentials.
-    creds = ServiceAccountCredentials.from_json_keyfile_name('TrackCompounds-1306f02bc0b1.json', SCOPES)
-
-    logging.info('Authorizing Google API credentials.')
-    # Authorize the credentials
-    gc = gspread.authorize(creds)
+    # Get the authorized gspread client
+    gc = google_client.get_gspread_client()
 
     # Open the workbook
-    workbook = gc.open_by_key(SPREADSHEET_ID)
+    workbook = google_client.call(gc.open_by_key, spreadsheet_id)
 
     # Write data to a Google Sheet
-    pandas_to_sheets(pandas_df=df, sheet=workbook.worksheet("Compounds Received but Not Tested"))
+    pandas_to_sheets(pandas_df=df, sheet=google_client.call(workbook.worksheet, "Compounds Received but Not Tested"))
 
     logging.info('Values successfully written to Google Sheet.')
 
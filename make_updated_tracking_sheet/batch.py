@@ -0,0 +1,143 @@
+"""Batch method and helper methods for updating the tracking sheets of several targets in one run."""
+
+# Import the single target run of the app, the SPR results download and the sources and sinks of a run
+from make_updated_tracking_sheet.make_updated_tracking_sheet import run, StageError
+from make_updated_tracking_sheet.resultsdb import get_dot_data_for_targets, FETCH_SIZE
+from make_updated_tracking_sheet import sources
+from make_updated_tracking_sheet import sinks
+
+# Import the Google API client layer to split its request quota between the worker processes
+import google_client
+
+# Import system packages
+import json
+import os
+
+# Import package used to spread the targets across cores
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+# Import logging package
+import logging
+
+# Keys every target in the targets file must have.
+TARGET_KEYS = ['project_code', 'protein_id', 'spreadsheet_id', 'save_file']
+
+
+def load_targets(targets_file):
+    """
+    Reads the targets to update from a JSON file holding a list of objects with the keys in TARGET_KEYS, e.g.
+
+    [{"project_code": 7279, "protein_id": "BIP-0384-01", "spreadsheet_id": "1XnC6bZ_...", "save_file": "KRAS_G12D"}]
+
+    :param targets_file: Path of the JSON targets file.
+    """
+    with open(targets_file) as f:
+        targets = json.load(f)
+
+    if not isinstance(targets, list) or not targets:
+        raise ValueError('The targets file {} must hold a non empty list of targets.'.format(targets_file))
+    for num, target in enumerate(targets):
+        missing = [key for key in TARGET_KEYS if key not in target]
+        if missing:
+            raise ValueError('Target {} in {} is missing {}.'.format(num, targets_file, ', '.join(missing)))
+
+    save_files = [target['save_file'] for target in targets]
+    if len(set(save_files)) < len(save_files):
+        raise ValueError('Every target in {} needs its own save_file.'.format(targets_file))
+
+    return targets
+
+
+def _run_target(target, df_spr_dot_data, all_run_dates=False, output_format='xlsx', history_db=None,
+                pivot_format='wide', transform_engine='memory'):
+    """
+    Private method that reads the tracking sheet of one target, updates it with the SPR results of the target and
+    writes the results to the saved file, the Google Sheet of the target and the run history, see run.
+
+    :param target: Dict with the keys in TARGET_KEYS.
+    :param df_spr_dot_data: SPR results of the target as returned by get_dot_data_for_targets.
+    :param all_run_dates: List every date a compound was run instead of only the most recent one.
+    :param output_format: Format of the saved results. One of OUTPUT_FORMATS.
+    :param history_db: Path of the SQLite file the results are appended to. Not recorded if None.
+    :param pivot_format: Layout of the pivoted tracking sheet. One of PIVOT_FORMATS.
+    :param transform_engine: Engine the tracking sheet is updated with. One of ENGINES.
+    """
+    logging.info('Updating tracking sheet {}...'.format(target['save_file']))
+
+    output_sinks = [sinks.FileSink(save_file=target['save_file'], output_format=output_format),
+                    sinks.GoogleSheetSink(spreadsheet_id=target['spreadsheet_id'])]
+    if history_db:
+        output_sinks.append(sinks.HistorySink(history_db=history_db, save_file=target['save_file']))
+
+    run(tracking_source=sources.GoogleSheetSource(spreadsheet_id=target['spreadsheet_id']),
+        spr_source=sources.MemorySource(df_spr_dot_data, stage='download spr results'), output_sinks=output_sinks,
+        all_run_dates=all_run_dates, pivot_format=pivot_format, transform_engine=transform_engine)
+
+    return target['save_file']
+
+
+def _set_google_api_quota(quota):
+    """
+    Private method run at the start of each worker process that sets the number of Google API requests per minute of
+    the worker before its first request.
+
+    :param quota: Number of requests per minute.
+    """
+    os.environ['GOOGLE_API_QUOTA'] = str(quota)
+    google_client.get_rate_limiter.cache_clear()
+
+
+def run_batch(targets_file, full_resync=False, fetch_size=FETCH_SIZE, all_run_dates=False, output_format='xlsx',
+              processes=None, history_db=None, pivot_format='wide', transform_engine='memory'):
+    """
+    Batch method that updates the tracking sheet of every target in the targets file.
+
+    The SPR results of all targets are downloaded in one database query. Each target is then read, updated and saved
+    in its own process, writing its file, Google Sheet and run history at the same time. Every target runs to
+    completion, and a StageError reporting each failed target is raised at the end if any of them failed.
+
+    :param targets_file: Path of the JSON targets file. See load_targets.
+    :param full_resync: Discard the local cache of SPR results and download them all again.
+    :param fetch_size: Number of rows fetched from the database per round trip.
+    :param all_run_dates: List every date a compound was run instead of only the most recent one.
+    :param output_format: Format of the saved results. One of OUTPUT_FORMATS.
+    :param processes: Number of worker processes. Defaults to the number of cores. 1 runs the targets in this process.
+    :param history_db: Path of the SQLite file the results of every target are appended to. Not recorded if None.
+    :param pivot_format: Layout of the pivoted tracking sheets. One of PIVOT_FORMATS.
+    :param transform_engine: Engine the tracking sheets are updated with. One of ENGINES.
+    """
+    targets = load_targets(targets_file)
+
+    # Download the SPR results of every target at once
+    logging.info('Downloading spr results for {} targets from database...'.format(len(targets)))
+    spr_results = get_dot_data_for_targets(targets=[(target['project_code'], target['protein_id'])
+                                                    for target in targets],
+                                           full_resync=full_resync, fetch_size=fetch_size)
+
+    # A single worker runs the targets one after the other in this process. Each worker process has its own rate
+    # limiter, so the quota of the service account they share is split between them.
+    processes = processes or min(len(targets), os.cpu_count() or 1)
+    if processes > 1:
+        executor = ProcessPoolExecutor(max_workers=processes, initializer=_set_google_api_quota,
+                                       initargs=(max(1, google_client.get_quota() // processes),))
+    else:
+        executor = ThreadPoolExecutor(max_workers=processes)
+
+    errors = {}
+    with executor:
+        futures = {target['save_file']: executor.submit(_run_target, target,
+                                                        spr_results[(target['project_code'], target['protein_id'])],
+                                                        all_run_dates=all_run_dates, output_format=output_format,
+                                                        history_db=history_db, pivot_format=pivot_format,
+                                                        transform_engine=transform_engine)
+                   for target in targets}
+        for save_file, future in futures.items():
+            try:
+                future.result()
+            except Exception as e:
+                logging.error('Issue with target {}: {!r}'.format(save_file, e))
+                errors[save_file] = e
+
+    if errors:
+        raise StageError(errors) from next(iter(errors.values()))
+    logging.info('Updated tracking sheets of {} targets.'.format(len(targets)))
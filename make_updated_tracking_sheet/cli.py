@@ -2,14 +2,99 @@
 Entry point to 'make_updated_tracking_sheet' command line script.
 """
 
-from make_updated_tracking_sheet.make_updated_tracking_sheet import main
+from make_updated_tracking_sheet.make_updated_tracking_sheet import main, watch as run_watch, ENGINES
+from make_updated_tracking_sheet.sinks import OUTPUT_FORMATS
+from make_updated_tracking_sheet.transform import PIVOT_FORMATS
+from make_updated_tracking_sheet.batch import run_batch
+from make_updated_tracking_sheet.profiling import StageProfiler
 import click
 
 
 # Using click to manage the command line interface
 @click.command()
 @click.option('--file', '-f', is_flag=True,
-              help="Option to indicate reading tracking sheet from a file as opposed to reading directly from Google Sheets.")
-@click.option('--save_file', prompt="Please type the name of the updated tracking file NO .xlsx extension NEEDED")
-def run_main(file, save_file):
-    main(file=file, save_file=save_file)
\ No newline at end of file
+              help="Option to indicate reading tracking sheet from a file as opposed to reading directly from Google Sheets. "
+                   "The path of the file is asked for unless --tracking_csv is given.")
+@click.option('--save_file',
+              help="Name of the updated tracking file NO .xlsx extension NEEDED. Prompted for if not given.")
+@click.option('--full_resync', is_flag=True,
+              help="Option to discard the local cache of SPR results and download the full history again.")
+@click.option('--fetch_size', type=click.IntRange(min=1), default=5000, show_default=True,
+              help="Number of rows fetched from the database per round trip.")
+@click.option('--watch', is_flag=True,
+              help="Option to keep running and refresh the Google Sheet every --interval seconds until interrupted.")
+@click.option('--interval', type=click.IntRange(min=1), default=900, show_default=True,
+              help="Number of seconds between refreshes in --watch mode.")
+@click.option('--all_run_dates', is_flag=True,
+              help="Option to list every date a compound was run instead of only the most recent one.")
+@click.option('--format', 'output_format', type=click.Choice(OUTPUT_FORMATS), default='xlsx', show_default=True,
+              help="Format of the saved results. xlsx_stream writes the workbook in constant memory. csv, parquet and "
+                   "arrow save each tab to its own file.")
+@click.option('--targets', type=click.Path(exists=True, dir_okay=False),
+              help="JSON file listing the project_code, protein_id, spreadsheet_id and save_file of several targets to "
+                   "update in one batch run.")
+@click.option('--processes', type=click.IntRange(min=1),
+              help="Number of worker processes used by a --targets batch run. Defaults to the number of cores.")
+@click.option('--profile', type=click.Path(dir_okay=False),
+              help="Save the wall time, row counts and peak memory of each stage of the run to this JSON file.")
+@click.option('--trace_memory', is_flag=True,
+              help="Option to also record the memory allocated by each stage with tracemalloc in the --profile report.")
+@click.option('--cprofile', type=click.Path(file_okay=False),
+              help="Save cProfile stats of the merge, pivot and no data stages to this directory.")
+@click.option('--history_db', type=click.Path(dir_okay=False), envvar='HISTORY_DB',
+              help="Append the results of every run to this SQLite run history. Can also be set with HISTORY_DB in the "
+                   ".env file.")
+@click.option('--tracking_csv', type=click.Path(exists=True, dir_okay=False), multiple=True,
+              help="Read the tracking sheet from this .csv file instead of Google Sheets. Implies --file. Can be given "
+                   "several times to combine several files.")
+@click.option('--pivot_format', type=click.Choice(PIVOT_FORMATS), default='wide', show_default=True,
+              help="Layout of the pivoted tracking sheet. long saves a row per BRD, FROM, TO and field instead of a "
+                   "column per field, FROM and TO.")
+@click.option('--engine', 'transform_engine', type=click.Choice(ENGINES), default='memory', show_default=True,
+              help="Engine the tracking sheet is updated with. sqlite runs the merge, pivot and no data search as SQL "
+                   "over a temporary SQLite file, for SPR histories that don't fit in memory.")
+@click.option('--partitions', type=click.IntRange(min=1), default=1, show_default=True,
+              help="Number of hash partitions of the compounds the memory engine updates in parallel processes, up to "
+                   "one per core.")
+def run_main(file, save_file, full_resync, fetch_size, watch, interval, all_run_dates, output_format, targets,
+             processes, profile, trace_memory, cprofile, history_db, tracking_csv, pivot_format, transform_engine,
+             partitions):
+    file = file or bool(tracking_csv)
+
+    if partitions > 1 and (targets or transform_engine == 'sqlite'):
+        raise click.UsageError("--partitions splits a single run of the memory engine and can't be combined with "
+                               "--targets or --engine sqlite.")
+
+    if (profile or cprofile) and (targets or watch):
+        raise click.UsageError("--profile and --cprofile record single runs and can't be combined with --targets or "
+                               "--watch.")
+
+    if targets:
+        if file or watch:
+            raise click.UsageError("--targets can't be combined with --file or --watch.")
+        run_batch(targets_file=targets, full_resync=full_resync, fetch_size=fetch_size, all_run_dates=all_run_dates,
+                  output_format=output_format, processes=processes, history_db=history_db, pivot_format=pivot_format,
+                  transform_engine=transform_engine)
+        return
+
+    if save_file is None:
+        save_file = click.prompt("Please type the name of the updated tracking file NO .xlsx extension NEEDED")
+
+    if watch:
+        if file:
+            raise click.UsageError("--watch refreshes the Google Sheet and can't be combined with --file.")
+        run_watch(interval=interval, save_file=save_file, full_resync=full_resync, fetch_size=fetch_size,
+                  all_run_dates=all_run_dates, output_format=output_format, history_db=history_db,
+                  pivot_format=pivot_format, transform_engine=transform_engine, partitions=partitions)
+    else:
+        profiler = StageProfiler(trace_memory=trace_memory, cprofile_dir=cprofile)
+        try:
+            main(file=file, save_file=save_file, full_resync=full_resync, fetch_size=fetch_size,
+                 all_run_dates=all_run_dates, output_format=output_format, profiler=profiler,
+                 history_db=history_db, tracking_csv=list(tracking_csv), pivot_format=pivot_format,
+                 transform_engine=transform_engine, partitions=partitions)
+        finally:
+            # Save the report of failed runs too, so the failing stage can be found.
+            if profile:
+                profiler.write_report(profile)
+            profiler.stop()
@@ -0,0 +1,140 @@
+"""Local append-only history of the results of every run, for tracking how the state of each compound changes."""
+
+# Import system packages
+import datetime
+import os
+import sqlite3
+import logging
+
+# Import data wrangling Python packages
+import pandas as pd
+
+# Import the typed schema for writing dates as strings
+from make_updated_tracking_sheet import schema
+
+# Import the columns of the updated tracking sheet, which are saved for each run
+from make_updated_tracking_sheet.transform import TRACKING_COLUMNS
+
+# Sites compounds are received at and checked for missing data, as in the columns of df_cmpds_no_data.
+SITES = ['Broad', 'Viva']
+
+
+def open_history(history_path):
+    """
+    Opens the SQLite file holding the run history, creating it if it does not exist yet.
+
+    :param history_path: Path of the SQLite history file. A leading ~ is expanded to the home directory.
+    """
+    history_path = os.path.expanduser(history_path)
+    history_dir = os.path.dirname(history_path)
+    if history_dir:
+        os.makedirs(history_dir, exist_ok=True)
+
+    conn = sqlite3.connect(history_path)
+    conn.executescript('''
+        CREATE TABLE IF NOT EXISTS runs (RUN_ID INTEGER PRIMARY KEY, RUN_AT TEXT, VERSION TEXT, SAVE_FILE TEXT);
+        CREATE TABLE IF NOT EXISTS tracking (RUN_ID INTEGER REFERENCES runs (RUN_ID), BRD TEXT, "FROM" TEXT, "TO" TEXT,
+                                             DATE_RUN_BROAD TEXT, DATE_RUN_VIVA TEXT, DATE_RECEIVED TEXT);
+        CREATE TABLE IF NOT EXISTS no_data (RUN_ID INTEGER REFERENCES runs (RUN_ID), SITE TEXT, BRD TEXT);
+        CREATE INDEX IF NOT EXISTS ix_tracking_run ON tracking (RUN_ID, BRD);
+        CREATE INDEX IF NOT EXISTS ix_no_data_run ON no_data (RUN_ID, SITE, BRD);
+    ''')
+    return conn
+
+
+def record_run(conn, df_tracking, df_cmpds_no_data, version, save_file=None, run_at=None):
+    """
+    Appends the results of a run to the history and returns the id of the run.
+
+    :param conn: Connection to the history returned by open_history.
+    :param df_tracking: Updated tracking sheet. Only its TRACKING_COLUMNS are saved.
+    :param df_cmpds_no_data: Compounds received but not run with the SITES headers, as returned by get_cmpds_no_data.
+    :param version: Version of the app that made the run.
+    :param save_file: Name of the file the results were saved to.
+    :param run_at: Time of the run. Defaults to now.
+    """
+    run_at = run_at or datetime.datetime.now()
+
+    df_tracking = schema.render_dates(df_tracking[TRACKING_COLUMNS]).astype(object)
+    tracking_rows = df_tracking.where(df_tracking.notna(), None).itertuples(index=False, name=None)
+
+    # The no data table is saved one row per site and compound rather than side by side.
+    no_data_rows = [(site, brd) for site in SITES for brd in df_cmpds_no_data[site].dropna()]
+
+    # Insert the whole run in one transaction so an interrupted run never leaves a partial run behind.
+    with conn:
+        run_id = conn.execute('INSERT INTO runs (RUN_AT, VERSION, SAVE_FILE) VALUES (?, ?, ?)',
+                              (run_at.isoformat(timespec='seconds'), str(version), save_file)).lastrowid
+        conn.executemany('INSERT INTO tracking VALUES (?, ?, ?, ?, ?, ?, ?)',
+                         ((run_id,) + row for row in tracking_rows))
+        conn.executemany('INSERT INTO no_data VALUES (?, ?, ?)', ((run_id,) + row for row in no_data_rows))
+
+    logging.info('Recorded run {} with {} compounds received but not run in the history.'.format(
+        run_id, len(no_data_rows)))
+    return run_id
+
+
+def read_runs(conn, save_file=None):
+    """
+    Returns the recorded runs as a DataFrame with the headers RUN_ID, RUN_AT, VERSION and SAVE_FILE, oldest first.
+
+    :param conn: Connection to the history returned by open_history.
+    :param save_file: Only return the runs saved to this file.
+    """
+    query = 'SELECT RUN_ID, RUN_AT, VERSION, SAVE_FILE FROM runs'
+    params = ()
+    if save_file is not None:
+        query += ' WHERE SAVE_FILE = ?'
+        params = (save_file,)
+    return pd.read_sql_query(query + ' ORDER BY RUN_ID', conn, params=params)
+
+
+def read_run(conn, run_id):
+    """
+    Returns the updated tracking sheet and the compounds received but not run that were recorded by a run.
+
+    :param conn: Connection to the history returned by open_history.
+    :param run_id: Id of the run as returned by record_run.
+    """
+    df_tracking = pd.read_sql_query('SELECT BRD, "FROM", "TO", DATE_RUN_BROAD, DATE_RUN_VIVA, DATE_RECEIVED '
+                                    'FROM tracking WHERE RUN_ID = ? ORDER BY rowid', conn, params=(int(run_id),))
+    df_no_data = pd.read_sql_query('SELECT SITE, BRD FROM no_data WHERE RUN_ID = ? ORDER BY rowid', conn,
+                                   params=(int(run_id),))
+    return df_tracking, df_no_data
+
+
+def compounds_tested_since(conn, since, save_file=None):
+    """
+    Returns the compounds that were received but not run at a site as of a date and have been run there since.
+
+    The state as of the date is that of the last run on or before it, or of the first run after it if there is none.
+    It is compared with the most recent run. Returns a DataFrame with the headers BRD, SITE and DATE_RUN, the date the
+    compound was run at the site as recorded by the most recent run.
+
+    :param conn: Connection to the history returned by open_history.
+    :param since: Date or datetime to compare the most recent run with.
+    :param save_file: Only compare the runs saved to this file.
+    """
+    df_runs = read_runs(conn, save_file=save_file)
+    if df_runs.empty:
+        return pd.DataFrame(columns=['BRD', 'SITE', 'DATE_RUN'])
+
+    since = pd.Timestamp(since)
+    run_at = pd.to_datetime(df_runs['RUN_AT'])
+    before = df_runs[run_at <= since]
+    first_run = before['RUN_ID'].iloc[-1] if len(before) else df_runs['RUN_ID'].iloc[0]
+    last_run = df_runs['RUN_ID'].iloc[-1]
+
+    query = '''
+        SELECT was.BRD, was.SITE,
+               MAX(CASE was.SITE WHEN 'Broad' THEN now.DATE_RUN_BROAD ELSE now.DATE_RUN_VIVA END) AS DATE_RUN
+        FROM no_data AS was
+        JOIN tracking AS now ON now.RUN_ID = :last_run AND now.BRD = was.BRD
+        WHERE was.RUN_ID = :first_run
+          AND NOT EXISTS (SELECT 1 FROM no_data AS still
+                          WHERE still.RUN_ID = :last_run AND still.SITE = was.SITE AND still.BRD = was.BRD)
+        GROUP BY was.SITE, was.BRD
+        HAVING DATE_RUN IS NOT NULL
+        ORDER BY was.SITE, was.BRD
+    '''
+    return pd.read_sql_query(query, conn, params={'first_run': int(first_run), 'last_run': int(last_run)})
@@ -1,39 +1,50 @@
 """Main method and helper methods for make_updated_tracking_sheet.py"""
 
-# Import the version of the script that can be used to tag the output file.
-from _version import __version__
+# Import the typed schema the frames are converted to before they are merged.
+from make_updated_tracking_sheet import schema
 
-# Import module for downloading Google sheet data.
-import google_sheet_data
+# Import the transform steps shared by the engines.
+from make_updated_tracking_sheet import transform
 
-# Import packages needed to query Oracle database.
-import cx_Oracle
-import sqlalchemy
-import crypt
+# Import the sources the inputs are read from and the sinks the results are written to.
+from make_updated_tracking_sheet import sources
+from make_updated_tracking_sheet import sinks
 
-# Import system packages for determining what OS the script is running on..
-import platform
-import os
+# Import the out-of-core engine running the transform as SQL over a SQLite file.
+from make_updated_tracking_sheet import sql_engine
+
+# Import the multi-core engine running the transform on hash partitions of the compounds.
+from make_updated_tracking_sheet import partitioned
+
+# Import the number of rows fetched from resultsdb per round trip.
+from make_updated_tracking_sheet.resultsdb import FETCH_SIZE
+
+# Import the per stage instrumentation of a run
+from make_updated_tracking_sheet.profiling import StageProfiler
+
+# Import packages used to keep the database engine alive between refreshes.
+import functools
+import signal
+import threading
+
+# Import package used to run independent stages concurrently
+from concurrent.futures import ThreadPoolExecutor
 
 # Import data wrangling Python packages
 import pandas as pd
-import numpy as np
 
 # Import logging package
 # Configure logger
 import logging
 logging.basicConfig(level=logging.INFO)
 
-# Get the users home directory
-if platform.system() == "Windows":
-    from pathlib import Path
+# Engines the tracking sheet can be updated with: in memory with pandas, or out of core in a temporary SQLite file.
+ENGINES = ['memory', 'sqlite']
 
-    homedir = str(Path.home())
-else:
-    homedir = os.environ['HOME']
 
-
-def main(file, save_file):
+def main(file, save_file, full_resync=False, fetch_size=FETCH_SIZE, all_run_dates=False, output_format='xlsx',
+         profiler=None, history_db=None, tracking_csv=None, pivot_format='wide', transform_engine='memory',
+         partitions=1):
     """
     Main method that does the following work...
 
@@ -45,230 +56,277 @@ def main(file, save_file):
     4. Uses the new df to update the read in table
     5. Creates a new DataFrame by pivoting the updated table on BROAD ID
     6. Saves the updated non-pivoted table and pivoted table to an Excel file.
-    """
 
-    try:
-        logging.info('Reading in original tracking file...')
-        if file:
-            t_file_path = input("Please paste the path of the tracking file as a .csv ")
-            df_ori_tracking = pd.read_csv(t_file_path)
-        else:
-            df_ori_tracking = google_sheet_data.get_gsheet_data()
-    except Exception:
-        raise RuntimeError('Issue reading in tracking file from Google Sheet.')
-
-    # Clean up the original tracking file
-    df_ori_tracking['BRD'] = df_ori_tracking['BRD'].apply(lambda x: x[:22])
-
-    # Get all SPR data from Dotmatics
-    logging.info('Attempting to download spr results from database...')
-    df_spr_dot_data = get_dot_data()
-
-    # Clean the data column in Dotmatics as it is reparet is Y_m_d and we want Y-m-d
-    df_spr_dot_data['DATE'] = df_spr_dot_data['DATE'].apply(lambda x: x.replace('_', '-'))
-    
-    # Drop all duplicate repeats except for the most recent
-    df_spr_dot_data = df_spr_dot_data.sort_values(by=['BROAD_ID', 'COMPOUND_MW', 'DATE'])
-    df_spr_dot_data = df_spr_dot_data.reset_index(drop=True)
-
-    # Split the database results into two DataFrames by OPERATOR
-    df_spr_data_dot_viva = df_spr_dot_data[df_spr_dot_data['OPERATOR'] == 'Viva_Biotech'].copy()
-    df_spr_data_dot_viva = df_spr_data_dot_viva.reset_index(drop=True)
-    df_spr_dot_data_not_viva = df_spr_dot_data[df_spr_dot_data['OPERATOR'] != 'Viva_Biotech'].copy()
-    df_spr_dot_data_not_viva = df_spr_dot_data_not_viva.reset_index(drop=True)
-
-    # For Viva data, update the `DATE_RUN_VIVA` field
-    df_spr_data_dot_viva = df_spr_data_dot_viva[['BROAD_ID', 'COMPOUND_MW', 'DATE']]
-    df_merge_tracking = pd.merge(left=df_ori_tracking, right=df_spr_data_dot_viva,
-                                 left_on='BRD', right_on='BROAD_ID', how='left')
-    df_merge_tracking = df_merge_tracking.reset_index(drop=True)
-    df_merge_tracking['DATE_RUN_VIVA'] = df_merge_tracking['DATE']
-
-    # Drop unneeded columns
-    df_merge_tracking = df_merge_tracking.drop(columns=['BROAD_ID', 'DATE'])
-
-    # For Broad data update the Date run field
-    df_spr_dot_data_not_viva = df_spr_dot_data_not_viva[['BROAD_ID', 'DATE']]
-    df_merge_tracking = pd.merge(left=df_merge_tracking, right=df_spr_dot_data_not_viva,
-                                 left_on='BRD', right_on='BROAD_ID', how='left')
-    df_merge_tracking = df_merge_tracking.reset_index(drop=True)
-    df_merge_tracking['DATE_RUN_BROAD'] = df_merge_tracking['DATE']
-
-    # Drop unneeded columns
-    df_merge_tracking = df_merge_tracking.drop(columns=['BROAD_ID', 'DATE'])
-
-    # Make a copy of the merged DataFrame
-    df_merge_tracking_cp = df_merge_tracking.copy()
-    df_merge_tracking_cp = df_merge_tracking_cp[['BRD', 'FROM', 'TO', 'DATE_RUN_BROAD', 'DATE_RUN_VIVA', 'DATE_RECEIVED']]
-
-    # Pivot the final results of the tracking sheet so that a Broad ID is a unique identifier
-    df_pivoted_tracking = pd.pivot_table(data=df_merge_tracking_cp, index=['BRD'], columns=['FROM', 'TO'],
-                                                        aggfunc=lambda x: ' '.join(str(v) for v in x))
-
-    # Replace nan with empty string
-    df_pivoted_tracking = df_pivoted_tracking.replace('nan', '', regex=True)
-
-    # Get all the compounds that were received with no data
-    df_cmpds_no_data = get_cmpds_no_data(df=df_merge_tracking_cp)
-
-    # Save the output file to an Excel workbook and Save compounds not tested to Google Sheet
-    try:
-        logging.info('Saving file to Excel workbook...')
-        save_output(df_1=df_merge_tracking, df_2=df_pivoted_tracking, df_3=df_cmpds_no_data, save_file=save_file)
-        if not file:
-            google_sheet_data.write_gsheet_data(df=df_cmpds_no_data)
-    except Exception:
-        raise RuntimeError('Issue saving the output file.')
+    Steps 1 to 3 run concurrently with each other, as do saving the Excel file and writing the Google Sheet.
+
+    :param file: Read the tracking sheet from a .csv file instead of Google Sheets.
+    :param save_file: Name of the saved Excel file.
+    :param full_resync: Discard the local cache of SPR results and download them all again.
+    :param fetch_size: Number of rows fetched from the database per round trip.
+    :param all_run_dates: List every date a compound was run instead of only the most recent one.
+    :param output_format: Format of the saved results. One of OUTPUT_FORMATS.
+    :param profiler: StageProfiler recording each stage of the run.
+    :param history_db: Path of the SQLite file the results of the run are appended to. Not recorded if None.
+    :param tracking_csv: Paths of .csv files holding the tracking sheet. Implies file. If file is set without them the
+    path is asked for.
+    :param pivot_format: Layout of the pivoted tracking sheet. One of PIVOT_FORMATS.
+    :param transform_engine: Engine the tracking sheet is updated with. One of ENGINES.
+    :param partitions: Number of hash partitions of the compounds updated in parallel by the memory engine.
+    """
+    profiler = profiler or StageProfiler()
+
+    if tracking_csv:
+        file = True
+        tracking_source = sources.CsvSource(paths=tracking_csv)
+    elif file:
+        t_file_path = input("Please paste the path of the tracking file as a .csv ")
+        tracking_source = sources.CsvSource(paths=[t_file_path])
+    else:
+        tracking_source = sources.GoogleSheetSource()
+    spr_source = sources.OracleSource(full_resync=full_resync, fetch_size=fetch_size, profiler=profiler)
+
+    # Save the output file to an Excel workbook, and save compounds not tested to Google Sheet and the run history
+    output_sinks = [sinks.FileSink(save_file=save_file, output_format=output_format)]
+    if not file:
+        output_sinks.append(sinks.GoogleSheetSink())
+    if history_db:
+        output_sinks.append(sinks.HistorySink(history_db=history_db, save_file=save_file))
+
+    df_merge_tracking, df_pivoted_tracking, df_cmpds_no_data = run(
+        tracking_source=tracking_source, spr_source=spr_source, output_sinks=output_sinks, all_run_dates=all_run_dates,
+        profiler=profiler, pivot_format=pivot_format, transform_engine=transform_engine, partitions=partitions)
 
     # Return df's for testing purposes
-    return [df_merge_tracking_cp, df_pivoted_tracking, df_cmpds_no_data]
+    return [df_merge_tracking[transform.TRACKING_COLUMNS], df_pivoted_tracking, df_cmpds_no_data]
 
 
-def _connect(engine):
+def run(tracking_source, spr_source, output_sinks=(), all_run_dates=False, profiler=None, pivot_format='wide',
+        transform_engine='memory', partitions=1):
     """
-    Private method that actually makes the connection to resultsdb
-    :param engine: Sqlalchemy engine object
+    Method that reads the tracking sheet and SPR results from their sources, updates the tracking sheet and writes the
+    results to every sink. Returns the three result frames as update_tracking does.
+
+    The two sources are read concurrently, as are the sinks written. See the sources and sinks modules for the shipped
+    implementations. The sqlite engine loads the sources into its database instead, streaming those that allow it, see
+    the sql_engine module. Use update_tracking directly to transform already loaded DataFrames without any sources or
+    sinks.
+
+    :param tracking_source: Source of the tracking sheet.
+    :param spr_source: Source of the SPR results.
+    :param output_sinks: Sinks the results are written to.
+    :param all_run_dates: List every date a compound was run instead of only the most recent one.
+    :param profiler: StageProfiler recording each stage of the run.
+    :param pivot_format: Layout of the pivoted tracking sheet. One of PIVOT_FORMATS.
+    :param transform_engine: Engine the tracking sheet is updated with. One of ENGINES.
+    :param partitions: Number of hash partitions of the compounds updated in parallel by the memory engine.
     """
-    logging.info('Making a connection attempt to resultsdb...')
-    c = engine.connect()
-    logging.info('Connection successful, proceeding...')
-    return c
-
-
-def get_dot_data():
+    profiler = profiler or StageProfiler()
+
+    _check_engine(transform_engine=transform_engine, partitions=partitions)
+
+    # Read in the original tracking file and get all SPR data from Dotmatics at the same time. The reads are looked up
+    # by role, as both sources may be reported under the same stage name.
+    logging.info('Reading in original tracking file and downloading spr results from database...')
+    tracking_stage, spr_stage = _stage_names([tracking_source, spr_source])
+
+    if transform_engine == 'sqlite':
+        # The sqlite engine streams the tracking sheet into its database and attaches the cached SPR results, then
+        # updates the tracking sheet, pivots it and finds the compounds received with no data in SQL
+        with sql_engine.TrackingDatabase() as database:
+            _run_stages({tracking_stage: functools.partial(database.load_tracking, tracking_source),
+                         spr_stage: functools.partial(database.load_spr, spr_source)}, profiler=profiler)
+            df_merge_tracking, df_pivoted_tracking, df_cmpds_no_data = database.update(
+                all_run_dates=all_run_dates, profiler=profiler, pivot_format=pivot_format)
+    else:
+        results = _run_stages({tracking_stage: tracking_source.read, spr_stage: spr_source.read}, profiler=profiler)
+
+        # Update the tracking file with the SPR results, pivot it and find the compounds received with no data
+        df_merge_tracking, df_pivoted_tracking, df_cmpds_no_data = update_tracking(
+            df_ori_tracking=results[tracking_stage], df_spr_dot_data=results[spr_stage], all_run_dates=all_run_dates,
+            profiler=profiler, pivot_format=pivot_format, transform_engine=transform_engine, partitions=partitions)
+
+    # Write the results to every sink at the same time
+    write_stages = {name: functools.partial(sink.write, df_merge_tracking, df_pivoted_tracking, df_cmpds_no_data)
+                    for name, sink in zip(_stage_names(output_sinks), output_sinks)}
+    if write_stages:
+        logging.info('Saving results...')
+        _run_stages(write_stages, profiler=profiler, rows_in={name: len(df_merge_tracking) for name in write_stages})
+
+    return df_merge_tracking, df_pivoted_tracking, df_cmpds_no_data
+
+
+def _stage_names(parts):
     """
-    Downloads all SPR results from database and returns a DataFrame consisting of the following headers:
+    Private method that returns the stage name of each source or sink, numbering names reported more than once.
+    :param parts: Sources or sinks with a stage attribute.
+    """
+    names = []
+    for part in parts:
+        name, num = part.stage, 1
+        while name in names:
+            num += 1
+            name = '{} {}'.format(part.stage, num)
+        names.append(name)
+    return names
+
+
+def update_tracking(df_ori_tracking, df_spr_dot_data, all_run_dates=False, profiler=None, pivot_format='wide',
+                    transform_engine='memory', partitions=1):
+    """
+    Method that updates the tracking sheet with the dates the compounds were run and summarizes it.
+
+    Returns the updated tracking sheet, the tracking sheet pivoted so that each row has a unique BRD and the compounds
+    received by Broad and Viva but not run.
+
+    Both frames are converted to the typed schema first, see the schema module. The run dates of the updated tracking
+    sheet are datetime64, or strings with all_run_dates, and are written as Y-m-d strings by save_output.
+
+    The frames may also be given as pyarrow Tables. The memory engine does no I/O. The sqlite engine runs the same
+    steps as SQL over a temporary SQLite file instead, for SPR histories that don't fit in memory, see the sql_engine
+    module. With several partitions the memory engine splits the compounds by a hash of their BRD and updates each
+    partition in its own process, see the partitioned module.
+
+    :param df_ori_tracking: Tracking sheet as a DataFrame.
+    :param df_spr_dot_data: SPR results as returned by get_dot_data.
+    :param all_run_dates: List every date a compound was run instead of only the most recent one.
+    :param profiler: StageProfiler recording the merge, pivot and no data stages.
+    :param pivot_format: Layout of the pivoted tracking sheet. One of PIVOT_FORMATS, see pivot_tracking.
+    :param transform_engine: Engine the tracking sheet is updated with. One of ENGINES.
+    :param partitions: Number of hash partitions of the compounds updated in parallel by the memory engine.
+    """
+    _check_engine(transform_engine=transform_engine, partitions=partitions)
 
-    ['BROAD_ID', 'PROJECT_CODE', 'OPERATOR', 'PROTEIN_ID', 'DATE']
+    if transform_engine == 'sqlite':
+        return sql_engine.update_tracking(df_ori_tracking=df_ori_tracking, df_spr_dot_data=df_spr_dot_data,
+                                          all_run_dates=all_run_dates, profiler=profiler, pivot_format=pivot_format)
 
-    PROJECT_CODE = 7279
-    PROTEIN_ID = BIP-0384-01
-    """
+    if partitions > 1:
+        return partitioned.update_tracking(df_ori_tracking=df_ori_tracking, df_spr_dot_data=df_spr_dot_data,
+                                           partitions=partitions, all_run_dates=all_run_dates, profiler=profiler,
+                                           pivot_format=pivot_format)
 
-    # Create a cryptographic object
-    c = crypt.Crypt()
+    profiler = profiler or StageProfiler()
 
-    # Connect to database.
-    try:
-        host = 'cbpdb01'
-        port = '1521'
-        sid = 'cbplate'
-        user = os.getenv('DB_USER')
-        password = str(c.f.decrypt(c.token), 'utf-8')
-        sid = cx_Oracle.makedsn(host, port, sid=sid)
+    with profiler.stage('merge', rows_in=len(df_ori_tracking) + len(df_spr_dot_data), cprofile=True) as record:
+        df_ori_tracking = schema.to_frame(df_ori_tracking)
+        df_spr_dot_data = schema.to_frame(df_spr_dot_data)
 
-        cstr = 'oracle://{user}:{password}@{sid}'.format(
-            user=user,
-            password=password,
-            sid=sid
-        )
+        # Clean up the original tracking file and convert it to categorical keys
+        df_merge_tracking = schema.apply_tracking_schema(
+            df_ori_tracking.assign(BRD=transform.normalize_brd(df_ori_tracking['BRD'])))
 
-        engine = sqlalchemy.create_engine(cstr,
-                                          pool_recycle=3600,
-                                          pool_size=5,
-                                          echo=False
-                                          )
+        # Look up the run dates and molecular weight of every shipment in the SPR results
+        df_merge_tracking = transform.merge_runs(df_tracking=df_merge_tracking, df_spr_dot_data=df_spr_dot_data,
+                                                 all_run_dates=all_run_dates)
+        record['rows_out'] = len(df_merge_tracking)
 
-        # Connect to resultsdb by calling private connection method
-        conn = _connect(engine=engine)
+    # Select the columns that are pivoted and checked for compounds with no data
+    df_merge_tracking_cp = df_merge_tracking[transform.TRACKING_COLUMNS]
 
-    except Exception:
-        raise ConnectionError("\nCannot connect to resultsdb database. Make sure you are on the internal network and "
-                              "try again.")
+    with profiler.stage('pivot', rows_in=len(df_merge_tracking_cp), cprofile=True) as record:
+        # Pivot the final results of the tracking sheet so that a Broad ID is a unique identifier
+        df_pivoted_tracking = transform.pivot_tracking(df=df_merge_tracking_cp, long_format=pivot_format == 'long')
+        record['rows_out'] = len(df_pivoted_tracking)
 
-    # Reflect Tables
-    metadata = sqlalchemy.MetaData()
-    spr_data_tbl = sqlalchemy.Table('upload_spr_dose', metadata, autoload=True, autoload_with=engine)
+    with profiler.stage('no data', rows_in=len(df_merge_tracking_cp), cprofile=True) as record:
+        # Get all the compounds that were received with no data
+        df_cmpds_no_data = transform.get_cmpds_no_data(df=df_merge_tracking_cp)
+        record['rows_out'] = len(df_cmpds_no_data)
 
-    stmt = sqlalchemy.select([spr_data_tbl.c.broad_id, spr_data_tbl.c.project_code,
-                              spr_data_tbl.c.operator, spr_data_tbl.c.protein_id, spr_data_tbl.c.compound_mw,
-                              spr_data_tbl.c.date_]).where(spr_data_tbl.c.project_code == 7279)
+    return df_merge_tracking, df_pivoted_tracking, df_cmpds_no_data
 
-    # Execute the statement
-    results = conn.execute(stmt).fetchall()
 
-    # Create a DataFrame from results
-    df = pd.DataFrame(results)
+def _check_engine(transform_engine, partitions):
+    """
+    Private method that raises a ValueError if the engine can't update the tracking sheet in that many partitions.
+    :param transform_engine: Engine the tracking sheet is updated with. One of ENGINES.
+    :param partitions: Number of hash partitions of the compounds updated in parallel.
+    """
+    if transform_engine == 'sqlite' and partitions > 1:
+        raise ValueError('The sqlite engine runs in a single process and can\'t be split into partitions.')
 
-    # Assign column names to the DataFrame
-    df.columns = ['BROAD_ID', 'PROJECT_CODE', 'OPERATOR', 'PROTEIN_ID', 'COMPOUND_MW', 'DATE']
 
-    # TODO: Issue where filtering by bip using sqlalchemy fails
-    df = df[df['PROTEIN_ID'] == 'BIP-0384-01']
+class StageError(RuntimeError):
+    """
+    Raised when one or more stages of the app fail.
 
-    # Close the database connection
-    conn.close()
+    :param errors: Dict of the name of each failed stage to the exception it raised.
+    """
 
-    # Turn the results into a DataFrame.
-    return df
+    def __init__(self, errors):
+        self.errors = errors
+        super().__init__('Issue with stage(s) ' + '; '.join('{}: {!r}'.format(stage, e) for stage, e in errors.items()))
 
 
-def get_cmpds_no_data(df):
+def _run_stages(stages, profiler=None, rows_in=None):
     """
-    Method that finds the compounds received at Broad or Viva with no data in database.
+    Private method that runs independent stages concurrently in a thread pool and returns their results by name.
 
-    :param df: Tracking sheet updated with dates the compounds were run as a DataFrame
-    """
+    Every stage runs to completion. If any of them fail a StageError reporting each failed stage is raised.
 
-    # Filter out compounds not going to the Broad or Viva
-    df = df[(df['TO'] == 'Broad') | (df['TO'] == 'Viva')]
-
-    # Issue where some cells have spaces and those don't fill with nan.  Fill all empty cells with nan.
-    df = df.apply(lambda x: x.str.strip()).replace('', np.nan)
-
-    # Create master list of all compounds with no data.
-    df_all_not_run = df.dropna(subset=['DATE_RECEIVED']).copy()
-    df_all_not_run = df_all_not_run[(df_all_not_run['DATE_RUN_BROAD'].isnull()) &
-                                    (df_all_not_run['DATE_RUN_VIVA'].isnull())]
-    ls_not_run = set(df_all_not_run['BRD'])
-
-    # Find compounds received at Broad but not run.
-    df_broad = df[df['TO'] == 'Broad'].copy()
-    df_broad = df_broad.dropna(subset=['DATE_RECEIVED'])
-    df_broad = df_broad[df_broad['DATE_RUN_BROAD'].isnull()]
-    ls_broad = list(set(df_broad['BRD']))
-    ls_broad = [i for i in ls_not_run if i in ls_broad]
-
-    # Find compounds received at Viva but not run.
-    df_viva = df[df['TO'] == 'Viva'].copy()
-    df_viva = df_viva.dropna(subset=['DATE_RECEIVED'])
-    df_viva = df_viva[df_viva['DATE_RUN_VIVA'].isnull()]
-    ls_viva = list(set(df_viva['BRD']))
-    ls_viva = [i for i in ls_not_run if i in ls_viva]
-    
-    # Make the lists the same length as that is required to construct a DataFrame
-    if len(ls_broad) < len(ls_viva):
-        ls_broad.extend([np.nan] * (len(ls_viva) - len(ls_broad)))
-    if len(ls_viva) < len(ls_broad):
-        ls_viva.extend([np.nan] * (len(ls_broad) - len(ls_viva)))
-
-    # Turn results into a DataFrame
-    df_cmpds_no_data = pd.DataFrame({'Broad': ls_broad, 'Viva': ls_viva})
-
-    return df_cmpds_no_data
-
-
-def save_output(df_1, df_2, df_3, save_file):
+    :param stages: Dict of the name of each stage to a function that takes no arguments.
+    :param profiler: StageProfiler recording each stage.
+    :param rows_in: Dict of the name of a stage to the number of rows it reads.
+    """
+    profiler = profiler or StageProfiler()
+    rows_in = rows_in or {}
+
+    def run(name, stage):
+        with profiler.stage(name, rows_in=rows_in.get(name)) as record:
+            result = stage()
+            if isinstance(result, pd.DataFrame):
+                record['rows_out'] = len(result)
+        return result
+
+    results = {}
+    errors = {}
+    with ThreadPoolExecutor(max_workers=len(stages)) as executor:
+        futures = {name: executor.submit(run, name, stage) for name, stage in stages.items()}
+        for name, future in futures.items():
+            try:
+                results[name] = future.result()
+            except Exception as e:
+                logging.error('Issue with stage {}: {!r}'.format(name, e))
+                errors[name] = e
+
+    if errors:
+        raise StageError(errors) from next(iter(errors.values()))
+    return results
+
+
+def watch(interval, save_file, full_resync=False, refreshes=None, **kwargs):
     """
-    Method that does the work of saving the output to an Excel file.
+    Keeps the app running and refreshes the "Compounds Received but Not Tested" tab every interval seconds.
 
-    :param df_1: Original updated tracking sheet to save in one tab of an excel file
-    :param df_2: Pivoted tracking sheet where each row has a unique BRD. Save to another tab.
-    :param df_3: DataFrame containing compounds received by Broad and Viva but not run.
-    :param save_file: Path and name of the saved file.
+    The database engine, decrypted password and Google clients are created on the first refresh and reused by every
+    later one. On POSIX systems sending SIGUSR1 to the process triggers a refresh immediately.
 
+    :param interval: Number of seconds to wait between refreshes.
+    :param save_file: Name of the saved Excel file.
+    :param full_resync: Discard the local cache of SPR results on the first refresh.
+    :param refreshes: Number of refreshes to run before returning. Runs until interrupted if None.
+    :param kwargs: Other options passed on to main.
     """
-    # Note the version is saved to the file name so that data can be linked to the script version.
-    logging.info('Saving results to Excel workbook...')
-    save_file = save_file.replace('.xlsx', '')
-    save_file = os.path.join(homedir, 'Desktop', save_file + '_APPVersion_' + str(__version__))
-    save_file = save_file.replace('.', '_')
-    save_file = save_file + '.xlsx'
-
-    with pd.ExcelWriter(save_file) as writer:
-        df_1.to_excel(writer, sheet_name='Updated_Tracking')
-        df_2.to_excel(writer, sheet_name='Pivoted_Tracking')
-        df_3.to_excel(writer, sheet_name='Cmpds_Received_no_Data')
-
-    print('Program done!! Result file is on the Desktop')
+    refresh_now = threading.Event()
+    if hasattr(signal, 'SIGUSR1'):
+        signal.signal(signal.SIGUSR1, lambda signum, frame: refresh_now.set())
+
+    count = 0
+    while refreshes is None or count < refreshes:
+        # Any error of a single refresh, e.g. a malformed sheet or a locked SQLite file, is logged and the next
+        # refresh tries again. Only KeyboardInterrupt and SystemExit, which are not Exceptions, stop the loop.
+        try:
+            main(file=False, save_file=save_file, full_resync=full_resync, **kwargs)
+        except Exception:
+            logging.exception('Refresh failed, trying again at the next refresh.')
+
+        # Only the first refresh resyncs the full history.
+        full_resync = False
+        count += 1
+        if refreshes is not None and count >= refreshes:
+            break
+
+        logging.info('Next refresh in {} seconds...'.format(interval))
+        refresh_now.wait(timeout=interval)
+        refresh_now.clear()
 
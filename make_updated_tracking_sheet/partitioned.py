@@ -0,0 +1,273 @@
+"""Multi-core engine running the merge, pivot and no data stages of update_tracking on hash partitions of the compounds.
+
+The tracking sheet and SPR results are split by a hash of the 22 character BRD key, so every shipment and every run of
+a compound land in the same partition and each partition can be updated on its own in a process pool. On Linux the
+workers are forked and inherit the frames from the parent without copying them, and only the partial results are sent
+back. Forking a process that has started threads is unsafe on macOS, so elsewhere each partition is pickled. The partial
+results come back sorted and are combined in the order of the tracking sheet and of the BRDs, so they are identical to
+those of the single process engine whatever the number of partitions.
+"""
+
+# Import system packages
+import multiprocessing
+import os
+import platform
+
+# Import package used to update the partitions in parallel
+from concurrent.futures import ProcessPoolExecutor
+
+# Import data wrangling Python packages
+import numpy as np
+import pandas as pd
+
+# Import the transform steps shared by the engines
+from make_updated_tracking_sheet import transform
+
+# Import the typed schema the frames are converted to before they are split
+from make_updated_tracking_sheet import schema
+
+# Import the per stage instrumentation of a run
+from make_updated_tracking_sheet.profiling import StageProfiler
+
+# Frames and partitions inherited by forked workers, set for the duration of a pool.
+_shared = None
+
+
+def partition_numbers(keys, partitions):
+    """
+    Method that assigns each value of a Series of BRD keys to one of a number of partitions by a hash of the key.
+
+    The hash does not depend on the process or the Python hash seed, so a key lands in the same partition in the
+    tracking sheet and the SPR results and in every run. Keys are hashed without leading and trailing whitespace, as
+    the compounds with no data are grouped by the stripped BRD. Each distinct key is only hashed once. Missing keys go
+    to the first partition.
+
+    :param keys: Series of BRD keys.
+    :param partitions: Number of partitions.
+    """
+    codes, uniques = pd.factorize(keys)
+    return _numbers_by_code(_key_numbers(pd.Series(uniques), partitions), codes)
+
+
+def _key_numbers(keys, partitions):
+    """
+    Helper method that returns the partition of each distinct key, see partition_numbers.
+    """
+    # numpy strips the keys as fixed width strings, without a Python call per key.
+    keys = np.char.strip(keys.to_numpy(dtype=str)).astype(object)
+    numbers = pd.util.hash_array(keys, categorize=False) % np.uint64(partitions)
+    return numbers.astype(np.int64)
+
+
+def _numbers_by_code(numbers, codes):
+    """
+    Helper method that spreads the partition of each distinct key to the rows by their code. Missing keys have code -1
+    and go to the first partition.
+    """
+    return np.where(codes >= 0, numbers.take(codes), 0)
+
+
+def _split(numbers, partitions):
+    """
+    Helper method that returns the positions of the rows of each partition, in the order of the rows.
+    """
+    order = np.argsort(numbers, kind='stable')
+    return np.split(order, np.cumsum(np.bincount(numbers, minlength=partitions))[:-1])
+
+
+def _merge_order(codes):
+    """
+    Helper method that returns the positions putting the concatenated rows of several partitions in the order of
+    their codes. The rows of each partition are sorted by code and a code only occurs in one partition, so the runs of
+    equal codes are put in order by code without sorting the rows.
+    """
+    codes = np.asarray(codes, dtype=np.int64)
+    if not len(codes):
+        return np.arange(0)
+
+    # Start and length of each run of equal codes, and the runs in the order of their codes.
+    starts = np.flatnonzero(np.diff(codes, prepend=codes[0] - 1))
+    lengths = np.diff(np.append(starts, len(codes)))
+    slots = np.full(codes.max() + 1, -1)
+    slots[codes[starts]] = np.arange(len(starts))
+    runs = slots[slots >= 0]
+
+    # Each row moves by the difference between the start of its run and where the run starts in the new order.
+    moves = starts[runs] - (np.cumsum(lengths[runs]) - lengths[runs])
+    return np.repeat(moves, lengths[runs]) + np.arange(len(codes))
+
+
+def _concat(frames, order=None):
+    """
+    Helper method that concatenates the partial results of the partitions column by column and takes the rows at the
+    positions in order. Categorical columns whose categories differ between partitions get the sorted categories of
+    all of them, as the single process engine gives them.
+    """
+    frames = list(frames)
+    index = np.concatenate([frame.index.to_numpy() for frame in frames])
+    order = np.arange(len(index)) if order is None else order
+
+    columns = []
+    for num in range(frames[0].shape[1]):
+        parts = [frame.iloc[:, num].array for frame in frames]
+        if isinstance(parts[0].dtype, pd.CategoricalDtype):
+            # Comparing the categories avoids hashing those of every partition.
+            categories = parts[0].categories
+            if not all(part.categories.equals(categories) for part in parts[1:]):
+                categories = pd.Index(sorted(set().union(*[part.categories for part in parts])))
+                parts = [part.set_categories(categories) for part in parts]
+            codes = np.concatenate([part.codes for part in parts]).take(order)
+            columns.append(pd.Categorical.from_codes(codes, dtype=parts[0].dtype))
+        else:
+            column = pd.concat([frame.iloc[:, num] for frame in frames], ignore_index=True).take(order)
+            # Plain numpy columns are not checked for missing values again when the frame is built.
+            is_extension = pd.api.types.is_extension_array_dtype(column.dtype)
+            columns.append(column.array if is_extension else column.to_numpy())
+
+    df = pd.DataFrame(dict(enumerate(columns)), index=pd.Index(index.take(order), name=frames[0].index.name))
+    df.columns = frames[0].columns
+    return df
+
+
+def _pivot_columns(frames):
+    """
+    Helper method that returns the sorted columns of the wide pivot tables of all partitions, with the FROM and TO
+    levels as categoricals of the sorted categories of all of them, as unstack_pivot lays them out.
+    """
+    columns = frames[0].columns
+    for frame in frames[1:]:
+        columns = columns.union(frame.columns)
+    columns = columns.sort_values()
+
+    levels = [columns.get_level_values(0)]
+    for num in [1, 2]:
+        categories = sorted(set().union(*[frame.columns.levels[num].categories for frame in frames]))
+        levels.append(pd.Categorical(columns.get_level_values(num), categories=categories))
+    return pd.MultiIndex.from_arrays(levels, names=frames[0].columns.names)
+
+
+def _update_partition(df_tracking, brd_codes, df_spr_dot_data, brd_map, brd_dtype, all_run_dates=False,
+                      pivot_format='wide'):
+    """
+    Helper method that updates one partition of the tracking sheet with its SPR results. Returns the updated tracking
+    sheet, its pivot table sorted by BRD with the codes of its BRDs in brd_dtype, and the no data flags of its
+    compounds sorted by the stripped BRD.
+    """
+    # Normalize the BRDs by looking up the truncated BRD of each distinct BRD, then convert to categorical keys.
+    brd = pd.Categorical.from_codes(np.where(brd_codes >= 0, brd_map.take(brd_codes), -1), dtype=brd_dtype)
+    df_tracking = schema.apply_tracking_schema(df_tracking.assign(BRD=brd))
+
+    # Only look up the compounds of the partition, not every compound of the full tracking sheet.
+    df_merge_tracking = transform.merge_runs(df_tracking=df_tracking.assign(BRD=brd.remove_unused_categories()),
+                                             df_spr_dot_data=df_spr_dot_data, all_run_dates=all_run_dates)
+    df_merge_tracking['BRD'] = brd
+
+    df_merge_tracking_cp = df_merge_tracking[transform.TRACKING_COLUMNS]
+    if pivot_format == 'long':
+        df_pivoted_tracking = transform.pivot_tracking(df=df_merge_tracking_cp, long_format=True)
+        pivot_codes = df_pivoted_tracking['BRD'].cat.codes.to_numpy()
+    else:
+        df_pivoted_tracking = transform.pivot_tracking(df=df_merge_tracking_cp)
+        pivot_codes = pd.Categorical(df_pivoted_tracking.index, dtype=brd_dtype).codes
+
+    return (df_merge_tracking, df_pivoted_tracking, pivot_codes, transform.no_data_flags(df_merge_tracking_cp))
+
+
+def _update_shared_partition(num, all_run_dates=False, pivot_format='wide'):
+    """
+    Helper method that updates a partition of the frames inherited from the parent process, see _update_partition.
+    """
+    df_tracking, brd_codes, df_spr_dot_data, tracking_parts, spr_parts, brd_map, brd_dtype = _shared
+    return _update_partition(df_tracking.iloc[tracking_parts[num]], brd_codes[tracking_parts[num]],
+                             df_spr_dot_data.iloc[spr_parts[num]], brd_map, brd_dtype, all_run_dates=all_run_dates,
+                             pivot_format=pivot_format)
+
+
+def update_tracking(df_ori_tracking, df_spr_dot_data, partitions, all_run_dates=False, profiler=None,
+                    pivot_format='wide', processes=None):
+    """
+    Method that updates the tracking sheet with the dates the compounds were run and summarizes it, one hash partition
+    of the compounds per task in a process pool. Takes the same arguments and returns the same results as the
+    in-memory update_tracking.
+
+    :param df_ori_tracking: Tracking sheet as a DataFrame.
+    :param df_spr_dot_data: SPR results as returned by get_dot_data.
+    :param partitions: Number of partitions the compounds are split into.
+    :param all_run_dates: List every date a compound was run instead of only the most recent one.
+    :param profiler: StageProfiler recording the partition, update partitions and combine stages.
+    :param pivot_format: Layout of the pivoted tracking sheet. One of PIVOT_FORMATS, see pivot_tracking.
+    :param processes: Number of worker processes. Defaults to the number of partitions, up to the number of cores.
+    """
+    global _shared
+
+    profiler = profiler or StageProfiler()
+    processes = processes or min(partitions, os.cpu_count() or 1)
+
+    with profiler.stage('partition', rows_in=len(df_ori_tracking) + len(df_spr_dot_data)) as record:
+        df_ori_tracking = schema.to_frame(df_ori_tracking)
+        df_spr_dot_data = schema.to_frame(df_spr_dot_data)
+
+        # Only the distinct BRDs are truncated here. The workers look up the truncated BRD of each of their rows. The
+        # categories of the truncated BRDs are those of the full tracking sheet, so the partial results line up by BRD
+        # without being grouped again. They are sorted as fixed width strings, which numpy compares without Python.
+        brd_codes, brd_uniques = pd.factorize(df_ori_tracking['BRD'])
+        normalized = transform.normalize_brd(pd.Series(brd_uniques))
+        valid = normalized.notna().to_numpy()
+        brd_map = np.full(len(normalized), -1)
+        categories, brd_map[valid] = np.unique(normalized[valid].to_numpy(dtype=str), return_inverse=True)
+        brd_dtype = pd.CategoricalDtype(pd.Index(categories, dtype=object))
+
+        # Split both frames by a hash of the stripped, truncated BRD.
+        tracking_parts = _split(_numbers_by_code(_key_numbers(normalized, partitions), brd_codes), partitions)
+        spr_parts = _split(partition_numbers(df_spr_dot_data['BROAD_ID'], partitions), partitions)
+        record['rows_out'] = partitions
+
+    with profiler.stage('update partitions', rows_in=len(df_ori_tracking) + len(df_spr_dot_data)) as record:
+        # On Linux forked workers read their partition from the frames of the parent. Otherwise each partition is
+        # pickled to workers started with the default start method of the platform.
+        if platform.system() == 'Linux':
+            _shared = (df_ori_tracking, brd_codes, df_spr_dot_data, tracking_parts, spr_parts, brd_map, brd_dtype)
+            tasks = [(_update_shared_partition, num, all_run_dates, pivot_format) for num in range(partitions)]
+            context = multiprocessing.get_context('fork')
+        else:
+            tasks = [(_update_partition, df_ori_tracking.iloc[tracking_parts[num]], brd_codes[tracking_parts[num]],
+                      df_spr_dot_data.iloc[spr_parts[num]], brd_map, brd_dtype, all_run_dates, pivot_format)
+                     for num in range(partitions)]
+            context = None
+        try:
+            with ProcessPoolExecutor(max_workers=processes, mp_context=context) as executor:
+                results = [future.result() for future in [executor.submit(*task) for task in tasks]]
+        finally:
+            _shared = None
+        record['rows_out'] = sum(len(result[0]) for result in results)
+
+    with profiler.stage('combine', rows_in=record['rows_out']) as record:
+        # Partitions without shipments have nothing to add, but one is kept so that an empty tracking sheet has headers.
+        results = [result for result in results if len(result[0])] or results[:1]
+        ls_merge, ls_pivoted, ls_pivot_codes, ls_flags = zip(*results)
+
+        # Put the shipments back in the order of the tracking sheet.
+        positions = np.concatenate(tracking_parts)
+        order = np.empty(len(positions), dtype=np.intp)
+        order[positions] = np.arange(len(positions))
+        df_merge_tracking = _concat(ls_merge, order)
+
+        # Each BRD is in a single partition and the pivot table of each partition is sorted by BRD, so putting the
+        # BRDs in order gives the full pivot table.
+        pivot_order = _merge_order(np.concatenate(ls_pivot_codes))
+        if pivot_format == 'long':
+            df_pivoted_tracking = _concat(ls_pivoted, pivot_order).reset_index(drop=True)
+        else:
+            columns = _pivot_columns(ls_pivoted)
+            df_pivoted_tracking = _concat([frame.reindex(columns=columns) for frame in ls_pivoted], pivot_order)
+            brds = df_pivoted_tracking.index.to_numpy(dtype=object)
+            df_pivoted_tracking.index = pd.CategoricalIndex(brds, categories=brds, name='BRD')
+
+        # The flags are grouped by the stripped BRD, which also is in a single partition. The stable sort finds the
+        # sorted flags of each partition as runs and only merges them.
+        df_flags = pd.concat(ls_flags)
+        df_flags = df_flags.iloc[np.argsort(df_flags.index.to_numpy(dtype=object), kind='stable')]
+        df_cmpds_no_data = transform.no_data_from_flags(df_flags)
+        record['rows_out'] = len(df_merge_tracking)
+
+    return df_merge_tracking, df_pivoted_tracking, df_cmpds_no_data
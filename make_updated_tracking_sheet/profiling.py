@@ -0,0 +1,151 @@
+"""Per stage timing, row count and memory instrumentation of a run of the app."""
+
+# Import the version of the script that can be used to tag the report.
+from _version import __version__
+
+# Import system packages for timing and memory measurements
+import contextlib
+import cProfile
+import datetime
+import json
+import os
+import sys
+import threading
+import time
+import tracemalloc
+
+# The resource module is not available on Windows.
+try:
+    import resource
+except ImportError:
+    resource = None
+
+
+def _peak_rss_mb():
+    """
+    Helper method that returns the peak resident memory of the process so far in MB or None if it is unavailable.
+    """
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    # ru_maxrss is reported in bytes on macOS and in kilobytes elsewhere.
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
+def _rss_mb():
+    """
+    Helper method that returns the current resident memory of the process in MB or None if it is unavailable. Only
+    Linux reports it without extra packages, in the second field of /proc/self/statm in pages.
+    """
+    try:
+        with open('/proc/self/statm') as f:
+            pages = int(f.read().split()[1])
+    except (OSError, IndexError, ValueError):
+        return None
+    return round(pages * os.sysconf('SC_PAGE_SIZE') / (1024 * 1024), 1)
+
+
+class StageProfiler:
+    """
+    Records the wall time, input and output row counts and peak memory of each stage of a run.
+
+    Stages may run concurrently from several threads. The resident memory of the whole process is recorded at the
+    start and at the end of each stage, along with how much the peak resident memory of the process grew during the
+    stage, so the stage that raises the peak can be found. With trace_memory, the peak memory allocated by Python
+    during the stage is also recorded via tracemalloc, which is process wide as well, so stages that overlap share
+    their peaks. Tracing slows down everything that runs while it is on, so call stop or use the profiler as a context
+    manager once the run is done.
+
+    :param trace_memory: Record the peak memory allocated during each stage with tracemalloc.
+    :param cprofile_dir: Directory to save cProfile stats of the stages run with cprofile=True in.
+    """
+
+    def __init__(self, trace_memory=False, cprofile_dir=None):
+        self.trace_memory = trace_memory
+        self.cprofile_dir = cprofile_dir
+        self.stages = []
+        self.started = datetime.datetime.now()
+        self._start = time.perf_counter()
+        self._lock = threading.Lock()
+
+        # Only stop tracing in stop if this profiler started it.
+        self._started_tracing = self.trace_memory and not tracemalloc.is_tracing()
+        if self._started_tracing:
+            tracemalloc.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.stop()
+
+    def stop(self):
+        """
+        Stops tracing the memory allocations if this profiler started it. The recorded stages are kept.
+        """
+        if self._started_tracing:
+            tracemalloc.stop()
+            self._started_tracing = False
+
+    @contextlib.contextmanager
+    def stage(self, name, rows_in=None, cprofile=False):
+        """
+        Context manager that records one stage. Yields the record of the stage so the caller can set 'rows_out'.
+
+        :param name: Name of the stage.
+        :param rows_in: Number of rows the stage reads.
+        :param cprofile: Save cProfile stats of the stage to cprofile_dir.
+        """
+        record = {'stage': name, 'rows_in': rows_in, 'rows_out': None}
+
+        # Python 3.8 can't reset the peak, so the peak since the start of the run is recorded instead.
+        if self.trace_memory and hasattr(tracemalloc, 'reset_peak'):
+            tracemalloc.reset_peak()
+        profile = None
+        if cprofile and self.cprofile_dir:
+            profile = cProfile.Profile()
+            profile.enable()
+
+        rss_start, peak_start = _rss_mb(), _peak_rss_mb()
+        start = time.perf_counter()
+        try:
+            yield record
+        finally:
+            record['seconds'] = round(time.perf_counter() - start, 4)
+            if profile is not None:
+                profile.disable()
+                os.makedirs(self.cprofile_dir, exist_ok=True)
+                profile.dump_stats(os.path.join(self.cprofile_dir, name.replace(' ', '_') + '.prof'))
+            if self.trace_memory and tracemalloc.is_tracing():
+                record['traced_peak_mb'] = round(tracemalloc.get_traced_memory()[1] / (1024 * 1024), 1)
+
+            # The peak of the process only tells stages apart by how much each one raised it.
+            peak_end = _peak_rss_mb()
+            record['rss_start_mb'] = rss_start
+            record['rss_end_mb'] = _rss_mb()
+            record['peak_rss_increase_mb'] = None if peak_end is None else round(peak_end - peak_start, 1)
+
+            with self._lock:
+                self.stages.append(record)
+
+    def report(self):
+        """
+        Returns the recorded stages as a dict that can be saved as JSON.
+        """
+        with self._lock:
+            stages = list(self.stages)
+        return {'version': str(__version__),
+                'started': self.started.isoformat(timespec='seconds'),
+                'total_seconds': round(time.perf_counter() - self._start, 4),
+                'peak_rss_mb': _peak_rss_mb(),
+                'stages': stages}
+
+    def write_report(self, path):
+        """
+        Saves the report of the recorded stages to a JSON file.
+
+        :param path: Path of the JSON file.
+        """
+        with open(path, 'w') as f:
+            json.dump(self.report(), f, indent=2)
@@ -0,0 +1,296 @@
+"""Download of the SPR results from resultsdb through the local cache of SPR results.
+
+The packages needed to query the Oracle database (cx_Oracle, sqlalchemy and crypt) are slow to import, so they are
+imported by the methods that use them and --help or runs that never reach the database start faster.
+"""
+
+# Import module for caching SPR results locally between runs.
+from make_updated_tracking_sheet import spr_cache
+
+# Import the per stage instrumentation of a run
+from make_updated_tracking_sheet.profiling import StageProfiler
+
+# Import system packages
+import functools
+import os
+
+# Import data wrangling Python packages
+import pandas as pd
+import numpy as np
+
+# Import logging package
+import logging
+
+# Project and protein the SPR results are downloaded for.
+PROJECT_CODE = 7279
+PROTEIN_ID = 'BIP-0384-01'
+
+# Default location of the local cache of SPR results. Can be overridden with SPR_CACHE_PATH in the .env file.
+DEFAULT_SPR_CACHE_PATH = os.path.join(os.path.expanduser('~'), '.cdot_tracking', 'spr_cache.sqlite')
+
+# Number of rows fetched from the database per round trip.
+FETCH_SIZE = 5000
+
+# Types of the SPR result columns that are not strings.
+SPR_DTYPES = {'PROJECT_CODE': 'int64', 'COMPOUND_MW': 'float64'}
+
+
+def _connect(engine):
+    """
+    Private method that actually makes the connection to resultsdb
+    :param engine: Sqlalchemy engine object
+    """
+    logging.info('Making a connection attempt to resultsdb...')
+    c = engine.connect()
+    logging.info('Connection successful, proceeding...')
+    return c
+
+
+def _fetch_frame(conn, stmt, columns, fetch_size=FETCH_SIZE):
+    """
+    Private method that streams the results of a statement into a DataFrame in batches of fetch_size rows.
+
+    Each batch is appended to per column buffers so the full result set is never held as a list of tuples.
+
+    :param conn: Sqlalchemy connection object
+    :param stmt: Sqlalchemy select statement
+    :param columns: Names of the DataFrame columns in the order they are selected.
+    :param fetch_size: Number of rows fetched from the database per round trip.
+    """
+    buffers = {col: [] for col in columns}
+    result = conn.execution_options(stream_results=True, max_row_buffer=fetch_size).execute(stmt)
+
+    while True:
+        rows = result.fetchmany(fetch_size)
+        if not rows:
+            break
+        for col, values in zip(columns, zip(*rows)):
+            buffers[col].append(np.array(values, dtype=SPR_DTYPES.get(col, object)))
+    result.close()
+
+    return pd.DataFrame({col: np.concatenate(buffers[col]) if buffers[col]
+                         else np.array([], dtype=SPR_DTYPES.get(col, object)) for col in columns})
+
+
+def _set_prefetch_rows(fetch_size):
+    """
+    Private method returning a cursor event handler that sets the number of rows cx_Oracle prefetches.
+
+    :param fetch_size: Number of rows fetched from the database per round trip.
+    """
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        cursor.prefetchrows = fetch_size + 1
+    return before_cursor_execute
+
+
+@functools.lru_cache(maxsize=None)
+def get_engine(fetch_size=FETCH_SIZE):
+    """
+    Creates the Sqlalchemy engine for resultsdb.
+
+    The engine and its connection pool are created once per process and shared by every later call, so the
+    password is only decrypted once and pooled connections are reused between refreshes.
+
+    :param fetch_size: Number of rows fetched from the database per round trip. Also sets the cx_Oracle arraysize.
+    """
+
+    # Import packages needed to query Oracle database.
+    import cx_Oracle
+    import sqlalchemy
+    import crypt
+
+    # Create a cryptographic object
+    c = crypt.Crypt()
+
+    host = 'cbpdb01'
+    port = '1521'
+    sid = 'cbplate'
+    user = os.getenv('DB_USER')
+    password = str(c.f.decrypt(c.token), 'utf-8')
+    sid = cx_Oracle.makedsn(host, port, sid=sid)
+
+    cstr = 'oracle://{user}:{password}@{sid}'.format(
+        user=user,
+        password=password,
+        sid=sid
+    )
+
+    engine = sqlalchemy.create_engine(cstr,
+                                      pool_recycle=3600,
+                                      pool_size=5,
+                                      pool_pre_ping=True,
+                                      arraysize=fetch_size,
+                                      echo=False
+                                      )
+    sqlalchemy.event.listen(engine, 'before_cursor_execute', _set_prefetch_rows(fetch_size))
+
+    return engine
+
+
+@functools.lru_cache(maxsize=None)
+def _get_spr_table(engine):
+    """
+    Private method that reflects the upload_spr_dose table once per engine.
+    :param engine: Sqlalchemy engine object
+    """
+    import sqlalchemy
+
+    metadata = sqlalchemy.MetaData()
+    return sqlalchemy.Table('upload_spr_dose', metadata, autoload=True, autoload_with=engine)
+
+
+def get_dot_data(full_resync=False, cache_path=None, fetch_size=FETCH_SIZE, profiler=None):
+    """
+    Downloads all SPR results from database and returns a DataFrame consisting of the following headers:
+
+    ['BROAD_ID', 'PROJECT_CODE', 'OPERATOR', 'PROTEIN_ID', 'COMPOUND_MW', 'DATE']
+
+    PROJECT_CODE = 7279
+    PROTEIN_ID = BIP-0384-01
+
+    Results are kept in a local cache between runs. Only results run on or after the most recent cached run date
+    are downloaded and merged into the cache.
+
+    :param full_resync: Ignore the cached results and download the full history again.
+    :param cache_path: Path of the SQLite cache file. Defaults to SPR_CACHE_PATH from the .env file or
+    DEFAULT_SPR_CACHE_PATH.
+    :param fetch_size: Number of rows fetched from the database per round trip. Also sets the cx_Oracle arraysize.
+    :param profiler: StageProfiler recording the connect, query and cache sync stages.
+    """
+    target = (PROJECT_CODE, PROTEIN_ID)
+    results = get_dot_data_for_targets(targets=[target], full_resync=full_resync, cache_path=cache_path,
+                                       fetch_size=fetch_size, profiler=profiler)
+    return results[target]
+
+
+def get_dot_data_for_targets(targets, full_resync=False, cache_path=None, fetch_size=FETCH_SIZE, engine=None,
+                             profiler=None):
+    """
+    Downloads the SPR results of several targets in a single database query and returns a dict of each
+    (project code, protein id) target to a DataFrame of its results with the same headers as get_dot_data.
+
+    The new results are merged into the local cache by sync_spr_cache and the full history of each target is then
+    read back from the cache.
+
+    :param targets: List of (project code, protein id) tuples.
+    :param full_resync: Ignore the cached results and download the full history again.
+    :param cache_path: Path of the SQLite cache file. Defaults to SPR_CACHE_PATH from the .env file or
+    DEFAULT_SPR_CACHE_PATH.
+    :param fetch_size: Number of rows fetched from the database per round trip. Also sets the cx_Oracle arraysize.
+    :param engine: Sqlalchemy engine object. Defaults to the resultsdb engine from get_engine.
+    :param profiler: StageProfiler recording the connect, query, cache sync and cache read stages.
+    """
+    profiler = profiler or StageProfiler()
+    targets = list(dict.fromkeys(targets))
+
+    cache_path = sync_spr_cache(targets=targets, full_resync=full_resync, cache_path=cache_path,
+                                fetch_size=fetch_size, engine=engine, profiler=profiler)
+
+    # Read back the full history of each target.
+    with profiler.stage('read spr cache') as record:
+        cache_conn = spr_cache.open_cache(cache_path)
+        try:
+            results = {(project_code, protein_id): spr_cache.read_cache(cache_conn, project_code=project_code,
+                                                                        protein_id=protein_id)
+                       for project_code, protein_id in targets}
+        finally:
+            cache_conn.close()
+        record['rows_out'] = sum(len(df) for df in results.values())
+
+    return results
+
+
+def get_spr_cache_path(cache_path=None):
+    """
+    Returns the path of the local cache of SPR results: cache_path if given, else SPR_CACHE_PATH from the .env file or
+    DEFAULT_SPR_CACHE_PATH.
+
+    :param cache_path: Path of the SQLite cache file.
+    """
+    return cache_path or os.getenv('SPR_CACHE_PATH', DEFAULT_SPR_CACHE_PATH)
+
+
+def sync_spr_cache(targets, full_resync=False, cache_path=None, fetch_size=FETCH_SIZE, engine=None, profiler=None):
+    """
+    Downloads the new SPR results of several targets in a single database query and merges them into the local cache
+    without reading the cache back. Returns the path of the cache file, e.g. to attach it to another SQLite database.
+
+    The query selects every combination of the requested project codes and proteins run since the oldest cached run
+    date of any target. The results are then split per target and merged into the local cache.
+
+    :param targets: List of (project code, protein id) tuples.
+    :param full_resync: Ignore the cached results and download the full history again.
+    :param cache_path: Path of the SQLite cache file. Defaults to SPR_CACHE_PATH from the .env file or
+    DEFAULT_SPR_CACHE_PATH.
+    :param fetch_size: Number of rows fetched from the database per round trip. Also sets the cx_Oracle arraysize.
+    :param engine: Sqlalchemy engine object. Defaults to the resultsdb engine from get_engine.
+    :param profiler: StageProfiler recording the connect, query and cache sync stages.
+    """
+    import sqlalchemy
+
+    profiler = profiler or StageProfiler()
+    targets = list(dict.fromkeys(targets))
+    cache_path = get_spr_cache_path(cache_path)
+
+    # Connect to database.
+    try:
+        with profiler.stage('connect resultsdb'):
+            engine = engine or get_engine(fetch_size=fetch_size)
+
+            # Connect to resultsdb by calling private connection method
+            conn = _connect(engine=engine)
+
+    except Exception:
+        raise ConnectionError("\nCannot connect to resultsdb database. Make sure you are on the internal network and "
+                              "try again.")
+
+    # Both connections are closed also when a step fails, so failed refreshes in --watch mode do not use up the
+    # connection pool of the shared engine.
+    cache_conn = None
+    try:
+        # Open the local cache and find the most recent run date that was already downloaded for each target.
+        cache_conn = spr_cache.open_cache(cache_path)
+        high_water_marks = [None if full_resync else spr_cache.get_high_water_mark(cache_conn, *target)
+                            for target in targets]
+
+        # One query covers every target, so start from the oldest run date. Targets never synced need the full
+        # history.
+        high_water_mark = None if None in high_water_marks else min(high_water_marks)
+
+        # Reflect Tables
+        spr_data_tbl = _get_spr_table(engine)
+
+        stmt = sqlalchemy.select([spr_data_tbl.c.broad_id, spr_data_tbl.c.project_code,
+                                  spr_data_tbl.c.operator, spr_data_tbl.c.protein_id, spr_data_tbl.c.compound_mw,
+                                  spr_data_tbl.c.date_]).where(
+            sqlalchemy.and_(spr_data_tbl.c.project_code.in_(sorted({project_code for project_code, _ in targets})),
+                            spr_data_tbl.c.protein_id.in_(sorted({protein_id for _, protein_id in targets}))))
+
+        # Only download results run on or after the last sync. Results from that day are refreshed in the cache.
+        if high_water_mark is not None:
+            logging.info('Downloading spr results run on or after {}...'.format(high_water_mark))
+            stmt = stmt.where(spr_data_tbl.c.date_ >= high_water_mark)
+        else:
+            logging.info('Downloading the full history of spr results...')
+
+        # Execute the statement and stream the results into a DataFrame.
+        with profiler.stage('query spr results') as record:
+            df_new = _fetch_frame(conn=conn, stmt=stmt, columns=spr_cache.SPR_COLUMNS, fetch_size=fetch_size)
+            record['rows_out'] = len(df_new)
+
+        # Close the database connection
+        conn.close()
+
+        # Merge the new results of each target into the cache.
+        with profiler.stage('sync spr cache', rows_in=len(df_new)) as record:
+            for project_code, protein_id in targets:
+                df_target = df_new[(df_new['PROJECT_CODE'] == project_code) & (df_new['PROTEIN_ID'] == protein_id)]
+                spr_cache.merge_into_cache(cache_conn, df_target, project_code=project_code, protein_id=protein_id,
+                                           high_water_mark=high_water_mark)
+            record['rows_out'] = len(df_new)
+    finally:
+        conn.close()
+        if cache_conn is not None:
+            cache_conn.close()
+
+    return cache_path
@@ -0,0 +1,83 @@
+"""Typed schema the tracking sheet and SPR results are converted to before they are merged and pivoted."""
+
+# Import data wrangling Python packages
+import pandas as pd
+
+# Tracking sheet columns holding a few distinct values repeated on many rows.
+TRACKING_CATEGORIES = ['BRD', 'FROM', 'TO']
+
+# SPR result columns holding a few distinct values repeated on many rows.
+SPR_CATEGORIES = ['BROAD_ID', 'OPERATOR', 'PROTEIN_ID']
+
+# Format the dates are parsed from and written back to the outputs in.
+DATE_FORMAT = '%Y-%m-%d'
+
+
+def to_frame(data):
+    """
+    Returns a DataFrame for a DataFrame or a pyarrow Table. Dictionary encoded Arrow columns become categoricals.
+
+    :param data: DataFrame or pyarrow Table.
+    """
+    if hasattr(data, 'to_pandas'):
+        return data.to_pandas()
+    return data
+
+
+def parse_dates(dates):
+    """
+    Converts Y_m_d or Y-m-d date strings to datetime64. Values that are not dates become NaT.
+
+    Each distinct date is only cleaned and parsed once, as the same few run dates repeat on many rows.
+
+    :param dates: Series of date strings.
+    """
+    dates = dates.astype('category')
+    return pd.to_datetime(dates.str.replace('_', '-', regex=False), format=DATE_FORMAT, errors='coerce')
+
+
+def format_dates(values):
+    """
+    Converts a datetime64 Series back to Y-m-d strings with nan for missing dates. Other Series are returned as is.
+
+    :param values: Series to format.
+    """
+    if pd.api.types.is_datetime64_any_dtype(values):
+        return values.dt.strftime(DATE_FORMAT)
+    return values
+
+
+def render_dates(df):
+    """
+    Returns a copy of a DataFrame with its datetime64 columns written as Y-m-d strings, as they are saved.
+
+    :param df: DataFrame to render.
+    """
+    dates = [col for col in df.columns if pd.api.types.is_datetime64_any_dtype(df[col])]
+    if not dates:
+        return df
+    return df.assign(**{col: format_dates(df[col]) for col in dates})
+
+
+def apply_tracking_schema(df):
+    """
+    Returns a copy of the tracking sheet with categorical BRD, FROM and TO columns.
+
+    The date columns of the tracking sheet are edited by hand and hold notes like 'Running 8/25' next to dates, so
+    they are kept as they are. The run dates are replaced with the typed dates of the SPR results when merged.
+
+    :param df: Tracking sheet as a DataFrame.
+    """
+    return df.astype({col: 'category' for col in TRACKING_CATEGORIES if col in df.columns})
+
+
+def apply_spr_schema(df):
+    """
+    Returns a copy of the SPR results with categorical BROAD_ID, OPERATOR and PROTEIN_ID columns and datetime64 run
+    dates.
+
+    :param df: SPR results as returned by get_dot_data.
+    """
+    df = df.astype({col: 'category' for col in SPR_CATEGORIES if col in df.columns})
+    df['DATE'] = parse_dates(df['DATE'])
+    return df
@@ -0,0 +1,210 @@
+"""Sinks the results of run are written to.
+
+Every sink has a write method taking the updated tracking sheet, the pivoted tracking sheet and the compounds received
+but not run, and a stage name it is reported under.
+"""
+
+# Import the version of the script that can be used to tag the output file.
+from _version import __version__
+
+# Import module for writing Google sheet data.
+import google_sheet_data
+
+# Import the typed schema for writing dates as strings and the run history
+from make_updated_tracking_sheet import schema
+from make_updated_tracking_sheet import history
+
+# Import system packages for determining what OS the script is running on..
+import platform
+import os
+
+# Import data wrangling Python packages
+import pandas as pd
+
+# Import logging package
+import logging
+
+# Get the users home directory
+if platform.system() == "Windows":
+    from pathlib import Path
+
+    homedir = str(Path.home())
+else:
+    homedir = os.environ['HOME']
+
+# Formats the results can be saved in.
+OUTPUT_FORMATS = ['xlsx', 'xlsx_stream', 'csv', 'parquet', 'arrow']
+
+
+class FileSink:
+    """
+    Saves the results to an Excel workbook or to csv, parquet or arrow files, see save_output.
+
+    :param save_file: Name of the saved file.
+    :param output_format: Format of the saved results. One of OUTPUT_FORMATS.
+    :param directory: Directory the results are saved in. Defaults to the Desktop.
+    """
+
+    stage = 'save Excel workbook'
+
+    def __init__(self, save_file, output_format='xlsx', directory=None):
+        self.save_file = save_file
+        self.output_format = output_format
+        self.directory = directory
+
+    def write(self, df_merge_tracking, df_pivoted_tracking, df_cmpds_no_data):
+        save_output(df_1=df_merge_tracking, df_2=df_pivoted_tracking, df_3=df_cmpds_no_data,
+                    save_file=self.save_file, output_format=self.output_format, directory=self.directory)
+
+
+class GoogleSheetSink:
+    """
+    Writes the compounds received but not run to the "Compounds Received but Not Tested" tab of a Google Sheet.
+
+    :param spreadsheet_id: ID of the spreadsheet to write to. Defaults to the KRAS tracking sheet.
+    """
+
+    stage = 'write Google Sheet'
+
+    def __init__(self, spreadsheet_id=None):
+        self.spreadsheet_id = spreadsheet_id
+
+    def write(self, df_merge_tracking, df_pivoted_tracking, df_cmpds_no_data):
+        if self.spreadsheet_id is None:
+            google_sheet_data.write_gsheet_data(df=df_cmpds_no_data)
+        else:
+            google_sheet_data.write_gsheet_data(df=df_cmpds_no_data, spreadsheet_id=self.spreadsheet_id)
+
+
+class HistorySink:
+    """
+    Appends the results to the run history, tagged with the time of the run and the app version, see
+    history.record_run.
+
+    :param history_db: Path of the SQLite history file.
+    :param save_file: Name of the saved results file the run is recorded under.
+    """
+
+    stage = 'record run history'
+
+    def __init__(self, history_db, save_file=None):
+        self.history_db = history_db
+        self.save_file = save_file
+
+    def write(self, df_merge_tracking, df_pivoted_tracking, df_cmpds_no_data):
+        conn = history.open_history(self.history_db)
+        try:
+            history.record_run(conn, df_tracking=df_merge_tracking, df_cmpds_no_data=df_cmpds_no_data,
+                               version=__version__, save_file=self.save_file)
+        finally:
+            conn.close()
+
+
+class MemorySink:
+    """
+    Keeps the results in memory as the results attribute, a tuple of the three result frames.
+    """
+
+    stage = 'keep results in memory'
+
+    def __init__(self):
+        self.results = None
+
+    def write(self, df_merge_tracking, df_pivoted_tracking, df_cmpds_no_data):
+        self.results = (df_merge_tracking, df_pivoted_tracking, df_cmpds_no_data)
+
+
+def _flatten_columns(df):
+    """
+    Private method that prepares a DataFrame for a columnar file format. Named indexes become columns and the levels
+    of MultiIndex column headers are joined with '|'.
+    :param df: DataFrame to prepare.
+    """
+    if any(name is not None for name in df.index.names):
+        df = df.reset_index()
+    else:
+        df = df.reset_index(drop=True)
+    if isinstance(df.columns, pd.MultiIndex):
+        df.columns = ['|'.join(str(level) for level in col if level != '') for col in df.columns]
+    return df
+
+
+def _write_xlsx_streaming(save_file, sheets):
+    """
+    Private method that writes DataFrames to an Excel workbook with xlsxwriter in constant memory mode.
+
+    Rows are written to disk as soon as the next row is started, so the workbook is never held in memory. The layout
+    matches DataFrame.to_excel: header rows first, then one row per index value with the index in the first columns.
+
+    :param save_file: Path of the saved workbook.
+    :param sheets: Dict of sheet name to the DataFrame saved in it.
+    """
+    import xlsxwriter
+
+    def cell(val):
+        if not isinstance(val, str) and pd.isna(val):
+            return None
+        return val.item() if hasattr(val, 'item') else val
+
+    workbook = xlsxwriter.Workbook(save_file, {'constant_memory': True})
+    for sheet_name, df in sheets.items():
+        worksheet = workbook.add_worksheet(sheet_name)
+        n_index = df.index.nlevels
+        n_header = df.columns.nlevels
+
+        # Header rows, with the index names next to the last one
+        for level in range(n_header):
+            header = [''] * n_index + [cell(val) for val in df.columns.get_level_values(level)]
+            if level == n_header - 1:
+                header[:n_index] = [name or '' for name in df.index.names]
+            worksheet.write_row(level, 0, header)
+
+        # Data rows
+        for row_num, (index, row) in enumerate(zip(df.index, df.itertuples(index=False, name=None)), start=n_header):
+            index = index if isinstance(index, tuple) else (index,)
+            worksheet.write_row(row_num, 0, [cell(val) for val in index + row])
+    workbook.close()
+
+
+def save_output(df_1, df_2, df_3, save_file, output_format='xlsx', directory=None):
+    """
+    Method that does the work of saving the output to an Excel file.
+
+    :param df_1: Original updated tracking sheet to save in one tab of an excel file
+    :param df_2: Pivoted tracking sheet where each row has a unique BRD. Save to another tab.
+    :param df_3: DataFrame containing compounds received by Broad and Viva but not run.
+    :param save_file: Path and name of the saved file.
+    :param output_format: One of OUTPUT_FORMATS. 'xlsx' saves an Excel workbook with pandas and 'xlsx_stream' saves
+    it in xlsxwriter's constant memory mode. 'csv', 'parquet' and 'arrow' save each tab to its own file named
+    after the tab.
+    :param directory: Directory the results are saved in. Defaults to the Desktop.
+    """
+    # Note the version is saved to the file name so that data can be linked to the script version.
+    logging.info('Saving results to {} output...'.format(output_format))
+    save_file = save_file.replace('.xlsx', '')
+    save_file = (save_file + '_APPVersion_' + str(__version__)).replace('.', '_')
+    save_file = os.path.join(directory or os.path.join(homedir, 'Desktop'), save_file)
+
+    # Dates are saved as Y-m-d strings.
+    sheets = {'Updated_Tracking': schema.render_dates(df_1), 'Pivoted_Tracking': schema.render_dates(df_2),
+              'Cmpds_Received_no_Data': schema.render_dates(df_3)}
+
+    if output_format == 'xlsx':
+        with pd.ExcelWriter(save_file + '.xlsx') as writer:
+            for sheet_name, df in sheets.items():
+                df.to_excel(writer, sheet_name=sheet_name)
+    elif output_format == 'xlsx_stream':
+        _write_xlsx_streaming(save_file + '.xlsx', sheets)
+    elif output_format == 'csv':
+        for sheet_name, df in sheets.items():
+            df.to_csv(save_file + '_' + sheet_name + '.csv')
+    elif output_format == 'parquet':
+        for sheet_name, df in sheets.items():
+            _flatten_columns(df).to_parquet(save_file + '_' + sheet_name + '.parquet', index=False)
+    elif output_format == 'arrow':
+        for sheet_name, df in sheets.items():
+            _flatten_columns(df).to_feather(save_file + '_' + sheet_name + '.arrow')
+    else:
+        raise ValueError('Unknown output format {}. Use one of {}.'.format(output_format, ', '.join(OUTPUT_FORMATS)))
+
+    print('Program done!! Result file is ' + ('on the Desktop' if directory is None else 'in ' + directory))
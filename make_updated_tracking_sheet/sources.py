@@ -0,0 +1,125 @@
+"""Sources the tracking sheet and SPR results are read from by run.
+
+Every source has a read method returning a DataFrame and a stage name it is reported under. The database and Google
+clients are only created when the source is read, so the sources can be built before they are needed.
+
+The sqlite engine reads sources out of core where they allow it: tracking sheet sources with a chunks method are
+streamed into SQLite a chunk at a time, and SPR result sources with a sync_cache method are attached to SQLite from the
+local cache of SPR results instead of being read into memory.
+"""
+
+# Import module for downloading Google sheet data.
+import google_sheet_data
+
+# Import data wrangling Python packages
+import pandas as pd
+
+# Import the typed schema for converting Arrow tables, the tracking sheet reader and the SPR results download
+from make_updated_tracking_sheet import schema
+from make_updated_tracking_sheet import transform
+from make_updated_tracking_sheet import resultsdb
+
+
+class GoogleSheetSource:
+    """
+    Reads the tracking sheet from a Google Sheet.
+
+    :param spreadsheet_id: ID of the spreadsheet holding the tracking sheet. Defaults to the KRAS tracking sheet.
+    """
+
+    stage = 'read tracking sheet'
+
+    def __init__(self, spreadsheet_id=None):
+        self.spreadsheet_id = spreadsheet_id
+
+    def read(self):
+        if self.spreadsheet_id is None:
+            return google_sheet_data.get_gsheet_data()
+        return google_sheet_data.get_gsheet_data(spreadsheet_id=self.spreadsheet_id)
+
+
+class CsvSource:
+    """
+    Reads the tracking sheet from one or more .csv files in chunks, see read_tracking_csv.
+
+    :param paths: Paths of the .csv files.
+    :param chunksize: Number of rows read at a time. Defaults to TRACKING_CHUNK_SIZE.
+    """
+
+    stage = 'read tracking sheet'
+
+    def __init__(self, paths, chunksize=None):
+        self.paths = list(paths)
+        self.chunksize = chunksize
+
+    def read(self):
+        return transform.read_tracking_csv(paths=self.paths, chunksize=self.chunksize or transform.TRACKING_CHUNK_SIZE)
+
+    def chunks(self):
+        return transform.iter_tracking_csv(paths=self.paths, chunksize=self.chunksize or transform.TRACKING_CHUNK_SIZE)
+
+
+class ParquetSource:
+    """
+    Reads the tracking sheet or the SPR results from one or more Parquet files.
+
+    :param paths: Paths of the Parquet files.
+    :param columns: Columns to read. Defaults to all of them.
+    :param stage: Name of the stage the source is reported under, e.g. 'download spr results' for SPR results.
+    """
+
+    def __init__(self, paths, columns=None, stage='read tracking sheet'):
+        self.paths = list(paths)
+        self.columns = columns
+        self.stage = stage
+
+    def read(self):
+        return pd.concat([pd.read_parquet(path, columns=self.columns) for path in self.paths], ignore_index=True)
+
+
+class OracleSource:
+    """
+    Downloads the SPR results of the KRAS project from resultsdb through the local cache, see get_dot_data.
+
+    :param full_resync: Discard the local cache of SPR results and download them all again.
+    :param fetch_size: Number of rows fetched from the database per round trip. Defaults to FETCH_SIZE.
+    :param profiler: StageProfiler recording the connect, query and cache sync stages.
+    """
+
+    stage = 'download spr results'
+
+    def __init__(self, full_resync=False, fetch_size=None, profiler=None):
+        self.full_resync = full_resync
+        self.fetch_size = fetch_size
+        self.profiler = profiler
+
+    def read(self):
+        return resultsdb.get_dot_data(full_resync=self.full_resync, fetch_size=self.fetch_size or resultsdb.FETCH_SIZE,
+                                      profiler=self.profiler)
+
+    def sync_cache(self):
+        """
+        Downloads the new SPR results into the local cache without reading them. Returns the path of the cache file,
+        the project code and the protein ID the results are cached under.
+        """
+        target = (resultsdb.PROJECT_CODE, resultsdb.PROTEIN_ID)
+        cache_path = resultsdb.sync_spr_cache(targets=[target], full_resync=self.full_resync,
+                                              fetch_size=self.fetch_size or resultsdb.FETCH_SIZE,
+                                              profiler=self.profiler)
+        return (cache_path,) + target
+
+
+class MemorySource:
+    """
+    Returns already loaded data, e.g. inside another service. pyarrow Tables are converted to DataFrames.
+
+    :param data: DataFrame or pyarrow Table.
+    :param stage: Name of the stage the source is reported under, 'read tracking sheet' or 'download spr results'.
+    """
+
+    def __init__(self, data, stage='read tracking sheet'):
+        self.data = data
+        self.stage = stage
+
+    def read(self):
+        return schema.to_frame(self.data)
@@ -0,0 +1,93 @@
+"""Local on-disk cache of the SPR results downloaded from the upload_spr_dose table."""
+
+# Import system packages
+import os
+import sqlite3
+import logging
+
+# Import data wrangling Python packages
+import pandas as pd
+
+# Name of the table in the cache file holding the SPR results.
+CACHE_TABLE = 'upload_spr_dose'
+
+# Columns of the cached SPR results, in the order they are returned by get_dot_data.
+SPR_COLUMNS = ['BROAD_ID', 'PROJECT_CODE', 'OPERATOR', 'PROTEIN_ID', 'COMPOUND_MW', 'DATE']
+
+
+def open_cache(cache_path):
+    """
+    Opens the SQLite file holding the cached SPR results, creating it if it does not exist yet.
+
+    :param cache_path: Path of the SQLite cache file.
+    """
+    cache_dir = os.path.dirname(cache_path)
+    if cache_dir:
+        os.makedirs(cache_dir, exist_ok=True)
+
+    conn = sqlite3.connect(cache_path)
+    conn.execute('CREATE TABLE IF NOT EXISTS {} (BROAD_ID TEXT, PROJECT_CODE INTEGER, OPERATOR TEXT, '
+                 'PROTEIN_ID TEXT, COMPOUND_MW REAL, DATE TEXT)'.format(CACHE_TABLE))
+    conn.execute('CREATE INDEX IF NOT EXISTS ix_{0}_target_date ON {0} (PROJECT_CODE, PROTEIN_ID, DATE)'.format(
+        CACHE_TABLE))
+    return conn
+
+
+def get_high_water_mark(conn, project_code, protein_id):
+    """
+    Returns the most recent run date cached for a project and protein or None if nothing has been cached yet.
+
+    :param conn: Connection to the cache returned by open_cache.
+    :param project_code: Project code the SPR results were run under.
+    :param protein_id: Protein the SPR results were run against.
+    """
+    row = conn.execute('SELECT MAX(DATE) FROM {} WHERE PROJECT_CODE = ? AND PROTEIN_ID = ?'.format(CACHE_TABLE),
+                       (project_code, protein_id)).fetchone()
+    return row[0]
+
+
+def merge_into_cache(conn, df, project_code, protein_id, high_water_mark=None):
+    """
+    Merges newly downloaded SPR results into the cache.
+
+    Every cached row of the project and protein run on or after the high-water mark is replaced by the downloaded
+    rows, so results that arrived later on the day of the last sync are not duplicated. Without a high-water mark all
+    cached rows of the project and protein are replaced (full resync).
+
+    :param conn: Connection to the cache returned by open_cache.
+    :param df: DataFrame of downloaded SPR results with the SPR_COLUMNS headers.
+    :param project_code: Project code the SPR results were run under.
+    :param protein_id: Protein the SPR results were run against.
+    :param high_water_mark: Date the download started from as returned by get_high_water_mark.
+    """
+    df = df[SPR_COLUMNS].copy()
+    df['PROJECT_CODE'] = pd.to_numeric(df['PROJECT_CODE'])
+    df['COMPOUND_MW'] = pd.to_numeric(df['COMPOUND_MW'])
+
+    # SQLite expects None rather than nan for missing values.
+    rows = df.astype(object).where(df.notna(), None).itertuples(index=False, name=None)
+
+    # Delete and insert in one transaction so an interrupted sync never leaves a partial cache behind.
+    with conn:
+        if high_water_mark is None:
+            conn.execute('DELETE FROM {} WHERE PROJECT_CODE = ? AND PROTEIN_ID = ?'.format(CACHE_TABLE),
+                         (project_code, protein_id))
+        else:
+            conn.execute('DELETE FROM {} WHERE PROJECT_CODE = ? AND PROTEIN_ID = ? AND DATE >= ?'.format(CACHE_TABLE),
+                         (project_code, protein_id, high_water_mark))
+        conn.executemany('INSERT INTO {} VALUES (?, ?, ?, ?, ?, ?)'.format(CACHE_TABLE), rows)
+
+    logging.info('Merged {} downloaded spr results into the local cache.'.format(len(df)))
+
+
+def read_cache(conn, project_code, protein_id):
+    """
+    Returns all cached SPR results of a project and protein as a DataFrame with the SPR_COLUMNS headers.
+
+    :param conn: Connection to the cache returned by open_cache.
+    :param project_code: Project code the SPR results were run under.
+    :param protein_id: Protein the SPR results were run against.
+    """
+    query = 'SELECT {} FROM {} WHERE PROJECT_CODE = ? AND PROTEIN_ID = ? ORDER BY rowid'.format(
+        ', '.join(SPR_COLUMNS), CACHE_TABLE)
+    return pd.read_sql_query(query, conn, params=(project_code, protein_id))
@@ -0,0 +1,375 @@
+"""Out-of-core engine running the merge, pivot and no data stages of update_tracking as SQL over a SQLite file.
+
+The tracking sheet is loaded into a temporary SQLite database in chunks, streamed from its .csv files when it is read
+from them. The SPR results are attached from the SQLite file of the local cache of SPR results when they are
+downloaded through it, and loaded in chunks otherwise. The latest run index, the join, the pivot and the search for
+compounds with no data then run in SQLite, which sorts and groups on disk, so only the result tables are brought back
+into memory. The results are identical to those of the in-memory engine.
+"""
+
+# Import system packages
+import os
+import sqlite3
+import tempfile
+import threading
+
+# Import data wrangling Python packages
+import numpy as np
+import pandas as pd
+from pandas.api.types import union_categoricals
+
+# Import the transform steps shared by the engines
+from make_updated_tracking_sheet import transform
+
+# Import the typed schema the results are converted to
+from make_updated_tracking_sheet import schema
+
+# Import the table of the local cache of SPR results
+from make_updated_tracking_sheet import spr_cache
+
+# Import the per stage instrumentation of a run
+from make_updated_tracking_sheet.profiling import StageProfiler
+
+# Number of rows inserted per transaction.
+CHUNK_SIZE = 100000
+
+# Number of KiB of pages SQLite keeps in memory before it spills them to the database file.
+CACHE_KIB = 64 * 1024
+
+# Fields of the tracking sheet that are pivoted, in sorted order.
+PIVOT_FIELDS = ['DATE_RECEIVED', 'DATE_RUN_BROAD', 'DATE_RUN_VIVA']
+
+# Run dates of the SPR results as Y-m-d dates. Dotmatics reports them as Y_m_d, and dates that are not valid Y-m-d
+# dates are missing, as in parse_dates.
+SPR_DATE = "CASE WHEN date(replace(DATE, '_', '-')) IS replace(DATE, '_', '-') THEN replace(DATE, '_', '-') END"
+
+
+def _open_database(path):
+    """
+    Helper method that creates the table the tracking sheet is loaded into. The connection may be used from the
+    threads loading the tracking sheet and SPR results at the same time.
+    """
+    conn = sqlite3.connect(path, check_same_thread=False)
+    conn.executescript('''
+        PRAGMA journal_mode = OFF;
+        PRAGMA synchronous = OFF;
+        PRAGMA temp_store = FILE;
+        PRAGMA cache_size = -{};
+        CREATE TABLE tracking (POS INTEGER PRIMARY KEY, BRD TEXT, "FROM" TEXT, "TO" TEXT, DATE_RECEIVED TEXT,
+                               BRD_KEY TEXT, RECEIVED INTEGER);
+    '''.format(CACHE_KIB))
+    return conn
+
+
+def _records(df):
+    """
+    Helper method that yields the rows of a DataFrame as tuples of Python values with None for missing values.
+    """
+    for start in range(0, len(df), CHUNK_SIZE):
+        chunk = df.iloc[start:start + CHUNK_SIZE].astype(object)
+        yield from chunk.where(chunk.notna(), None).itertuples(index=False, name=None)
+
+
+def _read_frame(conn, query):
+    """
+    Helper method that reads the result of a query CHUNK_SIZE rows at a time into a DataFrame of categoricals. The
+    results hold the same BRDs, sites and dates on many rows, so each distinct value is only kept once.
+    """
+    parts = []
+    for chunk in pd.read_sql_query(query, conn, chunksize=CHUNK_SIZE):
+        parts.append(chunk.astype('category'))
+    if not parts:
+        return pd.read_sql_query(query, conn).astype('category')
+    return pd.DataFrame({col: union_categoricals([part[col].array for part in parts]) for col in parts[0].columns})
+
+
+def _stripped(values):
+    """
+    Helper method that strips a string or categorical Series as transform.strip_strings does, with nan for empty
+    strings.
+    """
+    if values.dtype == object or isinstance(values.dtype, pd.CategoricalDtype):
+        values = values.str.strip()
+    return values.where(values != '')
+
+
+class TrackingDatabase:
+    """
+    Temporary SQLite database the tracking sheet and SPR results are loaded into and updated by SQL, see
+    update_tracking. The tracking sheet and SPR results can be loaded from two threads at the same time.
+
+    The SQLite file is created in the temporary directory, which can be set with TMPDIR, and removed when the database
+    is closed.
+    """
+
+    def __init__(self):
+        self._tmp_dir = tempfile.TemporaryDirectory()
+        self.conn = _open_database(os.path.join(self._tmp_dir.name, 'update_tracking.sqlite'))
+        self._lock = threading.Lock()
+        self._rows = 0
+        self._df_tracking = None
+        self._spr_cache = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        self.conn.close()
+        self._tmp_dir.cleanup()
+
+    def load_tracking(self, source):
+        """
+        Method that loads the tracking sheet of a source. Sources with a chunks method are streamed a chunk at a time,
+        others are read and loaded with load_tracking_frame. Returns the number of rows loaded.
+        :param source: Source of the tracking sheet, see the sources module.
+        """
+        if not hasattr(source, 'chunks'):
+            return self.load_tracking_frame(source.read())
+
+        for chunk in source.chunks():
+            self._insert_tracking(chunk.assign(BRD=transform.normalize_brd(chunk['BRD'])))
+        return self._rows
+
+    def load_tracking_frame(self, df_ori_tracking):
+        """
+        Method that loads a tracking sheet that is already in memory. Its other columns are kept in the updated
+        tracking sheet. Returns the number of rows loaded.
+        :param df_ori_tracking: Tracking sheet as a DataFrame or pyarrow Table.
+        """
+        df_ori_tracking = schema.to_frame(df_ori_tracking)
+        self._df_tracking = schema.apply_tracking_schema(
+            df_ori_tracking.assign(BRD=transform.normalize_brd(df_ori_tracking['BRD'])))
+        self._insert_tracking(self._df_tracking)
+        return self._rows
+
+    def _insert_tracking(self, df_tracking):
+        """
+        Private method that appends shipments of the tracking sheet to the tracking table, in the order they are given.
+        """
+        # The no data search strips the BRDs and received dates as get_cmpds_no_data does. Python strips more kinds of
+        # whitespace than SQLite, so they are stripped before they are loaded.
+        df_rows = pd.DataFrame({'POS': pd.RangeIndex(self._rows, self._rows + len(df_tracking)),
+                                'BRD': df_tracking['BRD'].to_numpy(), 'FROM': df_tracking['FROM'].to_numpy(),
+                                'TO': df_tracking['TO'].to_numpy(),
+                                'DATE_RECEIVED': df_tracking['DATE_RECEIVED'].to_numpy(),
+                                'BRD_KEY': _stripped(df_tracking['BRD']).to_numpy(),
+                                'RECEIVED': _stripped(df_tracking['DATE_RECEIVED']).notna().astype(int).to_numpy()})
+        self._rows += len(df_tracking)
+
+        for start in range(0, len(df_rows), CHUNK_SIZE):
+            with self._lock, self.conn:
+                self.conn.executemany('INSERT INTO tracking VALUES (?, ?, ?, ?, ?, ?, ?)',
+                                      _records(df_rows.iloc[start:start + CHUNK_SIZE]))
+
+    def load_spr(self, source):
+        """
+        Method that loads the SPR results of a source. Sources with a sync_cache method are synced and their cache is
+        attached when the tracking sheet is updated, others are read and loaded with load_spr_frame.
+        :param source: Source of the SPR results, see the sources module.
+        """
+        if hasattr(source, 'sync_cache'):
+            self._spr_cache = source.sync_cache()
+        else:
+            self.load_spr_frame(source.read())
+
+    def load_spr_frame(self, df_spr_dot_data):
+        """
+        Method that loads SPR results that are already in memory.
+        :param df_spr_dot_data: SPR results as returned by get_dot_data, as a DataFrame or pyarrow Table.
+        """
+        df_spr_dot_data = schema.to_frame(df_spr_dot_data)[['BROAD_ID', 'OPERATOR', 'COMPOUND_MW', 'DATE']]
+
+        with self._lock, self.conn:
+            self.conn.execute('CREATE TABLE spr_results (POS INTEGER PRIMARY KEY, BROAD_ID TEXT, OPERATOR TEXT, '
+                              'COMPOUND_MW REAL, DATE TEXT)')
+            self.conn.execute('CREATE TEMP VIEW spr AS SELECT POS, BROAD_ID, OPERATOR, COMPOUND_MW, {} AS DATE '
+                              'FROM spr_results'.format(SPR_DATE))
+        for start in range(0, len(df_spr_dot_data), CHUNK_SIZE):
+            with self._lock, self.conn:
+                self.conn.executemany('INSERT INTO spr_results (BROAD_ID, OPERATOR, COMPOUND_MW, DATE) '
+                                      'VALUES (?, ?, ?, ?)',
+                                      _records(df_spr_dot_data.iloc[start:start + CHUNK_SIZE]))
+
+    def _attach_spr_cache(self):
+        """
+        Private method that attaches the local cache of SPR results and selects the results of its target, in the
+        order they were cached, as the spr view.
+        """
+        cache_path, project_code, protein_id = self._spr_cache
+        self.conn.execute('ATTACH DATABASE ? AS spr_cache', (cache_path,))
+        self.conn.execute("CREATE TEMP VIEW spr AS SELECT rowid AS POS, BROAD_ID, OPERATOR, COMPOUND_MW, {} AS DATE "
+                          "FROM spr_cache.{} WHERE PROJECT_CODE = {:d} AND PROTEIN_ID = '{}'".format(
+                              SPR_DATE, spr_cache.CACHE_TABLE, int(project_code), protein_id.replace("'", "''")))
+
+    def update(self, all_run_dates=False, profiler=None, pivot_format='wide'):
+        """
+        Method that updates the loaded tracking sheet with the dates the compounds were run and summarizes it. Returns
+        the same results as the in-memory update_tracking.
+
+        :param all_run_dates: List every date a compound was run instead of only the most recent one.
+        :param profiler: StageProfiler recording the merge, pivot and no data stages.
+        :param pivot_format: Layout of the pivoted tracking sheet. One of PIVOT_FORMATS, see pivot_tracking.
+        """
+        profiler = profiler or StageProfiler()
+        if self._spr_cache is not None:
+            self._attach_spr_cache()
+
+        with profiler.stage('merge', rows_in=self._rows, cprofile=True) as record:
+            _index_latest_runs(self.conn, all_run_dates=all_run_dates)
+            df_merge_tracking = _merge(self.conn, self._df_tracking, all_run_dates=all_run_dates)
+            record['rows_out'] = len(df_merge_tracking)
+
+        with profiler.stage('pivot', rows_in=self._rows, cprofile=True) as record:
+            df_pivoted_tracking = _pivot(self.conn, long_format=pivot_format == 'long')
+            record['rows_out'] = len(df_pivoted_tracking)
+
+        with profiler.stage('no data', rows_in=self._rows, cprofile=True) as record:
+            df_cmpds_no_data = _cmpds_no_data(self.conn)
+            record['rows_out'] = len(df_cmpds_no_data)
+
+        return df_merge_tracking, df_pivoted_tracking, df_cmpds_no_data
+
+
+def _index_latest_runs(conn, all_run_dates=False):
+    """
+    Helper method that creates the latest table, the SQL counterpart of get_latest_run_index.
+    """
+    site = "CASE WHEN OPERATOR IS 'Viva_Biotech' THEN 'DATE_RUN_VIVA' ELSE 'DATE_RUN_BROAD' END"
+    if all_run_dates:
+        # The window runs over the whole group, so every row of a group holds all of its dates in order.
+        dates = '''
+            SELECT DISTINCT BROAD_ID, SITE, group_concat(DATE, ', ') OVER (
+                PARTITION BY BROAD_ID, SITE ORDER BY DATE
+                ROWS BETWEEN UNBOUNDED PRECEDING AND UNBOUNDED FOLLOWING) AS DATES
+            FROM (SELECT DISTINCT BROAD_ID, {} AS SITE, DATE FROM spr
+                  WHERE BROAD_ID IS NOT NULL AND DATE IS NOT NULL)
+        '''.format(site)
+    else:
+        dates = '''
+            SELECT BROAD_ID, {} AS SITE, MAX(DATE) AS DATES FROM spr
+            WHERE BROAD_ID IS NOT NULL AND DATE IS NOT NULL
+            GROUP BY BROAD_ID, SITE
+        '''.format(site)
+
+    # The molecular weight of the most recent Viva run, with missing dates last and ties in the order of the results.
+    # It is kept in its own table first, so the join looks it up by BROAD_ID instead of running the window again.
+    conn.executescript('''
+        CREATE TABLE latest_mw (BROAD_ID TEXT PRIMARY KEY, COMPOUND_MW REAL);
+        INSERT INTO latest_mw
+        SELECT BROAD_ID, COMPOUND_MW
+        FROM (SELECT BROAD_ID, COMPOUND_MW, ROW_NUMBER() OVER (
+                  PARTITION BY BROAD_ID ORDER BY DATE IS NULL DESC, DATE DESC, POS DESC) AS NUM
+              FROM spr WHERE OPERATOR = 'Viva_Biotech' AND COMPOUND_MW IS NOT NULL)
+        WHERE NUM = 1;
+
+        CREATE TABLE latest (BROAD_ID TEXT PRIMARY KEY, DATE_RUN_VIVA TEXT, DATE_RUN_BROAD TEXT, COMPOUND_MW REAL);
+        INSERT INTO latest
+        SELECT d.BROAD_ID, d.DATE_RUN_VIVA, d.DATE_RUN_BROAD, mw.COMPOUND_MW
+        FROM (SELECT BROAD_ID, MAX(CASE SITE WHEN 'DATE_RUN_VIVA' THEN DATES END) AS DATE_RUN_VIVA,
+                     MAX(CASE SITE WHEN 'DATE_RUN_BROAD' THEN DATES END) AS DATE_RUN_BROAD
+              FROM ({}) GROUP BY BROAD_ID) AS d
+        LEFT JOIN latest_mw AS mw ON mw.BROAD_ID = d.BROAD_ID;
+    '''.format(dates))
+
+
+def _merge(conn, df_tracking=None, all_run_dates=False):
+    """
+    Helper method that looks up the run dates and molecular weight of every shipment in the latest table. A tracking
+    sheet loaded from memory is updated in place, as the in-memory engine does. A streamed one is read back from the
+    database in the order it was loaded.
+    """
+    columns = ['COMPOUND_MW', 'DATE_RUN_VIVA', 'DATE_RUN_BROAD']
+    if df_tracking is None:
+        columns = ['BRD', 'FROM', 'TO', 'DATE_RECEIVED'] + columns
+    df_runs = _read_frame(conn, '''
+        SELECT {}
+        FROM tracking AS t LEFT JOIN latest AS l ON l.BROAD_ID = t.BRD ORDER BY t.POS
+    '''.format(', '.join('t."{}"'.format(col) if col in transform.TRACKING_CSV_COLUMNS else 'l.' + col
+                          for col in columns)))
+    if df_tracking is None:
+        df_tracking = df_runs[transform.TRACKING_CSV_COLUMNS].copy()
+
+    df_tracking['COMPOUND_MW'] = df_runs['COMPOUND_MW'].astype(float).to_numpy()
+    for col in ['DATE_RUN_VIVA', 'DATE_RUN_BROAD']:
+        if all_run_dates:
+            dates = df_runs[col].astype(object)
+        else:
+            dates = pd.to_datetime(df_runs[col], format=schema.DATE_FORMAT)
+        df_tracking[col] = dates.to_numpy()
+    return df_tracking
+
+
+def _pivot(conn, long_format=False):
+    """
+    Helper method that pivots the updated tracking sheet in SQL, see pivot_tracking. The values of each group are
+    joined in the order of the tracking sheet.
+    """
+    # The groups are read in the order of an index of the keys, whose entries are sorted by the keys and then by
+    # position, so each group is joined in one pass in the order of the tracking sheet without sorting the rows.
+    conn.execute('CREATE INDEX IF NOT EXISTS ix_tracking_keys ON tracking (BRD, "FROM", "TO")')
+    df_wide = _read_frame(conn, '''
+        SELECT t.BRD, t."FROM", t."TO", {}
+        FROM tracking AS t INDEXED BY ix_tracking_keys LEFT JOIN latest AS l ON l.BROAD_ID = t.BRD
+        WHERE t.BRD IS NOT NULL AND t."FROM" IS NOT NULL AND t."TO" IS NOT NULL
+        GROUP BY t.BRD, t."FROM", t."TO"
+        ORDER BY t.BRD, t."FROM", t."TO"
+    '''.format(', '.join("coalesce(group_concat({0}.{1}, ' '), '') AS {1}".format(
+        't' if field == 'DATE_RECEIVED' else 'l', field) for field in PIVOT_FIELDS)))
+
+    # One row per group and field, in the order of the keys and fields.
+    keys = ['BRD', 'FROM', 'TO']
+    groups = np.repeat(np.arange(len(df_wide)), len(PIVOT_FIELDS))
+    df_long = pd.DataFrame({col: transform.sorted_categories(df_wide[col]).array.take(groups) for col in keys})
+    df_long['FIELD'] = np.tile(np.array(PIVOT_FIELDS, dtype=object), len(df_wide))
+    df_long['VALUE'] = df_wide[PIVOT_FIELDS].astype(object).to_numpy().ravel()
+    if long_format:
+        return df_long
+    return transform.unstack_pivot(df_long.set_index(keys + ['FIELD'])['VALUE'])
+
+
+def _cmpds_no_data(conn):
+    """
+    Helper method that finds the compounds received at Broad or Viva with no data in SQL, see get_cmpds_no_data.
+    """
+    df_flags = pd.read_sql_query('''
+        SELECT BRD, MAX(RECEIVED AND NOT_RUN_BROAD AND NOT_RUN_VIVA) AS NOT_RUN,
+               MAX(RECEIVED AND NOT_RUN_BROAD AND "TO" = 'Broad') AS BROAD,
+               MAX(RECEIVED AND NOT_RUN_VIVA AND "TO" = 'Viva') AS VIVA
+        FROM (SELECT t.BRD_KEY AS BRD, t."TO", t.RECEIVED,
+                     l.DATE_RUN_BROAD IS NULL AS NOT_RUN_BROAD, l.DATE_RUN_VIVA IS NULL AS NOT_RUN_VIVA
+              FROM tracking AS t LEFT JOIN latest AS l ON l.BROAD_ID = t.BRD
+              WHERE t."TO" IN ('Broad', 'Viva') AND t.BRD_KEY IS NOT NULL)
+        GROUP BY BRD
+        ORDER BY BRD
+    ''', conn)
+
+    not_run = df_flags['NOT_RUN'] == 1
+    return transform.no_data_frame(ls_broad=df_flags.loc[not_run & (df_flags['BROAD'] == 1), 'BRD'].tolist(),
+                                   ls_viva=df_flags.loc[not_run & (df_flags['VIVA'] == 1), 'BRD'].tolist())
+
+
+def update_tracking(df_ori_tracking, df_spr_dot_data, all_run_dates=False, profiler=None, pivot_format='wide'):
+    """
+    Method that updates the tracking sheet with the dates the compounds were run and summarizes it in SQL. Takes the
+    same arguments and returns the same results as the in-memory update_tracking.
+
+    Both frames are already in memory, so they are loaded into the database in chunks. Use a TrackingDatabase to
+    stream them from their sources instead.
+
+    :param df_ori_tracking: Tracking sheet as a DataFrame.
+    :param df_spr_dot_data: SPR results as returned by get_dot_data.
+    :param all_run_dates: List every date a compound was run instead of only the most recent one.
+    :param profiler: StageProfiler recording the load, merge, pivot and no data stages.
+    :param pivot_format: Layout of the pivoted tracking sheet. One of PIVOT_FORMATS, see pivot_tracking.
+    """
+    profiler = profiler or StageProfiler()
+
+    with TrackingDatabase() as database:
+        with profiler.stage('load sqlite', rows_in=len(df_ori_tracking) + len(df_spr_dot_data)) as record:
+            record['rows_out'] = database.load_tracking_frame(df_ori_tracking)
+            database.load_spr_frame(df_spr_dot_data)
+
+        return database.update(all_run_dates=all_run_dates, profiler=profiler, pivot_format=pivot_format)
@@ -0,0 +1,271 @@
+"""Transform steps of update_tracking: reading, cleaning, merging, pivoting and summarizing the tracking sheet.
+
+The methods only use pandas, so the in-memory, SQLite and partitioned engines share them without importing the app.
+"""
+
+# Import data wrangling Python packages
+import pandas as pd
+import numpy as np
+from pandas.api.types import union_categoricals
+
+# Import the typed schema the frames are converted to before they are merged
+from make_updated_tracking_sheet import schema
+
+# Import logging package
+import logging
+
+# Columns of the tracking sheet that are pivoted and checked for compounds with no data.
+TRACKING_COLUMNS = ['BRD', 'FROM', 'TO', 'DATE_RUN_BROAD', 'DATE_RUN_VIVA', 'DATE_RECEIVED']
+
+# Columns read from a tracking sheet .csv file. The run dates are not read as they are replaced by the merge.
+TRACKING_CSV_COLUMNS = ['BRD', 'FROM', 'TO', 'DATE_RECEIVED']
+
+# Number of rows of a tracking sheet .csv file read at a time.
+TRACKING_CHUNK_SIZE = 100000
+
+# Layouts the pivoted tracking sheet can be saved in.
+PIVOT_FORMATS = ['wide', 'long']
+
+
+def read_tracking_csv(paths, chunksize=TRACKING_CHUNK_SIZE):
+    """
+    Method that reads the tracking sheet from one or more .csv files, e.g. several shipment logs, into one DataFrame.
+
+    Only the TRACKING_CSV_COLUMNS are read, as categoricals, chunksize rows at a time, so large exports are read in
+    bounded memory. The chunks are combined with union_categoricals, keeping each distinct value once.
+
+    :param paths: Paths of the .csv files.
+    :param chunksize: Number of rows read at a time.
+    """
+    parts = {col: [] for col in TRACKING_CSV_COLUMNS}
+    for chunk in iter_tracking_csv(paths=paths, chunksize=chunksize):
+        for col in TRACKING_CSV_COLUMNS:
+            parts[col].append(chunk[col].array)
+
+    return pd.DataFrame({col: union_categoricals(arrays) if arrays else pd.Categorical([])
+                         for col, arrays in parts.items()})
+
+
+def iter_tracking_csv(paths, chunksize=TRACKING_CHUNK_SIZE):
+    """
+    Method that reads the tracking sheet from one or more .csv files chunksize rows at a time and yields each chunk as
+    a DataFrame of categorical TRACKING_CSV_COLUMNS with truncated BRDs, see read_tracking_csv.
+
+    :param paths: Paths of the .csv files.
+    :param chunksize: Number of rows read at a time.
+    """
+    for path in paths:
+        logging.info('Reading tracking sheet from {}...'.format(path))
+        for chunk in pd.read_csv(path, usecols=TRACKING_CSV_COLUMNS, dtype='category', chunksize=chunksize):
+            # Truncate the BRDs per chunk so that only the compound IDs are kept as categories.
+            chunk['BRD'] = normalize_brd(chunk['BRD']).astype('category')
+            yield chunk[TRACKING_CSV_COLUMNS]
+
+
+def normalize_brd(brd):
+    """
+    Method that truncates BRD IDs to the 22 characters of the compound ID, dropping the batch suffix.
+    :param brd: Series of BRD IDs.
+    """
+    return brd.str[:22]
+
+
+def strip_strings(df):
+    """
+    Method that strips leading and trailing whitespace from the string and categorical columns of a DataFrame.
+    Categorical columns are stripped once per category and returned as strings.
+    :param df: DataFrame to strip.
+    """
+    df = df.copy()
+    for col in df.select_dtypes(include=['object', 'category']).columns:
+        df[col] = df[col].str.strip()
+    return df
+
+
+def get_latest_run_index(df, keep_all_dates=False):
+    """
+    Method that indexes the SPR results by compound so they can be joined one to one with the tracking sheet.
+
+    Returns a DataFrame indexed by BROAD_ID with the columns DATE_RUN_VIVA and DATE_RUN_BROAD holding the most recent
+    date the compound was run by Viva and by anyone else, and COMPOUND_MW of the most recent Viva run.
+
+    :param df: SPR results with datetime64 or Y-m-d dates, e.g. converted by schema.apply_spr_schema.
+    :param keep_all_dates: Hold every date the compound was run as a comma separated list of Y-m-d dates instead of
+    the most recent.
+    """
+    is_viva = df['OPERATOR'] == 'Viva_Biotech'
+    df_runs = pd.DataFrame({'BROAD_ID': df['BROAD_ID'],
+                            'SITE': pd.Categorical(np.where(is_viva, 'DATE_RUN_VIVA', 'DATE_RUN_BROAD')),
+                            'DATE': df['DATE']}, index=df.index).dropna(subset=['DATE'])
+
+    # Only group the compounds that were run, not every category of a categorical BROAD_ID.
+    if keep_all_dates:
+        df_runs = df_runs.drop_duplicates().sort_values(by=['BROAD_ID', 'SITE', 'DATE'])
+        dates = schema.format_dates(df_runs['DATE']).groupby([df_runs['BROAD_ID'], df_runs['SITE']],
+                                                             observed=True).agg(', '.join)
+    else:
+        dates = df_runs.groupby(['BROAD_ID', 'SITE'], observed=True)['DATE'].max()
+
+    # A site nobody ran the compounds at gets an empty column of the same type as the other site.
+    df_index = dates.unstack('SITE').reindex(columns=['DATE_RUN_VIVA', 'DATE_RUN_BROAD']).astype(dates.dtype)
+    df_index.columns.name = None
+
+    # Molecular weight reported by the most recent Viva run
+    df_viva = df[is_viva].sort_values(by=['BROAD_ID', 'DATE'])
+    df_index['COMPOUND_MW'] = df_viva.groupby('BROAD_ID', observed=True)['COMPOUND_MW'].last()
+
+    return df_index
+
+
+def merge_runs(df_tracking, df_spr_dot_data, all_run_dates=False):
+    """
+    Method that fills in the COMPOUND_MW, DATE_RUN_VIVA and DATE_RUN_BROAD columns of the tracking sheet from
+    the SPR results, see update_tracking.
+    :param df_tracking: Tracking sheet with normalized BRDs converted by schema.apply_tracking_schema.
+    :param df_spr_dot_data: SPR results as returned by get_dot_data.
+    :param all_run_dates: List every date a compound was run instead of only the most recent one.
+    """
+    # Convert the SPR results to categorical keys and datetime64 dates. Dotmatics reports the dates as Y_m_d.
+    df_spr_dot_data = schema.apply_spr_schema(df_spr_dot_data)
+
+    # Index the most recent run date of each compound at Viva and at the Broad
+    df_latest_runs = get_latest_run_index(df=df_spr_dot_data, keep_all_dates=all_run_dates)
+
+    # Update the `DATE_RUN_VIVA` and `DATE_RUN_BROAD` fields by looking up each distinct BRD in the index once
+    # and spreading the results to its shipments by category code. Missing BRDs have code -1 and get nan.
+    brd = df_tracking['BRD'].cat
+    df_runs = df_latest_runs.reindex(brd.categories.astype(object))
+    for col in ['COMPOUND_MW', 'DATE_RUN_VIVA', 'DATE_RUN_BROAD']:
+        df_tracking[col] = pd.api.extensions.take(df_runs[col].to_numpy(), brd.codes.to_numpy(), allow_fill=True)
+
+    return df_tracking
+
+
+def sorted_categories(values):
+    """
+    Method that converts a Series to a categorical with its categories in sorted order, so that sorting and
+    grouping by it orders the values like strings.
+    :param values: Series to convert.
+    """
+    values = values.astype('category')
+    return values.cat.reorder_categories(values.cat.categories.sort_values())
+
+
+def pivot_tracking(df, long_format=False):
+    """
+    Method that pivots the updated tracking sheet so that each BRD is a unique identifier.
+
+    The values of each field are joined with spaces per BRD, sender (FROM) and receiver (TO), in the order of the
+    tracking sheet, skipping missing values. Groups where every value of a field is missing hold an empty string.
+
+    The wide table has a row per BRD and a column per field, FROM and TO, as pd.pivot_table lays it out. The long table
+    has a row per BRD, FROM, TO and field instead, with the headers BRD, FROM, TO, FIELD and VALUE, and does not grow
+    with the number of FROM and TO combinations.
+
+    :param df: Updated tracking sheet with the TRACKING_COLUMNS headers.
+    :param long_format: Return the long table instead of the wide one.
+    """
+    keys = ['BRD', 'FROM', 'TO']
+    group_keys = keys + ['FIELD']
+    fields = [col for col in df.columns if col not in keys]
+
+    # Write the values as strings once per column, leaving the missing ones missing.
+    df_values = pd.DataFrame({col: schema.format_dates(df[col]).astype(object) for col in fields}, index=df.index)
+    df_values = df_values.where(df_values.isnull(), df_values.astype(str))
+    df_keys = pd.DataFrame({col: sorted_categories(df[col]) for col in keys}, index=df.index)
+
+    # One row per shipment and field, sorted once by the group keys. The stable sort keeps the tracking sheet order
+    # within a group.
+    df_long = pd.concat([df_keys, df_values], axis=1).melt(id_vars=keys, value_vars=fields, var_name='FIELD',
+                                                           value_name='VALUE')
+    df_long = df_long.dropna(subset=keys).sort_values(by=group_keys, kind='stable')
+    groups = pd.MultiIndex.from_frame(df_long[group_keys].drop_duplicates())
+
+    # Most groups hold a single value, which is used as is. Only groups with several values are joined.
+    df_long = df_long.dropna(subset=['VALUE'])
+    several = df_long.duplicated(subset=group_keys, keep=False)
+    joined = pd.concat([df_long[~several].set_index(group_keys)['VALUE'],
+                        df_long[several].groupby(group_keys, observed=True, sort=False)['VALUE'].agg(' '.join)])
+    joined = joined.reindex(groups, fill_value='')
+
+    if long_format:
+        return joined.reset_index()
+
+    return unstack_pivot(joined)
+
+
+def unstack_pivot(joined):
+    """
+    Method that lays out the joined values of each BRD, FROM, TO and field group as the wide pivot table.
+    :param joined: Series of the joined values indexed by BRD, FROM, TO and FIELD.
+    """
+    joined.index = joined.index.remove_unused_levels()
+    df_pivoted = joined.unstack(['FIELD', 'FROM', 'TO']).sort_index(axis=1)
+    df_pivoted.columns.names = [None, 'FROM', 'TO']
+    return df_pivoted
+
+
+def get_cmpds_no_data(df):
+    """
+    Method that finds the compounds received at Broad or Viva with no data in database.
+
+    Compounds are listed in BRD order.
+
+    :param df: Tracking sheet updated with dates the compounds were run as a DataFrame
+    """
+    return no_data_from_flags(no_data_flags(df))
+
+
+def no_data_flags(df):
+    """
+    Method that flags each compound received at Broad or Viva by whether it has no data at all, no data at the
+    Broad and no data at Viva. Returns a DataFrame indexed by the sorted BRDs with the columns NOT_RUN, BROAD and VIVA.
+    :param df: Tracking sheet updated with dates the compounds were run as a DataFrame
+    """
+    # Filter out compounds not going to the Broad or Viva
+    df = df[df['TO'].isin(['Broad', 'Viva'])]
+
+    # Issue where some cells have spaces and those don't fill with nan.  Fill all empty cells with nan.
+    df = strip_strings(df).replace('', np.nan)
+
+    # Flag every received shipment by the sites it has no data for.
+    received = df['DATE_RECEIVED'].notna()
+    not_run_broad = df['DATE_RUN_BROAD'].isnull()
+    not_run_viva = df['DATE_RUN_VIVA'].isnull()
+    df_flags = pd.DataFrame({'BRD': df['BRD'],
+                             'NOT_RUN': received & not_run_broad & not_run_viva,
+                             'BROAD': received & not_run_broad & (df['TO'] == 'Broad'),
+                             'VIVA': received & not_run_viva & (df['TO'] == 'Viva')})
+
+    # A compound is flagged if any of its shipments is. Grouping sorts the compounds by BRD.
+    return df_flags.groupby('BRD', sort=True).any()
+
+
+def no_data_from_flags(df_flags):
+    """
+    Method that lists the compounds with no data at Broad and at Viva from their flags, see no_data_flags.
+    :param df_flags: Flags of the compounds as returned by no_data_flags.
+    """
+    # Compounds with no data at all that were received at Broad or Viva but not run there.
+    ls_broad = df_flags.index[df_flags['NOT_RUN'] & df_flags['BROAD']].tolist()
+    ls_viva = df_flags.index[df_flags['NOT_RUN'] & df_flags['VIVA']].tolist()
+
+    return no_data_frame(ls_broad=ls_broad, ls_viva=ls_viva)
+
+
+def no_data_frame(ls_broad, ls_viva):
+    """
+    Method that puts the compounds with no data at Broad and at Viva side by side in a DataFrame.
+    :param ls_broad: List of the compounds with no data at Broad.
+    :param ls_viva: List of the compounds with no data at Viva.
+    """
+    # Make the lists the same length as that is required to construct a DataFrame
+    if len(ls_broad) < len(ls_viva):
+        ls_broad.extend([np.nan] * (len(ls_viva) - len(ls_broad)))
+    if len(ls_viva) < len(ls_broad):
+        ls_viva.extend([np.nan] * (len(ls_broad) - len(ls_viva)))
+
+    # Turn results into a DataFrame
+    df_cmpds_no_data = pd.DataFrame({'Broad': ls_broad, 'Viva': ls_viva})
+
+    return df_cmpds_no_data
@@ -0,0 +1,231 @@
+"""Module for testing the batch runs across several targets"""
+
+# Import modules from the unittesting framework
+from unittest import TestCase
+from unittest.mock import patch
+
+# Import system packages for temporary targets and cache files
+import json
+import os
+import sqlite3
+import tempfile
+
+# Import pandas
+import pandas as pd
+
+# Import package used to run the worker processes as threads
+from concurrent.futures import ThreadPoolExecutor
+
+# Import sqlalchemy for a local stand-in of resultsdb
+import sqlalchemy
+
+# Import the modules under test
+import google_client
+from make_updated_tracking_sheet import batch
+from make_updated_tracking_sheet.spr_cache import open_cache
+from make_updated_tracking_sheet.make_updated_tracking_sheet import StageError
+from make_updated_tracking_sheet.resultsdb import get_dot_data_for_targets
+
+
+class TestLoadTargets(TestCase):
+    """Class for testing reading the targets file"""
+
+    def setUp(self) -> None:
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.targets_file = os.path.join(self.tmp_dir.name, 'targets.json')
+
+    def tearDown(self) -> None:
+        self.tmp_dir.cleanup()
+
+    def _write(self, targets):
+        with open(self.targets_file, 'w') as f:
+            json.dump(targets, f)
+
+    def test_load_targets(self):
+        targets = [{'project_code': 7279, 'protein_id': 'BIP-0384-01', 'spreadsheet_id': 'sheet_1',
+                    'save_file': 'KRAS_G12D'}]
+        self._write(targets)
+
+        self.assertEqual(targets, batch.load_targets(self.targets_file))
+
+    def test_missing_key(self):
+        self._write([{'project_code': 7279, 'protein_id': 'BIP-0384-01', 'save_file': 'KRAS_G12D'}])
+
+        with self.assertRaises(ValueError):
+            batch.load_targets(self.targets_file)
+
+    def test_duplicate_save_file(self):
+        target = {'project_code': 7279, 'protein_id': 'BIP-0384-01', 'spreadsheet_id': 'sheet_1',
+                  'save_file': 'KRAS_G12D'}
+        self._write([target, dict(target, protein_id='BIP-0385-01')])
+
+        with self.assertRaises(ValueError):
+            batch.load_targets(self.targets_file)
+
+
+class TestRunBatch(TestCase):
+    """Class for testing a batch run across several targets"""
+
+    tracking_file_path = 'tests/fixtures/compound_shipment_tracking_example.csv'
+    df_dot_data_path = 'tests/fixtures/dotmatics_data_example.csv'
+
+    targets = [{'project_code': 7279, 'protein_id': 'BIP-0384-01', 'spreadsheet_id': 'sheet_1', 'save_file': 'G12D'},
+               {'project_code': 7279, 'protein_id': 'BIP-0385-01', 'spreadsheet_id': 'sheet_2', 'save_file': 'G12C'}]
+
+    def setUp(self) -> None:
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.targets_file = os.path.join(self.tmp_dir.name, 'targets.json')
+        with open(self.targets_file, 'w') as f:
+            json.dump(self.targets, f)
+
+        df_dot_data = pd.read_csv(self.df_dot_data_path)
+        self.spr_results = {(7279, 'BIP-0384-01'): df_dot_data, (7279, 'BIP-0385-01'): df_dot_data.head(0)}
+
+    def tearDown(self) -> None:
+        self.tmp_dir.cleanup()
+
+    @patch('google_sheet_data.write_gsheet_data')
+    @patch('google_sheet_data.get_gsheet_data')
+    @patch('make_updated_tracking_sheet.sinks.save_output')
+    @patch('make_updated_tracking_sheet.batch.get_dot_data_for_targets')
+    def test_run_batch(self, mock_1, mock_2, mock_3, mock_4):
+        mock_1.return_value = self.spr_results
+        mock_3.side_effect = lambda spreadsheet_id: pd.read_csv(self.tracking_file_path)
+
+        batch.run_batch(targets_file=self.targets_file, processes=1)
+
+        # One database query for all targets
+        mock_1.assert_called_once()
+        self.assertEqual([(7279, 'BIP-0384-01'), (7279, 'BIP-0385-01')], mock_1.call_args.kwargs['targets'])
+
+        self.assertEqual(['G12D', 'G12C'], [call.kwargs['save_file'] for call in mock_2.call_args_list])
+        self.assertEqual(['sheet_1', 'sheet_2'], [call.kwargs['spreadsheet_id'] for call in mock_4.call_args_list])
+
+    @patch('google_sheet_data.write_gsheet_data')
+    @patch('google_sheet_data.get_gsheet_data')
+    @patch('make_updated_tracking_sheet.sinks.save_output')
+    @patch('make_updated_tracking_sheet.batch.get_dot_data_for_targets')
+    def test_run_batch_reports_failed_target(self, mock_1, mock_2, mock_3, mock_4):
+        mock_1.return_value = self.spr_results
+        mock_3.side_effect = [pd.read_csv(self.tracking_file_path), ConnectionError('Cannot read sheet_2')]
+
+        with self.assertRaises(StageError) as context:
+            batch.run_batch(targets_file=self.targets_file, processes=1)
+
+        self.assertEqual(['G12C'], list(context.exception.errors))
+        self.assertEqual(1, mock_4.call_count)
+
+    @patch('google_sheet_data.write_gsheet_data')
+    @patch('google_sheet_data.get_gsheet_data')
+    @patch('make_updated_tracking_sheet.sinks.save_output')
+    @patch('make_updated_tracking_sheet.batch.get_dot_data_for_targets')
+    @patch('make_updated_tracking_sheet.batch.ProcessPoolExecutor')
+    def test_google_api_quota_split(self, mock_executor, mock_1, mock_2, mock_3, mock_4):
+        # Run the worker processes as threads, which take the same initializer.
+        mock_executor.side_effect = ThreadPoolExecutor
+        mock_1.return_value = self.spr_results
+        mock_3.side_effect = lambda spreadsheet_id: pd.read_csv(self.tracking_file_path)
+
+        with patch.dict(os.environ, {'GOOGLE_API_QUOTA': '60'}):
+            google_client.get_rate_limiter.cache_clear()
+            try:
+                batch.run_batch(targets_file=self.targets_file, processes=2)
+
+                self.assertEqual((30,), mock_executor.call_args.kwargs['initargs'])
+                self.assertEqual(30, google_client.get_rate_limiter().quota)
+            finally:
+                google_client.get_rate_limiter.cache_clear()
+
+
+class TestGetDotDataForTargets(TestCase):
+    """Class for testing the combined download of SPR results for several targets"""
+
+    df_dot_data_path = 'tests/fixtures/dotmatics_data_example.csv'
+
+    def setUp(self) -> None:
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.cache_path = os.path.join(self.tmp_dir.name, 'spr_cache.sqlite')
+
+        # Use an in memory SQLite database as a stand-in for resultsdb.
+        self.engine = sqlalchemy.create_engine('sqlite://')
+        metadata = sqlalchemy.MetaData()
+        self.spr_data_tbl = sqlalchemy.Table('upload_spr_dose', metadata,
+                                             sqlalchemy.Column('broad_id', sqlalchemy.String),
+                                             sqlalchemy.Column('project_code', sqlalchemy.Integer),
+                                             sqlalchemy.Column('operator', sqlalchemy.String),
+                                             sqlalchemy.Column('protein_id', sqlalchemy.String),
+                                             sqlalchemy.Column('compound_mw', sqlalchemy.Float),
+                                             sqlalchemy.Column('date_', sqlalchemy.String))
+        metadata.create_all(self.engine)
+
+        df = pd.read_csv(self.df_dot_data_path)
+        df.columns = ['broad_id', 'project_code', 'operator', 'protein_id', 'compound_mw', 'date_']
+        df.loc[df.index[:100], 'protein_id'] = 'BIP-0385-01'
+        df.loc[df.index[100:150], 'project_code'] = 1234
+        self.df = df
+        self._insert(df)
+
+    def tearDown(self) -> None:
+        self.engine.dispose()
+        self.tmp_dir.cleanup()
+
+    def _insert(self, df):
+        records = df.astype(object).where(df.notna(), None).to_dict('records')
+        with self.engine.begin() as conn:
+            conn.execute(self.spr_data_tbl.insert(), records)
+
+    def _get(self):
+        return get_dot_data_for_targets(targets=[(7279, 'BIP-0384-01'), (7279, 'BIP-0385-01')],
+                                        cache_path=self.cache_path, engine=self.engine)
+
+    def test_results_split_per_target(self):
+        results = self._get()
+
+        self.assertEqual(len(self.df) - 150, len(results[(7279, 'BIP-0384-01')]))
+        self.assertEqual(100, len(results[(7279, 'BIP-0385-01')]))
+        self.assertEqual({'BIP-0385-01'}, set(results[(7279, 'BIP-0385-01')]['PROTEIN_ID']))
+
+    def test_incremental_sync(self):
+        self._get()
+
+        # A new run arrives for one target
+        df_new_run = self.df.head(1).copy()
+        df_new_run['date_'] = '2999_01_01'
+        self._insert(df_new_run)
+
+        results = self._get()
+
+        self.assertEqual(101, len(results[(7279, 'BIP-0385-01')]))
+        self.assertEqual(len(self.df) - 150, len(results[(7279, 'BIP-0384-01')]))
+
+    @patch('make_updated_tracking_sheet.resultsdb.spr_cache.merge_into_cache')
+    @patch('make_updated_tracking_sheet.resultsdb.spr_cache.open_cache')
+    def test_connections_closed_on_failure(self, mock_open_cache, mock_merge):
+        # Count the connections checked out of and returned to the pool of the engine.
+        pool_events = []
+        sqlalchemy.event.listen(self.engine, 'checkout', lambda *args: pool_events.append('checkout'))
+        sqlalchemy.event.listen(self.engine, 'checkin', lambda *args: pool_events.append('checkin'))
+
+        cache_conns = []
+        mock_open_cache.side_effect = lambda path: cache_conns.append(open_cache(path)) or cache_conns[-1]
+        mock_merge.side_effect = RuntimeError('Cannot write the cache')
+
+        with self.assertRaises(RuntimeError):
+            self._get()
+
+        self.assertEqual(pool_events.count('checkout'), pool_events.count('checkin'))
+        with self.assertRaises(sqlite3.ProgrammingError):
+            cache_conns[0].execute('SELECT 1')
+
+    @patch('make_updated_tracking_sheet.resultsdb._fetch_frame')
+    def test_connection_closed_on_failed_query(self, mock_fetch_frame):
+        pool_events = []
+        sqlalchemy.event.listen(self.engine, 'checkout', lambda *args: pool_events.append('checkout'))
+        sqlalchemy.event.listen(self.engine, 'checkin', lambda *args: pool_events.append('checkin'))
+        mock_fetch_frame.side_effect = RuntimeError('Query failed')
+
+        with self.assertRaises(RuntimeError):
+            self._get()
+
+        self.assertEqual(1, pool_events.count('checkout'))
+        self.assertEqual(1, pool_events.count('checkin'))
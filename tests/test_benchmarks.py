@@ -0,0 +1,69 @@
+"""Module for testing the synthetic data generators and the benchmark runner"""
+
+# Import modules from the unittesting framework
+from unittest import TestCase
+
+# Import system packages for temporary baseline files
+import os
+import tempfile
+
+# Import the modules under test
+from benchmarks import synthetic
+from benchmarks.run_benchmarks import compare, load_baseline, run_benchmark, save_baseline
+
+
+class TestSynthetic(TestCase):
+    """Class for testing the synthetic tracking sheet and SPR results"""
+
+    def setUp(self) -> None:
+        self.compounds = synthetic.make_compounds(300)
+
+    def test_compounds_distinct(self):
+        self.assertEqual(300, len(set(self.compounds)))
+        self.assertEqual({22}, {len(brd) for brd in self.compounds})
+
+    def test_tracking_sheet(self):
+        df = synthetic.make_tracking_sheet(1000, self.compounds)
+
+        self.assertEqual(1000, len(df))
+        self.assertEqual(set(synthetic.SITES), set(df['TO']))
+        self.assertTrue(df['DATE_RECEIVED'].isna().any())
+        self.assertTrue((df.loc[df['TO'] == 'Viva', 'BRD'].str.len() == 26).all())
+
+    def test_spr_results_repeat_runs(self):
+        df = synthetic.make_spr_results(1000, self.compounds)
+
+        self.assertTrue(df['BROAD_ID'].duplicated().any())
+        self.assertEqual(set(synthetic.OPERATORS), set(df['OPERATOR']))
+        self.assertTrue(df['DATE'].isna().any())
+        self.assertTrue(df.loc[df['OPERATOR'] != 'Viva_Biotech', 'COMPOUND_MW'].isna().all())
+
+
+class TestRunBenchmarks(TestCase):
+    """Class for testing the benchmark runner"""
+
+    def test_stages_measured(self):
+        report = run_benchmark(rows=300, output_format='csv')
+
+        stages = {record['stage']: record for record in report['stages']}
+        self.assertLessEqual({'query spr results', 'sync spr cache', 'merge', 'pivot', 'no data'}, set(stages))
+        self.assertGreater(stages['query spr results']['rows_out'], 0)
+        self.assertIn('traced_peak_mb', stages['pivot'])
+
+    def test_regression_flagged(self):
+        baseline = {'transform_engine': 'memory',
+                    'stages': [{'stage': 'pivot', 'seconds': 1.0, 'traced_peak_mb': 100.0},
+                               {'stage': 'merge', 'seconds': 0.01, 'traced_peak_mb': 1.0}]}
+        current = {'transform_engine': 'memory',
+                   'stages': [{'stage': 'pivot', 'seconds': 2.0, 'traced_peak_mb': 110.0},
+                              {'stage': 'merge', 'seconds': 0.05, 'traced_peak_mb': 1.0}]}
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, 'baseline.json')
+            save_baseline(path, {1000: baseline})
+            regressions = compare({1000: current}, load_baseline(path))
+
+        # The merge stage is 5 times slower but by less than MIN_SECONDS, and only the time of the pivot regressed.
+        self.assertEqual([{'rows': 1000, 'stage': 'pivot', 'measure': 'seconds', 'baseline': 1.0, 'current': 2.0}],
+                         regressions)
+        self.assertEqual([], compare({10000: current}, {'1000': baseline}))
@@ -0,0 +1,120 @@
+"""Module for testing the shared Google API client layer"""
+
+# Import modules from the unittesting framework
+from unittest import TestCase
+from unittest.mock import patch
+
+# Import system packages for the local fake server
+import http.server
+import json
+import os
+import threading
+
+# Import the Google API request classes used against the fake server
+import httplib2
+from googleapiclient.errors import HttpError
+from googleapiclient.http import HttpRequest
+
+# Import the module under test
+import google_client
+
+
+class FakeSheetsHandler(http.server.BaseHTTPRequestHandler):
+    """Local fake of the Sheets API answering with the next of the server's statuses"""
+
+    def do_GET(self):
+        self.server.requests += 1
+        status = self.server.statuses.pop(0) if self.server.statuses else 200
+        body = json.dumps({'values': [['BRD'], ['BRD-A']]} if status == 200 else
+                          {'error': {'code': status, 'message': 'Quota exceeded'}}).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class TestCall(TestCase):
+    """Class for testing the retries of Google API requests against a local fake server"""
+
+    def setUp(self) -> None:
+        self.server = http.server.HTTPServer(('127.0.0.1', 0), FakeSheetsHandler)
+        self.server.requests = 0
+        self.server.statuses = []
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+        # Give every test its own limiter with a quota the tests don't reach.
+        self.env = patch.dict(os.environ, {'GOOGLE_API_QUOTA': '1000'})
+        self.env.start()
+        google_client.get_rate_limiter.cache_clear()
+
+    def tearDown(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+        self.env.stop()
+        google_client.get_rate_limiter.cache_clear()
+
+    def _request(self):
+        uri = 'http://127.0.0.1:{}/v4/spreadsheets/sheet/values/Tracking'.format(self.server.server_port)
+        return HttpRequest(httplib2.Http(), lambda resp, content: json.loads(content), uri)
+
+    @patch('google_client.time.sleep')
+    def test_rate_limited_request_retried(self, mock_sleep):
+        self.server.statuses = [429, 503]
+
+        result = google_client.call(self._request().execute)
+
+        self.assertEqual([['BRD'], ['BRD-A']], result['values'])
+        self.assertEqual(3, self.server.requests)
+        first, second = [args[0] for args, _ in mock_sleep.call_args_list]
+        self.assertTrue(1 <= first <= 2 and 2 <= second <= 4)
+
+    @patch('google_client.time.sleep')
+    def test_client_error_not_retried(self, mock_sleep):
+        self.server.statuses = [404]
+
+        with self.assertRaises(HttpError):
+            google_client.call(self._request().execute)
+
+        self.assertEqual(1, self.server.requests)
+        mock_sleep.assert_not_called()
+
+    @patch('google_client.time.sleep')
+    def test_server_error_not_retried_for_rate_limit_statuses(self, mock_sleep):
+        self.server.statuses = [503]
+
+        with self.assertRaises(HttpError):
+            google_client.call(self._request().execute, retry_statuses=google_client.RATE_LIMIT_STATUSES)
+
+        self.assertEqual(1, self.server.requests)
+        mock_sleep.assert_not_called()
+
+    @patch('google_client.time.sleep')
+    def test_gives_up_after_max_retries(self, mock_sleep):
+        self.server.statuses = [429] * (google_client.MAX_RETRIES + 1)
+
+        with self.assertRaises(HttpError):
+            google_client.call(self._request().execute)
+
+        self.assertEqual(google_client.MAX_RETRIES + 1, self.server.requests)
+
+
+class TestRateLimiter(TestCase):
+    """Class for testing the per minute quota of Google API requests"""
+
+    def test_requests_spaced_out_once_quota_reached(self):
+        now = [0.0]
+        waits = []
+
+        def sleep(seconds):
+            waits.append(seconds)
+            now[0] += seconds
+
+        limiter = google_client.RateLimiter(quota=2, clock=lambda: now[0], sleep=sleep)
+        for _ in range(4):
+            limiter.acquire()
+
+        self.assertEqual([30.0, 30.0], waits)
@@ -0,0 +1,322 @@
+"""Module for testing google_sheet_data"""
+
+# Import modules from the unittesting framework
+from unittest import TestCase
+from unittest.mock import patch
+
+# Import system packages for temporary cache files
+import os
+import tempfile
+import time
+
+# Import pandas and numpy
+import pandas as pd
+import numpy as np
+
+# Import gspread utils for parsing A1 ranges
+import gspread
+
+# Import the module under test and the shared client layer it makes its requests through
+import google_sheet_data
+import google_client
+
+# Quota of Google API requests the tests don't reach, so the fakes are never rate limited.
+quota = patch.dict(os.environ, {'GOOGLE_API_QUOTA': '100000'})
+
+
+def setUpModule():
+    quota.start()
+    google_client.get_rate_limiter.cache_clear()
+
+
+def tearDownModule():
+    quota.stop()
+    google_client.get_rate_limiter.cache_clear()
+
+
+class FakeWorksheet:
+    """Local stand-in for a gspread Worksheet that records the requests made to it"""
+
+    def __init__(self, values, row_count=1000, col_count=26):
+        self.values = [list(row) for row in values]
+        self.row_count = row_count
+        self.col_count = col_count
+        self.updated_ranges = []
+        self.cleared_ranges = []
+
+    def get_all_values(self):
+        width = max([len(row) for row in self.values] + [0])
+        return [[str(val) for val in row] + [''] * (width - len(row)) for row in self.values]
+
+    def add_rows(self, rows):
+        self.row_count += rows
+
+    def add_cols(self, cols):
+        self.col_count += cols
+
+    def _set(self, a1_range, values):
+        first, last = a1_range.split(':')
+        first_row, first_col = gspread.utils.a1_to_rowcol(first)
+        last_row, last_col = gspread.utils.a1_to_rowcol(last)
+        for row in range(first_row, last_row + 1):
+            while len(self.values) < row:
+                self.values.append([])
+            cells = self.values[row - 1]
+            cells.extend([''] * (last_col - len(cells)))
+            for col in range(first_col, last_col + 1):
+                cells[col - 1] = values[row - first_row][col - first_col]
+
+    def batch_update(self, data, value_input_option=None):
+        for item in data:
+            self.updated_ranges.append(item['range'])
+            self._set(item['range'], item['values'])
+
+    def batch_clear(self, ranges):
+        for a1_range in ranges:
+            self.cleared_ranges.append(a1_range)
+            first, last = a1_range.split(':')
+            first_row, first_col = gspread.utils.a1_to_rowcol(first)
+            last_row, last_col = gspread.utils.a1_to_rowcol(last)
+            self._set(a1_range, [[''] * (last_col - first_col + 1)] * (last_row - first_row + 1))
+        # Trailing blank rows are not returned by the Sheets API.
+        while self.values and not any(self.values[-1]):
+            self.values.pop()
+
+
+class FakeRequest:
+    """Local stand-in for a Google API request that returns a response or raises an error when executed"""
+
+    def __init__(self, response, errors=()):
+        self.response = response
+        self.errors = list(errors)
+
+    def execute(self):
+        # Transient errors are raised first, as by a request that succeeds when it is retried.
+        if self.errors:
+            raise self.errors.pop(0)
+        if isinstance(self.response, Exception):
+            raise self.response
+        return self.response
+
+
+class FakeSheetsService:
+    """Local stand-in for the Sheets API client that counts the values downloaded from it"""
+
+    def __init__(self, values, row_count=1000, errors=None):
+        self.values_ = values
+        self.row_count = row_count
+        self.errors = errors or {}
+        self.downloads = 0
+        self.ranges = []
+
+    def spreadsheets(self):
+        return self
+
+    def values(self):
+        return self
+
+    def get(self, spreadsheetId, range=None, ranges=None, fields=None):
+        # Metadata of the sheet
+        if range is None:
+            return FakeRequest({'sheets': [{'properties': {'gridProperties': {'rowCount': self.row_count}}}]})
+
+        self.downloads += 1
+        self.ranges.append(range)
+
+        # Empty rows at the end of the range are left out, as by the Sheets API.
+        first, last = range.split('!')[1].split(':')
+        first_row, _ = gspread.utils.a1_to_rowcol(first)
+        last_row, _ = gspread.utils.a1_to_rowcol(last)
+        page = self.values_[first_row - 1:last_row]
+        while page and not page[-1]:
+            page.pop()
+        return FakeRequest({'range': range, 'values': page} if page else {'range': range},
+                           errors=self.errors.pop(range, ()))
+
+
+class FakeHttpError(Exception):
+    """Local stand-in for a googleapiclient HttpError with the HTTP status of the failed request"""
+
+    def __init__(self, status):
+        super().__init__('HTTP {}'.format(status))
+        self.resp = type('Response', (), {'status': status})()
+
+
+class FakeDriveService:
+    """Local stand-in for the Drive API client returning the metadata of the spreadsheet"""
+
+    def __init__(self, metadata):
+        self.metadata = metadata
+
+    def files(self):
+        return self
+
+    def get(self, fileId, fields):
+        return FakeRequest(self.metadata)
+
+
+class TestGetGsheetData(TestCase):
+    """Class for testing the revision cache of the tracking sheet downloads"""
+
+    values = [['BRD', 'FROM', 'TO'], ['BRD-K00029396-001-01-9-001', 'WXTJ', 'Viva']]
+
+    def setUp(self) -> None:
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.service = FakeSheetsService(values=self.values)
+
+    def tearDown(self) -> None:
+        self.tmp_dir.cleanup()
+
+    def test_unchanged_sheet_read_from_cache(self):
+        drive = FakeDriveService(metadata={'version': '12', 'modifiedTime': '2020-06-05T00:00:00.000Z'})
+
+        df_first = google_sheet_data.get_gsheet_data(service=self.service, drive_service=drive,
+                                                     cache_dir=self.tmp_dir.name)
+        df_second = google_sheet_data.get_gsheet_data(service=self.service, drive_service=drive,
+                                                      cache_dir=self.tmp_dir.name)
+
+        self.assertEqual(1, self.service.downloads)
+        pd.testing.assert_frame_equal(df_first, df_second)
+        self.assertEqual(['BRD', 'FROM', 'TO'], list(df_second.columns))
+
+    def test_changed_sheet_downloaded_again(self):
+        google_sheet_data.get_gsheet_data(service=self.service,
+                                          drive_service=FakeDriveService(metadata={'version': '12'}),
+                                          cache_dir=self.tmp_dir.name)
+        google_sheet_data.get_gsheet_data(service=self.service,
+                                          drive_service=FakeDriveService(metadata={'version': '13'}),
+                                          cache_dir=self.tmp_dir.name)
+
+        self.assertEqual(2, self.service.downloads)
+
+    def test_metadata_unavailable_falls_back_to_download(self):
+        drive = FakeDriveService(metadata=RuntimeError('Drive API unavailable'))
+
+        for _ in range(2):
+            df = google_sheet_data.get_gsheet_data(service=self.service, drive_service=drive,
+                                                   cache_dir=self.tmp_dir.name)
+
+        self.assertEqual(2, self.service.downloads)
+        self.assertEqual(1, len(df))
+
+    @patch('google_client.time.sleep')
+    def test_paged_read(self, mock_sleep):
+        values = [['BRD', 'FROM', 'TO']] + [['BRD-{}'.format(num), 'TCG', 'Viva'] for num in range(9)]
+        # Rows 7 and 8 at the end of the second page are empty and left out of its download.
+        values[6] = []
+        values[7] = []
+        service = FakeSheetsService(values=values + [[]] * 3, row_count=15,
+                                    errors={'Tracking!A5:J8': [FakeHttpError(503)]})
+
+        df = google_sheet_data.get_gsheet_data(service=service, drive_service=FakeDriveService(metadata={}),
+                                               cache_dir=self.tmp_dir.name, page_rows=4)
+
+        expected = pd.DataFrame(values[1:], columns=values[0])
+        pd.testing.assert_frame_equal(expected, df.astype(object).where(df.notna(), None))
+        self.assertIsInstance(df['FROM'].dtype, pd.CategoricalDtype)
+
+        # Each page is requested once and only the failed page is retried. The empty last page holds no rows.
+        self.assertCountEqual(['Tracking!A1:J4', 'Tracking!A5:J8', 'Tracking!A9:J12', 'Tracking!A13:J15'],
+                              service.ranges)
+        self.assertEqual(1, mock_sleep.call_count)
+
+    def test_paged_read_cached(self):
+        values = [['BRD', 'FROM', 'TO']] + [['BRD-{}'.format(num), 'TCG', ''] for num in range(5)] + [['BRD-5']]
+        drive = FakeDriveService(metadata={'version': '12'})
+
+        df_first = google_sheet_data.get_gsheet_data(service=FakeSheetsService(values=values, row_count=7),
+                                                     drive_service=drive, cache_dir=self.tmp_dir.name, page_rows=3)
+        df_second = google_sheet_data.get_gsheet_data(service=self.service, drive_service=drive,
+                                                      cache_dir=self.tmp_dir.name, page_rows=3)
+
+        self.assertEqual(0, self.service.downloads)
+        pd.testing.assert_frame_equal(df_first, df_second, check_categorical=False)
+        self.assertEqual(6, len(df_second))
+
+    def test_evict_cache(self):
+        for name, age, size in [('old.json', 10, 10), ('big.json', 2, 80), ('new.json', 1, 30)]:
+            path = os.path.join(self.tmp_dir.name, name)
+            with open(path, 'w') as f:
+                f.write('x' * size)
+            mtime = time.time() - age
+            os.utime(path, (mtime, mtime))
+
+        google_sheet_data.evict_cache(self.tmp_dir.name, max_age=5, max_bytes=100)
+
+        self.assertEqual(['new.json'], os.listdir(self.tmp_dir.name))
+
+
+class FakeErrorResponse:
+    """Local stand-in for the requests Response of a failed gspread request"""
+
+    status_code = 503
+    text = '{"error": {"code": 503, "message": "Backend Error"}}'
+
+    def json(self):
+        return {'error': {'code': 503, 'message': 'Backend Error'}}
+
+
+class ServerErrorWorksheet(FakeWorksheet):
+    """FakeWorksheet whose requests to add rows are applied but answered with a server error"""
+
+    def add_rows(self, rows):
+        super().add_rows(rows)
+        raise gspread.exceptions.APIError(FakeErrorResponse())
+
+
+class TestPandasToSheets(TestCase):
+    """Class for testing the diff based writes to a Google sheet"""
+
+    df = pd.DataFrame({'Broad': ['BRD-A', 'BRD-B', 'BRD-C'], 'Viva': ['BRD-A', 'BRD-D', np.nan]})
+
+    def test_write_to_empty_sheet(self):
+        sheet = FakeWorksheet(values=[])
+
+        google_sheet_data.pandas_to_sheets(pandas_df=self.df, sheet=sheet)
+
+        self.assertEqual(['A1:B4'], sheet.updated_ranges)
+        self.assertEqual(google_sheet_data.df_to_values(self.df), sheet.get_all_values())
+
+    def test_only_changed_rows_written(self):
+        sheet = FakeWorksheet(values=[['Broad', 'Viva'], ['BRD-A', 'BRD-A'], ['BRD-X', 'BRD-Y'], ['BRD-C', '']])
+
+        google_sheet_data.pandas_to_sheets(pandas_df=self.df, sheet=sheet)
+
+        self.assertEqual(['A3:B3'], sheet.updated_ranges)
+        self.assertEqual([], sheet.cleared_ranges)
+        self.assertEqual(google_sheet_data.df_to_values(self.df), sheet.get_all_values())
+
+    def test_unchanged_sheet_not_written(self):
+        sheet = FakeWorksheet(values=google_sheet_data.df_to_values(self.df))
+
+        google_sheet_data.pandas_to_sheets(pandas_df=self.df, sheet=sheet)
+
+        self.assertEqual([], sheet.updated_ranges)
+
+    def test_trailing_rows_and_columns_cleared(self):
+        sheet = FakeWorksheet(values=[['Broad', 'Viva', 'Old'], ['BRD-A', 'BRD-A', 'x'], ['BRD-B', 'BRD-D', ''],
+                                      ['BRD-C', '', ''], ['BRD-E', 'BRD-F', '']])
+
+        google_sheet_data.pandas_to_sheets(pandas_df=self.df, sheet=sheet)
+
+        self.assertEqual(['A1:C2'], sheet.updated_ranges)
+        self.assertEqual(['A5:C5'], sheet.cleared_ranges)
+        self.assertEqual([row + [''] for row in google_sheet_data.df_to_values(self.df)], sheet.get_all_values())
+
+    def test_sheet_grows_to_fit(self):
+        sheet = FakeWorksheet(values=[], row_count=2, col_count=1)
+
+        google_sheet_data.pandas_to_sheets(pandas_df=self.df, sheet=sheet)
+
+        self.assertEqual(4, sheet.row_count)
+        self.assertEqual(2, sheet.col_count)
+
+    @patch('google_client.time.sleep')
+    def test_rows_not_added_twice_after_server_error(self, mock_sleep):
+        sheet = ServerErrorWorksheet(values=[], row_count=2, col_count=1)
+
+        with self.assertRaises(gspread.exceptions.APIError):
+            google_sheet_data.pandas_to_sheets(pandas_df=self.df, sheet=sheet)
+
+        self.assertEqual(4, sheet.row_count)
+        mock_sleep.assert_not_called()
@@ -0,0 +1,89 @@
+"""Module for testing the run history"""
+
+# Import modules from the unittesting framework
+from unittest import TestCase
+from unittest.mock import patch
+
+# Import system packages for temporary history files
+import datetime
+import os
+import tempfile
+
+# Import pandas and numpy
+import pandas as pd
+import numpy as np
+
+# Import the module under test and the main method recording the runs
+from make_updated_tracking_sheet import history
+from make_updated_tracking_sheet.make_updated_tracking_sheet import main
+
+
+class TestHistory(TestCase):
+    """Class for testing recording and querying the results of runs"""
+
+    df_first = pd.DataFrame({'BRD': ['BRD-A', 'BRD-B', 'BRD-C'],
+                             'FROM': ['WXTJ', 'WXTJ', 'WXTJ'],
+                             'TO': ['Broad', 'Viva', 'Viva'],
+                             'DATE_RUN_BROAD': pd.to_datetime([None, None, None]),
+                             'DATE_RUN_VIVA': pd.to_datetime([None, None, None]),
+                             'DATE_RECEIVED': ['2020-05-01', '2020-05-01', '2020-05-01']})
+    df_first_no_data = pd.DataFrame({'Broad': ['BRD-A', np.nan], 'Viva': ['BRD-B', 'BRD-C']})
+
+    df_second = df_first.assign(DATE_RUN_BROAD=pd.to_datetime(['2020-06-01', None, None]),
+                                DATE_RUN_VIVA=pd.to_datetime([None, '2020-06-02', None]))
+    df_second_no_data = pd.DataFrame({'Broad': [np.nan], 'Viva': ['BRD-C']})
+
+    def setUp(self) -> None:
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.conn = history.open_history(os.path.join(self.tmp_dir.name, 'history', 'runs.sqlite'))
+
+    def tearDown(self) -> None:
+        self.conn.close()
+        self.tmp_dir.cleanup()
+
+    def _record(self, df_tracking, df_no_data, day):
+        return history.record_run(self.conn, df_tracking=df_tracking, df_cmpds_no_data=df_no_data, version='1.0',
+                                  save_file='Test', run_at=datetime.datetime(2020, 6, day))
+
+    def test_record_and_read_run(self):
+        run_id = self._record(self.df_second, self.df_second_no_data, day=3)
+
+        df_tracking, df_no_data = history.read_run(self.conn, run_id)
+
+        self.assertEqual(['2020-06-01', None, None], list(df_tracking['DATE_RUN_BROAD']))
+        self.assertEqual([('Viva', 'BRD-C')], list(df_no_data.itertuples(index=False, name=None)))
+        self.assertEqual(['2020-06-03T00:00:00'], list(history.read_runs(self.conn)['RUN_AT']))
+
+    def test_compounds_tested_since(self):
+        self._record(self.df_first, self.df_first_no_data, day=1)
+        self._record(self.df_second, self.df_second_no_data, day=3)
+
+        result = history.compounds_tested_since(self.conn, since='2020-06-02')
+
+        self.assertEqual([('BRD-A', 'Broad', '2020-06-01'), ('BRD-B', 'Viva', '2020-06-02')],
+                         list(result.itertuples(index=False, name=None)))
+
+    def test_no_changes_since_last_run(self):
+        self._record(self.df_first, self.df_first_no_data, day=1)
+        self._record(self.df_second, self.df_second_no_data, day=3)
+
+        self.assertTrue(history.compounds_tested_since(self.conn, since='2020-06-04').empty)
+        self.assertTrue(history.compounds_tested_since(self.conn, since='2020-06-04', save_file='Other').empty)
+
+    @patch('google_sheet_data.write_gsheet_data')
+    @patch('make_updated_tracking_sheet.resultsdb.get_dot_data')
+    @patch('google_sheet_data.get_gsheet_data')
+    @patch('pandas.ExcelWriter')
+    @patch('pandas.DataFrame.to_excel')
+    def test_main_records_run(self, mock_1, mock_2, mock_3, mock_4, mock_5):
+        mock_3.return_value = pd.read_csv('tests/fixtures/compound_shipment_tracking_example.csv')
+        mock_4.return_value = pd.read_csv('tests/fixtures/dotmatics_data_example.csv')
+        history_db = os.path.join(self.tmp_dir.name, 'main.sqlite')
+
+        result = main(file=False, save_file='Test', history_db=history_db)
+
+        conn = history.open_history(history_db)
+        df_tracking, df_no_data = history.read_run(conn, history.read_runs(conn)['RUN_ID'].iloc[-1])
+        conn.close()
+        self.assertEqual(len(result[0]), len(df_tracking))
+        self.assertEqual(result[2].count().sum(), len(df_no_data))
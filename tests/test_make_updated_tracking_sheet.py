@@ -11,6 +11,13 @@ import numpy as np
 # Import re for testing regular expressions
 import re
 
+# Import system packages for temporary output files and import time checks
+import os
+import sqlite3
+import subprocess
+import sys
+import tempfile
+
 # Import click testing module
 from click.testing import CliRunner
 
@@ -18,7 +25,20 @@ from click.testing import CliRunner
 from make_updated_tracking_sheet.cli import run_main
 
 # Import main method directly
-from make_updated_tracking_sheet.make_updated_tracking_sheet import main
+from make_updated_tracking_sheet.make_updated_tracking_sheet import (main, watch, _run_stages, StageError,
+                                                                     update_tracking)
+from make_updated_tracking_sheet.transform import (get_cmpds_no_data, get_latest_run_index, normalize_brd,
+                                                   strip_strings, read_tracking_csv, pivot_tracking)
+from make_updated_tracking_sheet.resultsdb import get_engine, _fetch_frame
+from make_updated_tracking_sheet.sinks import save_output
+
+# Import the SPR cache module and sqlalchemy for testing the database fetch
+from make_updated_tracking_sheet import spr_cache
+from make_updated_tracking_sheet import schema
+
+# Import the tolerances the benchmarks flag a regression with
+from benchmarks.run_benchmarks import TOLERANCE, MIN_SECONDS
+import sqlalchemy
 
 # Load environmental variables
 from dotenv import load_dotenv
@@ -28,7 +48,7 @@ class TestInvokeCLI(TestCase):
     """Class for testing the invocation of the 'make_updated_tracking_sheet' on the command line"""
 
     @patch('google_sheet_data.write_gsheet_data')
-    @patch('make_updated_tracking_sheet.make_updated_tracking_sheet.get_dot_data')
+    @patch('make_updated_tracking_sheet.resultsdb.get_dot_data')
     @patch('google_sheet_data.get_gsheet_data')
     @patch('pandas.ExcelWriter')
     @patch('pandas.DataFrame.to_excel')
@@ -66,7 +86,7 @@ class TestMain(TestCase):
         cls.df_dot_data = pd.read_csv(cls.df_dot_data_path)
 
     @patch('google_sheet_data.write_gsheet_data')
-    @patch('make_updated_tracking_sheet.make_updated_tracking_sheet.get_dot_data')
+    @patch('make_updated_tracking_sheet.resultsdb.get_dot_data')
     @patch('google_sheet_data.get_gsheet_data')
     @patch('pandas.ExcelWriter')
     @patch('pandas.DataFrame.to_excel')
@@ -84,7 +104,7 @@ class TestMain(TestCase):
             self.assertIn(header, result[0].columns)
 
     @patch('google_sheet_data.write_gsheet_data')
-    @patch('make_updated_tracking_sheet.make_updated_tracking_sheet.get_dot_data')
+    @patch('make_updated_tracking_sheet.resultsdb.get_dot_data')
     @patch('google_sheet_data.get_gsheet_data')
     @patch('pandas.ExcelWriter')
     @patch('pandas.DataFrame.to_excel')
@@ -101,7 +121,7 @@ class TestMain(TestCase):
             self.assertEqual(22, len(brd))
 
     @patch('google_sheet_data.write_gsheet_data')
-    @patch('make_updated_tracking_sheet.make_updated_tracking_sheet.get_dot_data')
+    @patch('make_updated_tracking_sheet.resultsdb.get_dot_data')
     @patch('google_sheet_data.get_gsheet_data')
     @patch('pandas.ExcelWriter')
     @patch('pandas.DataFrame.to_excel')
@@ -120,7 +140,7 @@ class TestMain(TestCase):
             self.assertNotEqual(None, re.match(r'\d{4}-\d{2}-\d{2}', date))
 
     @patch('google_sheet_data.write_gsheet_data')
-    @patch('make_updated_tracking_sheet.make_updated_tracking_sheet.get_dot_data')
+    @patch('make_updated_tracking_sheet.resultsdb.get_dot_data')
     @patch('google_sheet_data.get_gsheet_data')
     @patch('pandas.ExcelWriter')
     @patch('pandas.DataFrame.to_excel')
@@ -148,7 +168,7 @@ class TestMain(TestCase):
             self.assertIn(brd, expected)
 
     @patch('google_sheet_data.write_gsheet_data')
-    @patch('make_updated_tracking_sheet.make_updated_tracking_sheet.get_dot_data')
+    @patch('make_updated_tracking_sheet.resultsdb.get_dot_data')
     @patch('google_sheet_data.get_gsheet_data')
     @patch('pandas.ExcelWriter')
     @patch('pandas.DataFrame.to_excel')
@@ -174,3 +194,399 @@ class TestMain(TestCase):
 
         for brd in ls_viva:
             self.assertIn(brd, expected)
+
+
+class TestFetchFrame(TestCase):
+    """Class for testing the batched download of SPR results"""
+
+    df_dot_data_path = 'tests/fixtures/dotmatics_data_example.csv'
+
+    def setUp(self) -> None:
+        # Use an in memory SQLite database as a stand-in for resultsdb.
+        self.engine = sqlalchemy.create_engine('sqlite://')
+        self.df_dot_data = pd.read_csv(self.df_dot_data_path)
+
+        metadata = sqlalchemy.MetaData()
+        self.spr_data_tbl = sqlalchemy.Table('upload_spr_dose', metadata,
+                                             sqlalchemy.Column('BROAD_ID', sqlalchemy.String),
+                                             sqlalchemy.Column('PROJECT_CODE', sqlalchemy.Integer),
+                                             sqlalchemy.Column('OPERATOR', sqlalchemy.String),
+                                             sqlalchemy.Column('PROTEIN_ID', sqlalchemy.String),
+                                             sqlalchemy.Column('COMPOUND_MW', sqlalchemy.Float),
+                                             sqlalchemy.Column('DATE', sqlalchemy.String))
+        metadata.create_all(self.engine)
+
+        records = self.df_dot_data.astype(object).where(self.df_dot_data.notna(), None).to_dict('records')
+        with self.engine.begin() as conn:
+            conn.execute(self.spr_data_tbl.insert(), records)
+
+    def test_fetch_frame_matches_fetchall(self):
+        stmt = sqlalchemy.select([self.spr_data_tbl]).where(self.spr_data_tbl.c.PROTEIN_ID == 'BIP-0384-01')
+
+        with self.engine.connect() as conn:
+            expected = pd.DataFrame(conn.execute(stmt).fetchall(), columns=spr_cache.SPR_COLUMNS)
+            result = _fetch_frame(conn=conn, stmt=stmt, columns=spr_cache.SPR_COLUMNS, fetch_size=100)
+
+        self.assertEqual(len(expected), len(result))
+        self.assertEqual('int64', result['PROJECT_CODE'].dtype)
+        self.assertEqual('float64', result['COMPOUND_MW'].dtype)
+        pd.testing.assert_frame_equal(expected, result, check_dtype=False)
+
+    def test_fetch_frame_empty_result(self):
+        stmt = sqlalchemy.select([self.spr_data_tbl]).where(self.spr_data_tbl.c.PROTEIN_ID == 'No Protein')
+
+        with self.engine.connect() as conn:
+            result = _fetch_frame(conn=conn, stmt=stmt, columns=spr_cache.SPR_COLUMNS)
+
+        self.assertEqual(0, len(result))
+        self.assertEqual(spr_cache.SPR_COLUMNS, list(result.columns))
+
+
+class TestWatch(TestCase):
+    """Class for testing the long running watch mode"""
+
+    @patch('make_updated_tracking_sheet.make_updated_tracking_sheet.main')
+    def test_watch_refreshes(self, mock_main):
+        watch(interval=0, save_file='Test', full_resync=True, refreshes=3)
+
+        self.assertEqual(3, mock_main.call_count)
+
+        # Only the first refresh resyncs the full history.
+        self.assertTrue(mock_main.call_args_list[0].kwargs['full_resync'])
+        self.assertFalse(mock_main.call_args_list[-1].kwargs['full_resync'])
+
+    @patch('make_updated_tracking_sheet.make_updated_tracking_sheet.main')
+    def test_watch_survives_failed_refresh(self, mock_main):
+        mock_main.side_effect = [ConnectionError('Cannot connect'), KeyError('BRD'),
+                                 sqlite3.OperationalError('database is locked'), None]
+
+        with self.assertLogs(level='ERROR'):
+            watch(interval=0, save_file='Test', refreshes=4)
+
+        self.assertEqual(4, mock_main.call_count)
+
+    @patch('make_updated_tracking_sheet.make_updated_tracking_sheet.main')
+    def test_watch_interrupted(self, mock_main):
+        mock_main.side_effect = KeyboardInterrupt
+
+        with self.assertRaises(KeyboardInterrupt):
+            watch(interval=0, save_file='Test', refreshes=2)
+
+        self.assertEqual(1, mock_main.call_count)
+
+    @patch('sqlalchemy.create_engine')
+    @patch('crypt.Crypt')
+    def test_engine_created_once(self, mock_crypt, mock_create_engine):
+        mock_crypt.return_value.f.decrypt.return_value = b'password'
+        get_engine.cache_clear()
+
+        with patch('sqlalchemy.event.listen'):
+            engine = get_engine(fetch_size=100)
+            self.assertIs(engine, get_engine(fetch_size=100))
+
+        get_engine.cache_clear()
+        self.assertEqual(1, mock_crypt.call_count)
+        self.assertEqual(1, mock_create_engine.call_count)
+
+
+class TestVectorizedCleanup(TestCase):
+    """Class for testing that the vectorized clean up matches the original row by row clean up"""
+
+    tracking_file_path = 'tests/fixtures/compound_shipment_tracking_example.csv'
+    df_dot_data_path = 'tests/fixtures/dotmatics_data_example.csv'
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        cls.tracking_file = pd.read_csv(cls.tracking_file_path)
+        cls.df_dot_data = pd.read_csv(cls.df_dot_data_path)
+
+    def test_normalize_brd(self):
+        expected = self.tracking_file['BRD'].apply(lambda x: x[:22])
+        pd.testing.assert_series_equal(expected, normalize_brd(self.tracking_file['BRD']))
+
+    def test_parse_dates(self):
+        expected = self.df_dot_data['DATE'].apply(lambda x: x.replace('_', '-'))
+        pd.testing.assert_series_equal(expected, schema.format_dates(schema.parse_dates(self.df_dot_data['DATE'])))
+
+    def test_strip_strings(self):
+        df = self.tracking_file[['BRD', 'FROM', 'TO', 'DATE_RUN_BROAD', 'DATE_RUN_VIVA', 'DATE_RECEIVED']].copy()
+        df['DATE_RECEIVED'] = df['DATE_RECEIVED'].fillna(' ')
+
+        expected = df.apply(lambda x: x.str.strip()).replace('', np.nan)
+        pd.testing.assert_frame_equal(expected, strip_strings(df).replace('', np.nan))
+
+
+class TestCmpdsNoData(TestCase):
+    """Class for testing the detection of compounds received with no data"""
+
+    def test_cmpds_no_data_sorted_by_brd(self):
+        df = pd.DataFrame({'BRD': ['BRD-C', 'BRD-A', 'BRD-B', 'BRD-A', 'BRD-D', 'BRD-E'],
+                           'FROM': ['WXTJ', 'WXTJ', 'WXTJ', 'WXTJ', 'WXTJ', 'WXTJ'],
+                           'TO': ['Broad', 'Viva', 'Broad', 'Broad', 'Viva', 'Enamine'],
+                           'DATE_RUN_BROAD': [np.nan, np.nan, '2020-06-01', np.nan, np.nan, np.nan],
+                           'DATE_RUN_VIVA': [np.nan, np.nan, np.nan, np.nan, ' ', np.nan],
+                           'DATE_RECEIVED': ['2020-05-01', '2020-05-01', '2020-05-01', '2020-05-01', '2020-05-01',
+                                             '2020-05-01']})
+
+        result = get_cmpds_no_data(df=df)
+
+        self.assertEqual(['BRD-A', 'BRD-C'], list(result['Broad']))
+        self.assertEqual(['BRD-A', 'BRD-D'], list(result['Viva']))
+
+    def test_cmpds_no_data_pads_shorter_column(self):
+        df = pd.DataFrame({'BRD': ['BRD-A', 'BRD-B'],
+                           'FROM': ['WXTJ', 'WXTJ'],
+                           'TO': ['Broad', 'Broad'],
+                           'DATE_RUN_BROAD': [np.nan, np.nan],
+                           'DATE_RUN_VIVA': [np.nan, np.nan],
+                           'DATE_RECEIVED': ['2020-05-01', np.nan]})
+
+        result = get_cmpds_no_data(df=df)
+
+        self.assertEqual(['BRD-A'], list(result['Broad']))
+        self.assertTrue(result['Viva'].isnull().all())
+
+
+class TestLatestRunIndex(TestCase):
+    """Class for testing the index of the most recent SPR run of each compound"""
+
+    df_spr = pd.DataFrame({'BROAD_ID': ['BRD-A', 'BRD-A', 'BRD-A', 'BRD-B', 'BRD-B'],
+                           'OPERATOR': ['Viva_Biotech', 'Viva_Biotech', 'bfulroth', 'bfulroth', 'bfulroth'],
+                           'COMPOUND_MW': [500.1, 500.2, np.nan, np.nan, np.nan],
+                           'DATE': ['2020-06-02', '2020-05-01', '2020-04-01', '2020-01-01', '2020-03-01']})
+
+    def test_latest_run_index(self):
+        result = get_latest_run_index(df=self.df_spr)
+
+        self.assertEqual(['BRD-A', 'BRD-B'], list(result.index))
+        self.assertEqual('2020-06-02', result.loc['BRD-A', 'DATE_RUN_VIVA'])
+        self.assertEqual('2020-04-01', result.loc['BRD-A', 'DATE_RUN_BROAD'])
+        self.assertEqual(500.1, result.loc['BRD-A', 'COMPOUND_MW'])
+        self.assertTrue(pd.isna(result.loc['BRD-B', 'DATE_RUN_VIVA']))
+        self.assertEqual('2020-03-01', result.loc['BRD-B', 'DATE_RUN_BROAD'])
+
+    def test_latest_run_index_all_dates(self):
+        result = get_latest_run_index(df=self.df_spr, keep_all_dates=True)
+
+        self.assertEqual('2020-05-01, 2020-06-02', result.loc['BRD-A', 'DATE_RUN_VIVA'])
+        self.assertEqual('2020-01-01, 2020-03-01', result.loc['BRD-B', 'DATE_RUN_BROAD'])
+
+    @patch('google_sheet_data.write_gsheet_data')
+    @patch('make_updated_tracking_sheet.resultsdb.get_dot_data')
+    @patch('google_sheet_data.get_gsheet_data')
+    @patch('pandas.ExcelWriter')
+    @patch('pandas.DataFrame.to_excel')
+    def test_merge_keeps_one_row_per_shipment(self, mock_1, mock_2, mock_3, mock_4, mock_5):
+
+        # Mock returns for getting G-Sheet Data and Database data
+        mock_3.return_value = pd.read_csv('tests/fixtures/compound_shipment_tracking_example.csv')
+        mock_4.return_value = pd.read_csv('tests/fixtures/dotmatics_data_example.csv')
+
+        result = main(file=False, save_file='Test')
+
+        self.assertEqual(len(mock_3.return_value), len(result[0]))
+
+
+class TestStages(TestCase):
+    """Class for testing the concurrent stages of the app"""
+
+    def test_run_stages_returns_results_by_name(self):
+        result = _run_stages({'first': lambda: 1, 'second': lambda: 2})
+
+        self.assertEqual({'first': 1, 'second': 2}, result)
+
+    def test_run_stages_reports_each_failed_stage(self):
+        def fail():
+            raise ValueError('Stage failed')
+
+        with self.assertRaises(StageError) as context:
+            _run_stages({'first': fail, 'second': lambda: 2, 'third': fail})
+
+        self.assertEqual(['first', 'third'], list(context.exception.errors))
+        self.assertIsInstance(context.exception.errors['first'], ValueError)
+
+    @patch('google_sheet_data.write_gsheet_data')
+    @patch('make_updated_tracking_sheet.resultsdb.get_dot_data')
+    @patch('google_sheet_data.get_gsheet_data')
+    @patch('pandas.ExcelWriter')
+    @patch('pandas.DataFrame.to_excel')
+    def test_main_reports_failed_download(self, mock_1, mock_2, mock_3, mock_4, mock_5):
+        mock_3.return_value = pd.read_csv('tests/fixtures/compound_shipment_tracking_example.csv')
+        mock_4.side_effect = ConnectionError('Cannot connect to resultsdb database.')
+
+        with self.assertRaises(StageError) as context:
+            main(file=False, save_file='Test')
+
+        self.assertEqual(['download spr results'], list(context.exception.errors))
+        mock_5.assert_not_called()
+
+
+class TestSaveOutput(TestCase):
+    """Class for testing the output formats the results can be saved in"""
+
+    tracking_file_path = 'tests/fixtures/compound_shipment_tracking_example.csv'
+    df_dot_data_path = 'tests/fixtures/dotmatics_data_example.csv'
+
+    @classmethod
+    @patch('google_sheet_data.write_gsheet_data')
+    @patch('google_sheet_data.get_gsheet_data')
+    @patch('make_updated_tracking_sheet.resultsdb.get_dot_data')
+    @patch('make_updated_tracking_sheet.sinks.save_output')
+    def setUpClass(cls, mock_1, mock_2, mock_3, mock_4) -> None:
+        mock_2.return_value = pd.read_csv(cls.df_dot_data_path)
+        mock_3.return_value = pd.read_csv(cls.tracking_file_path)
+        main(file=False, save_file='Test')
+        cls.sheets = mock_1.call_args.kwargs
+
+    def setUp(self) -> None:
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        os.makedirs(os.path.join(self.tmp_dir.name, 'Desktop'))
+        self.homedir = patch('make_updated_tracking_sheet.sinks.homedir', self.tmp_dir.name)
+        self.homedir.start()
+
+    def tearDown(self) -> None:
+        self.homedir.stop()
+        self.tmp_dir.cleanup()
+
+    def _save(self, output_format):
+        save_output(df_1=self.sheets['df_1'], df_2=self.sheets['df_2'], df_3=self.sheets['df_3'], save_file='Test',
+                    output_format=output_format)
+        return sorted(os.listdir(os.path.join(self.tmp_dir.name, 'Desktop')))
+
+    def test_save_xlsx_stream(self):
+        files = self._save('xlsx_stream')
+
+        self.assertEqual(1, len(files))
+        self.assertTrue(files[0].startswith('Test_APPVersion_') and files[0].endswith('.xlsx'))
+
+        path = os.path.join(self.tmp_dir.name, 'Desktop', files[0])
+        df_no_data = pd.read_excel(path, sheet_name='Cmpds_Received_no_Data', index_col=0)
+        pd.testing.assert_frame_equal(self.sheets['df_3'], df_no_data)
+
+        df_pivoted = pd.read_excel(path, sheet_name='Pivoted_Tracking', header=[0, 1, 2], index_col=0)
+        self.assertEqual(len(self.sheets['df_2']), len(df_pivoted))
+
+    def test_save_csv(self):
+        files = self._save('csv')
+
+        self.assertEqual(3, len(files))
+        self.assertTrue(all(f.endswith('.csv') for f in files))
+
+    def test_save_parquet(self):
+        files = self._save('parquet')
+
+        self.assertEqual(3, len(files))
+        path = [os.path.join(self.tmp_dir.name, 'Desktop', f) for f in files if 'Pivoted_Tracking' in f][0]
+        df_pivoted = pd.read_parquet(path)
+        self.assertEqual(list(self.sheets['df_2'].index), list(df_pivoted['BRD']))
+
+    def test_unknown_format(self):
+        with self.assertRaises(ValueError):
+            self._save('docx')
+
+
+class TestPivotTracking(TestCase):
+    """Class for testing the grouped pivot of the updated tracking sheet"""
+
+    df = pd.DataFrame({'BRD': ['BRD-B', 'BRD-A', 'BRD-A', 'BRD-A', 'BRD-B'],
+                       'FROM': ['WXTJ', 'WXTJ', 'WXTJ', 'TCG', 'WXTJ'],
+                       'TO': ['Viva', 'Broad', 'Broad', 'Viva', 'Viva'],
+                       'DATE_RUN_BROAD': pd.to_datetime([None, None, '2020-06-01', None, None]),
+                       'DATE_RUN_VIVA': pd.to_datetime([None, None, None, '2020-06-02', None]),
+                       'DATE_RECEIVED': ['2020-05-02', '2020-05-01', '2020-05-03', np.nan, '2020-05-04']})
+
+    def test_pivot_matches_pivot_table(self):
+        df_merge_tracking = update_tracking(
+            df_ori_tracking=pd.read_csv('tests/fixtures/compound_shipment_tracking_example.csv'),
+            df_spr_dot_data=pd.read_csv('tests/fixtures/dotmatics_data_example.csv'))[0]
+        df_merge_tracking = df_merge_tracking[['BRD', 'FROM', 'TO', 'DATE_RUN_BROAD', 'DATE_RUN_VIVA', 'DATE_RECEIVED']]
+
+        # The lambda join pivot the grouped pivot replaced, skipping missing values.
+        expected = pd.pivot_table(data=schema.render_dates(df_merge_tracking).astype(object), index=['BRD'],
+                                  columns=['FROM', 'TO'], aggfunc=lambda x: ' '.join(str(v) for v in x if pd.notna(v)))
+        result = pivot_tracking(df=df_merge_tracking)
+
+        pd.testing.assert_frame_equal(expected, result, check_index_type=False, check_column_type=False,
+                                      check_categorical=False)
+
+    def test_pivot_skips_missing_values(self):
+        result = pivot_tracking(df=self.df)
+
+        self.assertEqual(['BRD-A', 'BRD-B'], list(result.index))
+        self.assertEqual('2020-06-01', result.loc['BRD-A', ('DATE_RUN_BROAD', 'WXTJ', 'Broad')])
+        self.assertEqual('2020-05-01 2020-05-03', result.loc['BRD-A', ('DATE_RECEIVED', 'WXTJ', 'Broad')])
+        self.assertEqual('', result.loc['BRD-B', ('DATE_RUN_VIVA', 'WXTJ', 'Viva')])
+        self.assertTrue(pd.isna(result.loc['BRD-B', ('DATE_RECEIVED', 'TCG', 'Viva')]))
+
+    def test_long_format(self):
+        result = pivot_tracking(df=self.df, long_format=True)
+
+        self.assertEqual(['BRD', 'FROM', 'TO', 'FIELD', 'VALUE'], list(result.columns))
+        self.assertEqual(9, len(result))
+        wide = result.pivot(index='BRD', columns=['FIELD', 'FROM', 'TO'], values='VALUE').sort_index(axis=1)
+        pd.testing.assert_frame_equal(pivot_tracking(df=self.df), wide, check_names=False, check_index_type=False,
+                                      check_column_type=False)
+
+
+class TestReadTrackingCsv(TestCase):
+    """Class for testing the chunked reads of the tracking sheet from .csv files"""
+
+    tracking_file_path = 'tests/fixtures/compound_shipment_tracking_example.csv'
+    df_dot_data_path = 'tests/fixtures/dotmatics_data_example.csv'
+
+    def test_read_tracking_csv_in_chunks(self):
+        expected = pd.read_csv(self.tracking_file_path, usecols=['BRD', 'FROM', 'TO', 'DATE_RECEIVED'])
+        expected['BRD'] = normalize_brd(expected['BRD'])
+
+        result = read_tracking_csv(paths=[self.tracking_file_path, self.tracking_file_path], chunksize=50)
+
+        self.assertEqual(['BRD', 'FROM', 'TO', 'DATE_RECEIVED'], list(result.columns))
+        self.assertTrue(all(isinstance(dtype, pd.CategoricalDtype) for dtype in result.dtypes))
+        pd.testing.assert_frame_equal(pd.concat([expected, expected], ignore_index=True), result.astype(object),
+                                      check_dtype=False)
+
+    @patch('google_sheet_data.write_gsheet_data')
+    @patch('make_updated_tracking_sheet.resultsdb.get_dot_data')
+    @patch('pandas.ExcelWriter')
+    @patch('pandas.DataFrame.to_excel')
+    @patch('builtins.input')
+    def test_main_reads_tracking_csv_without_prompt(self, mock_input, mock_1, mock_2, mock_3, mock_4):
+        mock_3.return_value = pd.read_csv(self.df_dot_data_path)
+
+        result = main(file=False, save_file='Test', tracking_csv=[self.tracking_file_path])
+
+        mock_input.assert_not_called()
+        mock_4.assert_not_called()
+        self.assertEqual(len(pd.read_csv(self.tracking_file_path)), len(result[0]))
+
+
+class TestImportTime(TestCase):
+    """Class for testing the cold start of the command line interface"""
+
+    # Packages only imported once a stage talks to the database or to Google.
+    heavy_modules = ['cx_Oracle', 'sqlalchemy', 'crypt', 'cryptography', 'googleapiclient', 'oauth2client', 'gspread']
+
+    # Time of importing the command line interface besides pandas, as a fraction of the time of importing pandas in
+    # the same process, as measured when the heavy packages were made lazy. Both scale with the speed of the machine
+    # and the Python version, unlike an absolute time. It regresses with the same tolerances as the stages of the
+    # benchmarks, see compare.
+    baseline = 0.35
+
+    def test_cli_import_is_lightweight(self):
+        result = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import make_updated_tracking_sheet.cli'],
+                                capture_output=True, text=True, check=True)
+
+        # Each line reads 'import time: self [us] | cumulative | imported package'
+        cumulative = {}
+        for line in result.stderr.splitlines():
+            if line.startswith('import time:') and not line.endswith('imported package'):
+                _, total, name = line[len('import time:'):].split('|')
+                cumulative[name.strip()] = int(total)
+
+        self.assertEqual([], [module for module in self.heavy_modules if module in cumulative])
+        # pandas is imported by the command line interface, so its time is part of the cumulative time of the latter.
+        current = cumulative['make_updated_tracking_sheet.cli'] - cumulative['pandas']
+        expected = self.baseline * cumulative['pandas']
+        self.assertFalse(current > expected * (1 + TOLERANCE) and current - expected >= MIN_SECONDS * 1e6,
+                         'Importing the command line interface besides pandas took {} us, {:.2f} times pandas, the '
+                         'baseline is {} times pandas'.format(current, current / cumulative['pandas'], self.baseline))
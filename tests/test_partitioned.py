@@ -0,0 +1,94 @@
+"""Module for testing the multi-core engine updating hash partitions of the compounds"""
+
+# Import modules from the unittesting framework
+from unittest import TestCase
+from unittest.mock import patch
+
+# Import pandas and its testing module
+import pandas as pd
+from pandas.testing import assert_frame_equal
+from click.testing import CliRunner
+
+# Import the methods under test and the synthetic data generators
+from make_updated_tracking_sheet.make_updated_tracking_sheet import update_tracking
+from make_updated_tracking_sheet.partitioned import partition_numbers, _merge_order
+from make_updated_tracking_sheet.profiling import StageProfiler
+from make_updated_tracking_sheet.cli import run_main
+from benchmarks import synthetic
+
+
+class TestPartitioned(TestCase):
+    """Class for testing that the partitioned memory engine returns the results of a single process"""
+
+    tracking_file_path = 'tests/fixtures/compound_shipment_tracking_example.csv'
+    df_dot_data_path = 'tests/fixtures/dotmatics_data_example.csv'
+
+    def _assert_same_results(self, df_tracking, df_spr, partitions, **kwargs):
+        expected = update_tracking(df_ori_tracking=df_tracking, df_spr_dot_data=df_spr, **kwargs)
+        results = update_tracking(df_ori_tracking=df_tracking, df_spr_dot_data=df_spr, partitions=partitions,
+                                  **kwargs)
+
+        for expected_frame, result_frame in zip(expected, results):
+            assert_frame_equal(expected_frame, result_frame)
+
+    def test_fixtures(self):
+        df_tracking = pd.read_csv(self.tracking_file_path)
+        df_spr = pd.read_csv(self.df_dot_data_path)
+
+        for all_run_dates in [False, True]:
+            for pivot_format in ['wide', 'long']:
+                with self.subTest(all_run_dates=all_run_dates, pivot_format=pivot_format):
+                    self._assert_same_results(df_tracking, df_spr, partitions=3, all_run_dates=all_run_dates,
+                                              pivot_format=pivot_format)
+
+    @patch('make_updated_tracking_sheet.partitioned.platform.system')
+    def test_partitions_pickled_off_linux(self, mock_system):
+        # Outside Linux the workers are not forked, so each partition is sent to them.
+        mock_system.return_value = 'Darwin'
+
+        self._assert_same_results(pd.read_csv(self.tracking_file_path), pd.read_csv(self.df_dot_data_path),
+                                  partitions=3)
+
+    def test_synthetic_empty_partitions(self):
+        # More partitions than compounds leaves some partitions without shipments or without SPR results.
+        compounds = synthetic.make_compounds(40)
+
+        self._assert_same_results(synthetic.make_tracking_sheet(3000, compounds),
+                                  synthetic.make_spr_results(3000, compounds), partitions=64)
+
+    def test_partition_numbers(self):
+        brd = pd.Series(['BRD-K00000001-001-01-9', 'BRD-K00000002-001-01-9', None, 'BRD-K00000001-001-01-9'])
+        numbers = partition_numbers(brd, 4)
+
+        # The same key always lands in the same partition, also when the other keys differ.
+        self.assertEqual(numbers[0], numbers[3])
+        self.assertEqual(numbers[1], partition_numbers(brd[1:2], 4)[0])
+        self.assertEqual(0, numbers[2])
+        self.assertTrue(((numbers >= 0) & (numbers < 4)).all())
+
+    def test_merge_order(self):
+        # Two partitions sorted by code, each code only in one of them.
+        codes = [1, 1, 4, 6, 0, 2, 2, 5]
+        order = _merge_order(codes)
+
+        self.assertEqual([0, 1, 1, 2, 2, 4, 5, 6], [codes[position] for position in order])
+        self.assertEqual([4, 0, 1, 5, 6, 2, 7, 3], list(order))
+        self.assertEqual([], list(_merge_order([])))
+
+    def test_stages_recorded(self):
+        profiler = StageProfiler()
+
+        update_tracking(df_ori_tracking=pd.read_csv(self.tracking_file_path),
+                        df_spr_dot_data=pd.read_csv(self.df_dot_data_path), profiler=profiler, partitions=2)
+
+        self.assertEqual(['partition', 'update partitions', 'combine'],
+                         [record['stage'] for record in profiler.report()['stages']])
+
+    def test_sqlite_engine_rejected(self):
+        with self.assertRaises(ValueError):
+            update_tracking(df_ori_tracking=pd.read_csv(self.tracking_file_path),
+                            df_spr_dot_data=pd.read_csv(self.df_dot_data_path), transform_engine='sqlite',
+                            partitions=2)
+
+        result = CliRunner().invoke(run_main, ['--save_file', 'Test', '--engine', 'sqlite', '--partitions', '2'])
+        self.assertEqual(2, result.exit_code)
@@ -0,0 +1,139 @@
+"""Module for testing the per stage instrumentation of a run"""
+
+# Import modules from the unittesting framework
+from unittest import TestCase
+from unittest.mock import patch
+
+# Import system packages for temporary report files and memory checks
+import json
+import os
+import sys
+import tempfile
+import tracemalloc
+
+# Import pandas
+import pandas as pd
+
+# Import click testing module
+from click.testing import CliRunner
+
+# Import the command line interface entry point and the module under test
+from make_updated_tracking_sheet.cli import run_main
+from make_updated_tracking_sheet.profiling import StageProfiler
+
+
+class TestStageProfiler(TestCase):
+    """Class for testing the StageProfiler"""
+
+    def test_stage_recorded(self):
+        with StageProfiler(trace_memory=True) as profiler:
+            with profiler.stage('pivot', rows_in=10) as record:
+                record['rows_out'] = 4
+
+        [stage] = profiler.report()['stages']
+        self.assertEqual('pivot', stage['stage'])
+        self.assertEqual((10, 4), (stage['rows_in'], stage['rows_out']))
+        self.assertGreaterEqual(stage['seconds'], 0)
+        self.assertIn('traced_peak_mb', stage)
+
+    @patch('make_updated_tracking_sheet.profiling._rss_mb')
+    @patch('make_updated_tracking_sheet.profiling._peak_rss_mb')
+    def test_memory_of_each_stage(self, mock_peak_rss, mock_rss):
+        # Resident and peak resident memory read at the start and end of each stage.
+        mock_rss.side_effect = [100.0, 300.0, 150.0, 200.0]
+        mock_peak_rss.side_effect = [120.0, 320.0, 320.0, 320.0]
+        profiler = StageProfiler()
+
+        with profiler.stage('read tracking sheet'):
+            pass
+        with profiler.stage('merge'):
+            pass
+
+        # Only the stage that raised the peak of the process reports an increase.
+        first, second = profiler.stages
+        self.assertEqual((100.0, 300.0, 200.0),
+                         (first['rss_start_mb'], first['rss_end_mb'], first['peak_rss_increase_mb']))
+        self.assertEqual((150.0, 200.0, 0.0),
+                         (second['rss_start_mb'], second['rss_end_mb'], second['peak_rss_increase_mb']))
+
+    def test_current_memory_of_stage(self):
+        if not sys.platform.startswith('linux'):
+            self.skipTest('The current resident memory is only read on Linux.')
+        profiler = StageProfiler()
+
+        with profiler.stage('read tracking sheet'):
+            # Writing every byte makes the pages resident.
+            data = b'x' * (100 * 1024 * 1024)
+        del data
+
+        [stage] = profiler.stages
+        self.assertGreaterEqual(stage['rss_end_mb'] - stage['rss_start_mb'], 50)
+
+    def test_tracing_stopped(self):
+        profiler = StageProfiler(trace_memory=True)
+        self.assertTrue(tracemalloc.is_tracing())
+
+        profiler.stop()
+        self.assertFalse(tracemalloc.is_tracing())
+
+    def test_tracing_started_elsewhere_not_stopped(self):
+        tracemalloc.start()
+        try:
+            with StageProfiler(trace_memory=True):
+                pass
+            self.assertTrue(tracemalloc.is_tracing())
+        finally:
+            tracemalloc.stop()
+
+    def test_failed_stage_recorded(self):
+        profiler = StageProfiler()
+
+        with self.assertRaises(ValueError):
+            with profiler.stage('merge'):
+                raise ValueError('bad data')
+
+        self.assertEqual(['merge'], [stage['stage'] for stage in profiler.stages])
+
+    def test_cprofile_stats_saved(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            profiler = StageProfiler(cprofile_dir=tmp_dir)
+
+            with profiler.stage('no data', cprofile=True):
+                sum(range(1000))
+            with profiler.stage('read tracking sheet'):
+                pass
+
+            self.assertEqual(['no_data.prof'], os.listdir(tmp_dir))
+
+
+class TestProfileCLI(TestCase):
+    """Class for testing the --profile report of a run"""
+
+    @patch('google_sheet_data.write_gsheet_data')
+    @patch('make_updated_tracking_sheet.resultsdb.get_dot_data')
+    @patch('google_sheet_data.get_gsheet_data')
+    @patch('pandas.ExcelWriter')
+    @patch('pandas.DataFrame.to_excel')
+    def test_report_written(self, mock_1, mock_2, mock_3, mock_4, mock_5):
+        mock_3.return_value = pd.read_csv('tests/fixtures/compound_shipment_tracking_example.csv')
+        mock_4.return_value = pd.read_csv('tests/fixtures/dotmatics_data_example.csv')
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            report_file = os.path.join(tmp_dir, 'profile.json')
+            result = CliRunner().invoke(run_main, ['--save_file', 'Test', '--profile', report_file, '--trace_memory'])
+
+            self.assertEqual(0, result.exit_code)
+            self.assertFalse(tracemalloc.is_tracing())
+            with open(report_file) as f:
+                report = json.load(f)
+
+        stages = {stage['stage']: stage for stage in report['stages']}
+        self.assertEqual({'read tracking sheet', 'download spr results', 'merge', 'pivot', 'no data',
+                          'save Excel workbook', 'write Google Sheet'}, set(stages))
+        self.assertEqual(len(mock_3.return_value), stages['read tracking sheet']['rows_out'])
+        self.assertEqual(stages['merge']['rows_out'], stages['save Excel workbook']['rows_in'])
+
+    def test_profile_with_watch_rejected(self):
+        result = CliRunner().invoke(run_main, ['--save_file', 'Test', '--watch', '--profile', 'profile.json'])
+
+        self.assertEqual(2, result.exit_code)
@@ -0,0 +1,57 @@
+"""Module for testing the typed schema of the tracking sheet and SPR results"""
+
+# Import modules from the unittesting framework
+from unittest import TestCase
+
+# Import pandas and numpy
+import pandas as pd
+import numpy as np
+
+# Import the module under test and the method converting the frames
+from make_updated_tracking_sheet import schema
+from make_updated_tracking_sheet.make_updated_tracking_sheet import update_tracking
+
+
+class TestSchema(TestCase):
+    """Class for testing the conversion of the frames to the typed schema"""
+
+    tracking_file_path = 'tests/fixtures/compound_shipment_tracking_example.csv'
+    df_dot_data_path = 'tests/fixtures/dotmatics_data_example.csv'
+
+    def test_apply_spr_schema(self):
+        df = pd.read_csv(self.df_dot_data_path)
+
+        result = schema.apply_spr_schema(df)
+
+        for col in schema.SPR_CATEGORIES:
+            self.assertIsInstance(result[col].dtype, pd.CategoricalDtype)
+        self.assertTrue(pd.api.types.is_datetime64_any_dtype(result['DATE']))
+        self.assertEqual(pd.Timestamp('2018-04-02'), result['DATE'].iloc[0])
+        self.assertLess(result.memory_usage(deep=True).sum(), df.memory_usage(deep=True).sum() / 2)
+
+    def test_unparseable_dates_are_missing(self):
+        result = schema.parse_dates(pd.Series(['2020_06_05', '2020-06-06', 'Running 8/25', np.nan]))
+
+        self.assertEqual(['2020-06-05', '2020-06-06'], list(schema.format_dates(result)[:2]))
+        self.assertTrue(result[2:].isnull().all())
+
+    def test_render_dates(self):
+        df = pd.DataFrame({'BRD': ['BRD-A', 'BRD-B'], 'DATE': pd.to_datetime(['2020-06-05', None])})
+
+        result = schema.render_dates(df)
+
+        self.assertEqual('2020-06-05', result['DATE'][0])
+        self.assertTrue(pd.isna(result['DATE'][1]))
+        self.assertTrue(pd.api.types.is_datetime64_any_dtype(df['DATE']))
+
+    def test_update_tracking_typed_columns(self):
+        df_merge_tracking, df_pivoted_tracking, _ = update_tracking(
+            df_ori_tracking=pd.read_csv(self.tracking_file_path), df_spr_dot_data=pd.read_csv(self.df_dot_data_path))
+
+        self.assertIsInstance(df_merge_tracking['BRD'].dtype, pd.CategoricalDtype)
+        self.assertTrue(pd.api.types.is_datetime64_any_dtype(df_merge_tracking['DATE_RUN_BROAD']))
+
+        # The pivot holds Y-m-d strings and no 'nan' left over from missing dates.
+        values = pd.Series(df_pivoted_tracking.to_numpy().ravel()).dropna()
+        self.assertFalse(values.str.contains('nan|NaT').any())
+        self.assertIn('2020-08-25', set(df_pivoted_tracking[('DATE_RUN_BROAD', 'TCG', 'Broad')]))
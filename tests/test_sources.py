@@ -0,0 +1,81 @@
+"""Module for testing the sources and sinks of run"""
+
+# Import modules from the unittesting framework
+from unittest import TestCase
+
+# Import system packages for temporary output files
+import os
+import tempfile
+
+# Import pandas and pyarrow
+import pandas as pd
+import pyarrow as pa
+
+# Import the modules under test
+from make_updated_tracking_sheet import sources
+from make_updated_tracking_sheet import sinks
+from make_updated_tracking_sheet.make_updated_tracking_sheet import run, update_tracking
+from make_updated_tracking_sheet.profiling import StageProfiler
+
+
+class TestRun(TestCase):
+    """Class for testing runs against already loaded data"""
+
+    tracking_file_path = 'tests/fixtures/compound_shipment_tracking_example.csv'
+    df_dot_data_path = 'tests/fixtures/dotmatics_data_example.csv'
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        cls.tracking_file = pd.read_csv(cls.tracking_file_path)
+        cls.df_dot_data = pd.read_csv(cls.df_dot_data_path)
+        cls.expected = update_tracking(df_ori_tracking=cls.tracking_file.copy(), df_spr_dot_data=cls.df_dot_data)
+
+    def _assert_expected(self, results):
+        for expected, result in zip(self.expected[-len(results):], results):
+            pd.testing.assert_frame_equal(expected, result)
+
+    def test_memory_source_and_sink(self):
+        memory_sink = sinks.MemorySink()
+
+        results = run(tracking_source=sources.MemorySource(self.tracking_file.copy()),
+                      spr_source=sources.MemorySource(self.df_dot_data, stage='download spr results'),
+                      output_sinks=[memory_sink])
+
+        self._assert_expected(results)
+        self._assert_expected(memory_sink.results)
+
+    def test_default_memory_sources(self):
+        profiler = StageProfiler()
+
+        # Both sources are reported under the default stage name, which is numbered the second time.
+        results = run(tracking_source=sources.MemorySource(self.tracking_file.copy()),
+                      spr_source=sources.MemorySource(self.df_dot_data), profiler=profiler)
+
+        self._assert_expected(results)
+        self.assertLessEqual({'read tracking sheet', 'read tracking sheet 2'},
+                             {record['stage'] for record in profiler.report()['stages']})
+
+    def test_arrow_tables(self):
+        results = run(tracking_source=sources.MemorySource(pa.Table.from_pandas(self.tracking_file)),
+                      spr_source=sources.MemorySource(pa.Table.from_pandas(self.df_dot_data),
+                                                      stage='download spr results'))
+
+        # Arrow reads missing strings back as None rather than nan.
+        pd.testing.assert_frame_equal(self.expected[0].isna(), results[0].isna())
+        self._assert_expected(results[1:])
+
+    def test_parquet_source_and_file_sinks(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            spr_path = os.path.join(tmp_dir, 'spr.parquet')
+            self.df_dot_data.to_parquet(spr_path)
+
+            results = run(tracking_source=sources.CsvSource(paths=[self.tracking_file_path]),
+                          spr_source=sources.ParquetSource(paths=[spr_path], stage='download spr results'),
+                          output_sinks=[sinks.FileSink(save_file='Test', output_format='csv', directory=tmp_dir),
+                                        sinks.FileSink(save_file='Test', output_format='parquet', directory=tmp_dir)])
+
+            saved = sorted(name for name in os.listdir(tmp_dir) if name.startswith('Test'))
+
+        self.assertEqual(6, len(saved))
+        self.assertEqual(len(self.tracking_file), len(results[0]))
+        pd.testing.assert_frame_equal(self.expected[2], results[2])
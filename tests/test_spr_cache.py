@@ -0,0 +1,59 @@
+"""Module for testing the local cache of SPR results"""
+
+# Import modules from the unittesting framework
+from unittest import TestCase
+
+# Import system packages for temporary cache files
+import os
+import tempfile
+
+# Import pandas
+import pandas as pd
+
+# Import the module under test
+from make_updated_tracking_sheet import spr_cache
+
+
+class TestSprCache(TestCase):
+    """Class for testing the incremental sync of SPR results into the local cache"""
+
+    df_dot_data_path = 'tests/fixtures/dotmatics_data_example.csv'
+
+    def setUp(self) -> None:
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.conn = spr_cache.open_cache(os.path.join(self.tmp_dir.name, 'cache', 'spr_cache.sqlite'))
+        self.df_dot_data = pd.read_csv(self.df_dot_data_path)
+
+    def tearDown(self) -> None:
+        self.conn.close()
+        self.tmp_dir.cleanup()
+
+    def test_empty_cache_has_no_high_water_mark(self):
+        self.assertIsNone(spr_cache.get_high_water_mark(self.conn, 7279, 'BIP-0384-01'))
+
+    def test_full_sync_round_trip(self):
+        spr_cache.merge_into_cache(self.conn, self.df_dot_data, project_code=7279, protein_id='BIP-0384-01')
+
+        result = spr_cache.read_cache(self.conn, project_code=7279, protein_id='BIP-0384-01')
+
+        self.assertEqual(len(self.df_dot_data), len(result))
+        self.assertEqual(spr_cache.SPR_COLUMNS, list(result.columns))
+        self.assertEqual(self.df_dot_data['DATE'].max(),
+                         spr_cache.get_high_water_mark(self.conn, 7279, 'BIP-0384-01'))
+
+    def test_incremental_sync_replaces_rows_from_high_water_mark(self):
+        spr_cache.merge_into_cache(self.conn, self.df_dot_data, project_code=7279, protein_id='BIP-0384-01')
+        high_water_mark = spr_cache.get_high_water_mark(self.conn, 7279, 'BIP-0384-01')
+
+        # Rows of the last synced day are downloaded again together with a new run.
+        df_new = self.df_dot_data[self.df_dot_data['DATE'] >= high_water_mark].copy()
+        df_new_run = df_new.head(1).copy()
+        df_new_run['DATE'] = '2999_01_01'
+        df_new = pd.concat([df_new, df_new_run])
+
+        spr_cache.merge_into_cache(self.conn, df_new, project_code=7279, protein_id='BIP-0384-01',
+                                   high_water_mark=high_water_mark)
+        result = spr_cache.read_cache(self.conn, project_code=7279, protein_id='BIP-0384-01')
+
+        self.assertEqual(len(self.df_dot_data) + 1, len(result))
+        self.assertEqual('2999_01_01', spr_cache.get_high_water_mark(self.conn, 7279, 'BIP-0384-01'))
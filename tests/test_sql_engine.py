@@ -0,0 +1,104 @@
+"""Module for testing the out-of-core SQL engine of update_tracking"""
+
+# Import modules from the unittesting framework
+from unittest import TestCase
+
+# Import system packages for temporary cache files
+import os
+import tempfile
+
+# Import pandas and its testing module
+import pandas as pd
+from pandas.testing import assert_frame_equal
+
+# Import the method under test and the synthetic data generators
+from make_updated_tracking_sheet.make_updated_tracking_sheet import run, update_tracking
+from make_updated_tracking_sheet import sources
+from make_updated_tracking_sheet import spr_cache
+from make_updated_tracking_sheet.profiling import StageProfiler
+from benchmarks import synthetic
+
+
+class CachedSprSource:
+    """SPR results source reading a local cache of SPR results, or handing it to the sqlite engine to attach"""
+
+    stage = 'download spr results'
+
+    def __init__(self, cache_path):
+        self.cache_path = cache_path
+
+    def read(self):
+        conn = spr_cache.open_cache(self.cache_path)
+        try:
+            return spr_cache.read_cache(conn, project_code=7279, protein_id='BIP-0384-01')
+        finally:
+            conn.close()
+
+    def sync_cache(self):
+        return self.cache_path, 7279, 'BIP-0384-01'
+
+
+class TestSqlEngine(TestCase):
+    """Class for testing that the sqlite engine returns the results of the memory engine"""
+
+    tracking_file_path = 'tests/fixtures/compound_shipment_tracking_example.csv'
+    df_dot_data_path = 'tests/fixtures/dotmatics_data_example.csv'
+
+    def _assert_same_results(self, df_tracking, df_spr, **kwargs):
+        expected = update_tracking(df_ori_tracking=df_tracking, df_spr_dot_data=df_spr, **kwargs)
+        results = update_tracking(df_ori_tracking=df_tracking, df_spr_dot_data=df_spr, transform_engine='sqlite',
+                                  **kwargs)
+
+        for expected_frame, result_frame in zip(expected, results):
+            assert_frame_equal(expected_frame, result_frame)
+
+    def test_fixtures(self):
+        df_tracking = pd.read_csv(self.tracking_file_path)
+        df_spr = pd.read_csv(self.df_dot_data_path)
+
+        for all_run_dates in [False, True]:
+            for pivot_format in ['wide', 'long']:
+                with self.subTest(all_run_dates=all_run_dates, pivot_format=pivot_format):
+                    self._assert_same_results(df_tracking, df_spr, all_run_dates=all_run_dates,
+                                              pivot_format=pivot_format)
+
+    def test_synthetic_repeat_runs(self):
+        # Compounds run several times on the same day by Viva, shipments with notes and results with missing dates.
+        compounds = synthetic.make_compounds(1000)
+
+        self._assert_same_results(synthetic.make_tracking_sheet(3000, compounds),
+                                  synthetic.make_spr_results(3000, compounds))
+
+    def test_stages_recorded(self):
+        profiler = StageProfiler()
+
+        update_tracking(df_ori_tracking=pd.read_csv(self.tracking_file_path),
+                        df_spr_dot_data=pd.read_csv(self.df_dot_data_path), profiler=profiler,
+                        transform_engine='sqlite')
+
+        self.assertEqual(['load sqlite', 'merge', 'pivot', 'no data'],
+                         [record['stage'] for record in profiler.report()['stages']])
+
+    def test_sources_streamed(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            # Cache the SPR results of the target, after results of another protein.
+            df_spr = pd.read_csv(self.df_dot_data_path)
+            df_other = df_spr.head(50).assign(PROTEIN_ID='BIP-0385-01', DATE='2999_01_01')
+            cache_path = os.path.join(tmp_dir, 'spr_cache.sqlite')
+            conn = spr_cache.open_cache(cache_path)
+            spr_cache.merge_into_cache(conn, df_other, project_code=7279, protein_id='BIP-0385-01')
+            spr_cache.merge_into_cache(conn, df_spr, project_code=7279, protein_id='BIP-0384-01')
+            conn.close()
+
+            for all_run_dates in [False, True]:
+                with self.subTest(all_run_dates=all_run_dates):
+                    expected, results = [
+                        run(tracking_source=sources.CsvSource(paths=[self.tracking_file_path], chunksize=50),
+                            spr_source=CachedSprSource(cache_path), all_run_dates=all_run_dates,
+                            transform_engine=transform_engine)
+                        for transform_engine in ['memory', 'sqlite']]
+
+                    # The chunks are read back in other batches than they were read in, so only the order of the
+                    # categories differs.
+                    for expected_frame, result_frame in zip(expected, results):
+                        assert_frame_equal(expected_frame, result_frame, check_categorical=False)